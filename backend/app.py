@@ -1,49 +1,118 @@
-from flask import Flask, request, jsonify, g
-from flask_sqlalchemy import SQLAlchemy
-from flask_jwt_extended import JWTManager, create_access_token, jwt_required, get_jwt_identity
+from flask import Flask, request, jsonify, current_app
+from flask_jwt_extended import JWTManager
 from flask_cors import CORS
 from flask_migrate import Migrate
-from werkzeug.security import generate_password_hash, check_password_hash
-from datetime import datetime, timedelta
+from werkzeug.security import generate_password_hash
 import os
-from dotenv import load_dotenv
-import ipaddress
-
-load_dotenv()
-
-app = Flask(__name__)
-app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'your-secret-key-here')
-app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'sqlite:///attendance.db')
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-app.config['JWT_SECRET_KEY'] = os.environ.get('JWT_SECRET_KEY', 'jwt-secret-key')
-app.config['JWT_ACCESS_TOKEN_EXPIRES'] = timedelta(hours=8)
-
-db = SQLAlchemy(app)
-migrate = Migrate(app, db)
-jwt = JWTManager(app)
-CORS(app)
-
-# 导入模型
-from models import User, AttendanceRecord, LeaveRequest, ExpenseReport, WorkDiary, OutingReport, Schedule, SystemSettings
-
-# 导入路由
-from routes import auth, admin, attendance, leave, expense, diary, outing, schedule
-
-# 注册蓝图
-app.register_blueprint(auth.bp)
-app.register_blueprint(admin.bp)
-app.register_blueprint(attendance.bp)
-app.register_blueprint(leave.bp)
-app.register_blueprint(expense.bp)
-app.register_blueprint(diary.bp)
-app.register_blueprint(outing.bp)
-app.register_blueprint(schedule.bp)
-
-@app.before_request
+from config import Config, engine_options
+from models import db, User, SystemSettings
+from utils.json_provider import install_json_provider
+from utils.compression import install_compression
+from utils.idempotency import install_idempotency
+from utils.kiosk import ip_allowed
+from utils.metrics import install_metrics
+from utils.diary_search import include_schema_object, rebuild_search_index
+from utils.sqlite_profile import install_sqlite_profile
+from utils.slow_queries import install_slow_query_log
+from utils.replicas import configure_replicas, install_replicas, sync_sqlite_replicas
+
+migrate = Migrate()
+jwt = JWTManager()
+
+def create_app(config=None):
+    """创建应用
+
+    config 为覆盖默认配置的字典。后台定时任务不在这里启动，由入口调用 start_background_jobs()，
+    多进程部署时在每个 worker 进程 fork 之后启动（见 gunicorn.conf.py）。
+    """
+    app = Flask(__name__)
+    app.config.from_object(Config)
+    if config:
+        app.config.update(config)
+    if not app.config.get('RECEIPT_STORAGE_DIR'):
+        app.config['RECEIPT_STORAGE_DIR'] = os.path.join(app.root_path, 'receipts')
+    app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', engine_options(app.config))
+
+    # 已安装 orjson 时使用 orjson 编码 JSON 响应
+    install_json_provider(app)
+
+    # 每个接口的延迟、SQL 次数/耗时和响应大小，/api/metrics 导出（先于压缩注册，记录压缩后的大小）
+    install_metrics(app)
+
+    # 按 Accept-Encoding 压缩 JSON/文本响应（gzip，安装 Brotli 后支持 br）
+    install_compression(app)
+
+    # 写请求的 Idempotency-Key：重试时直接返回第一次的响应（在压缩之前保存未压缩的响应）
+    install_idempotency(app)
+
+    # 只读副本（DATABASE_REPLICA_URLS）注册为 bind，只读接口的查询按请求路由
+    configure_replicas(app)
+    db.init_app(app)
+    install_replicas(app, db)
+
+    # SQLite 文件数据库：WAL、busy_timeout 和进程内单写入者网关
+    install_sqlite_profile(app)
+
+    # 慢查询记录（抽样获取执行计划），管理员通过 /api/admin/slow-queries 查看
+    install_slow_query_log(app, db)
+
+    migrate.init_app(app, db, include_object=include_schema_object)
+    jwt.init_app(app)
+    CORS(app)
+
+    register_blueprints(app)
+
+    app.before_request(load_logged_in_user)
+    app.add_url_rule('/api/health', 'health_check', health_check)
+    app.cli.command('init-db')(init_db_command)
+    app.cli.command('replica-sync')(replica_sync_command)
+    app.cli.command('rebuild-diary-index')(rebuild_diary_index_command)
+
+    return app
+
+def register_blueprints(app):
+    """注册蓝图（创建应用时才导入路由模块）"""
+    from routes import auth, admin, attendance, leave, expense, diary, outing, schedule, events, batch
+    from utils.versioning import install_version_listeners
+
+    # 注册数据表版本监听（用于 ETag 缓存校验）
+    install_version_listeners()
+
+    for module in (auth, admin, attendance, leave, expense, diary, outing, schedule, events, batch):
+        app.register_blueprint(module.bp)
+
+def start_background_jobs(app):
+    """启动后台定时任务（每个进程各自维护内存中的看板和索引，需在每个进程中启动）"""
+    from utils.events import start_event_log_purge
+    from utils.idempotency import start_idempotency_purge
+    from utils.metrics import start_metrics_flush
+    from utils.outing_sweeper import start_outing_sweeper
+    from utils.presence import start_presence_reconciler
+    from utils.replicas import start_replica_health_checks
+
+    # 外出超时定时扫描
+    if app.config['OUTING_SWEEPER_ENABLED']:
+        start_outing_sweeper(app)
+
+    # 在岗看板启动时加载并定时对账（间隔为 0 时不定时对账）
+    start_presence_reconciler(app)
+
+    # 只读副本健康检查
+    start_replica_health_checks(app)
+
+    # 清理过期的实时推送事件
+    start_event_log_purge(app)
+
+    # 多进程监控指标定时落盘
+    start_metrics_flush(app)
+
+    # 清理过期的幂等键
+    start_idempotency_purge(app)
+
 def load_logged_in_user():
     if request.endpoint and request.endpoint.startswith('auth'):
         return
-    
+
     # 检查是否需要验证IP地址
     if request.endpoint in ['attendance.clock_in', 'attendance.clock_out']:
         if not verify_ip_address(request.remote_addr):
@@ -52,37 +121,51 @@ def load_logged_in_user():
 def verify_ip_address(ip):
     """验证IP地址是否在允许范围内"""
     allowed_ips = SystemSettings.query.filter_by(key='allowed_ips').first()
-    if not allowed_ips:
-        return True  # 如果没有设置IP限制，则允许所有IP
-    
-    allowed_ip_list = allowed_ips.value.split(',')
-    for allowed_ip in allowed_ip_list:
-        try:
-            if ipaddress.ip_address(ip) in ipaddress.ip_network(allowed_ip.strip(), strict=False):
-                return True
-        except ValueError:
-            continue
-    return False
-
-@app.route('/api/health')
+    # 如果没有设置IP限制，则允许所有IP
+    return ip_allowed(ip, allowed_ips.value if allowed_ips else None)
+
 def health_check():
     return jsonify({'status': 'healthy'})
 
+def init_db():
+    """创建数据表和默认管理员用户"""
+    db.create_all()
+    admin_user = User.query.filter_by(username='admin').first()
+    if not admin_user:
+        admin_user = User(
+            username='admin',
+            email='admin@company.com',
+            password=generate_password_hash('admin123'),
+            role='admin',
+            is_active=True
+        )
+        db.session.add(admin_user)
+        db.session.commit()
+        print("默认管理员用户创建成功: admin / admin123")
+
+def init_db_command():
+    """初始化数据库（flask init-db）"""
+    init_db()
+
+def replica_sync_command():
+    """把 SQLite 主库复制到 SQLite 副本文件（flask replica-sync，本地测试副本路由用）"""
+    count = sync_sqlite_replicas(current_app._get_current_object())
+    print(f'已同步 {count} 个副本')
+
+def rebuild_diary_index_command():
+    """重建日报全文索引（flask rebuild-diary-index，应用之外写入日报表后使用）"""
+    count = rebuild_search_index(db.session.connection())
+    db.session.commit()
+    print(f'已索引 {count} 篇日报')
+
 if __name__ == '__main__':
+    # 开发服务器；生产环境使用 gunicorn -c gunicorn.conf.py wsgi:app
+    app = create_app()
     with app.app_context():
-        db.create_all()
-        # 创建默认管理员用户
-        admin_user = User.query.filter_by(username='admin').first()
-        if not admin_user:
-            admin_user = User(
-                username='admin',
-                email='admin@company.com',
-                password=generate_password_hash('admin123'),
-                role='admin',
-                is_active=True
-            )
-            db.session.add(admin_user)
-            db.session.commit()
-            print("默认管理员用户创建成功: admin / admin123")
-    
-    app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
+        init_db()
+
+    # 调试模式下只在重载器启动的服务进程中运行后台任务
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        start_background_jobs(app)
+
+    app.run(debug=True, host='0.0.0.0', port=5000)
@@ -0,0 +1,331 @@
+"""压测场景：对运行中的服务并发请求，按接口统计吞吐量和 p50/p95/p99 延迟
+
+先用 benchmarks.seed 生成数据并启动服务（如 gunicorn -c gunicorn.conf.py wsgi:app），
+再在 backend 目录下运行（令牌在本地用 JWT_SECRET_KEY 签发，须与服务端配置一致）：
+    python -m benchmarks.load --base-url http://127.0.0.1:5000 --database-url sqlite:///bench.db
+    python -m benchmarks.load ... --scenarios punch_storm --concurrency 64
+    python -m benchmarks.load ... --compare benchmarks/results/load-20261019-120000.json
+
+场景：
+    punch_storm          上班打卡高峰：员工集中打卡并查看当天考勤和排班
+    month_end_approvals  月底审批：店长查看待审批列表并逐条审批请假和报销
+    payroll_export       工资核算：按月统计考勤、翻页导出考勤记录、报销统计和凭证打包
+    admin_browsing       管理员浏览：用户、考勤记录、日报、排班日历、外出看板和首页批量请求
+"""
+from flask_jwt_extended import create_access_token
+from collections import Counter, defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from threading import Lock, local
+from time import perf_counter
+from urllib.parse import urlencode, urlsplit
+import argparse
+import gzip
+import http.client
+import json
+import math
+import os
+import random
+import subprocess
+import time
+
+from app import create_app
+from models import User, LeaveRequest, ExpenseReport, db
+from benchmarks.seed import USERNAME_PREFIX
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+APPROVALS_PER_SESSION = 5
+
+class HttpClient:
+    """每个线程使用一个 keep-alive 连接"""
+
+    def __init__(self, base_url, timeout=30):
+        parts = urlsplit(base_url)
+        self.connection_class = http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection
+        self.netloc = parts.netloc
+        self.prefix = parts.path.rstrip('/')
+        self.timeout = timeout
+        self._local = local()
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = self._local.connection = self.connection_class(self.netloc, timeout=self.timeout)
+        return connection
+
+    def request(self, method, path, token=None, params=None, body=None):
+        """返回 (状态码, 响应体, 耗时秒数)，连接失败时状态码为 0"""
+        url = self.prefix + path + ('?' + urlencode(params) if params else '')
+        headers = {'Accept-Encoding': 'gzip'}
+        if token:
+            headers['Authorization'] = 'Bearer ' + token
+        data = None
+        if body is not None:
+            data = json.dumps(body).encode('utf-8')
+            headers['Content-Type'] = 'application/json'
+
+        started = perf_counter()
+        try:
+            connection = self._connection()
+            connection.request(method, url, body=data, headers=headers)
+            response = connection.getresponse()
+            payload = response.read()
+            status = response.status
+            if response.getheader('Content-Encoding') == 'gzip':
+                payload = gzip.decompress(payload)
+        except (OSError, http.client.HTTPException):
+            self._local.connection = None
+            status, payload = 0, b''
+        return status, payload, perf_counter() - started
+
+class Results:
+    """按接口（方法 + 路由模板）记录每次请求的状态码和耗时"""
+
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.statuses = defaultdict(Counter)
+        self._lock = Lock()
+
+    def add(self, label, status, elapsed):
+        with self._lock:
+            self.latencies[label].append(elapsed)
+            self.statuses[label][status] += 1
+
+    def summary(self, duration):
+        endpoints = {}
+        for label, values in sorted(self.latencies.items()):
+            values.sort()
+            statuses = self.statuses[label]
+            endpoints[label] = {
+                'requests': len(values),
+                'errors': sum(count for status, count in statuses.items() if status == 0 or status >= 500),
+                'statuses': {str(status): count for status, count in sorted(statuses.items())},
+                'throughput': round(len(values) / duration, 2),
+                'mean_ms': round(sum(values) / len(values) * 1000, 2),
+                'p50_ms': round(percentile(values, 0.50) * 1000, 2),
+                'p95_ms': round(percentile(values, 0.95) * 1000, 2),
+                'p99_ms': round(percentile(values, 0.99) * 1000, 2),
+                'max_ms': round(values[-1] * 1000, 2)
+            }
+        requests = sum(item['requests'] for item in endpoints.values())
+        return {
+            'duration_s': round(duration, 3),
+            'requests': requests,
+            'errors': sum(item['errors'] for item in endpoints.values()),
+            'throughput': round(requests / duration, 2) if duration else 0,
+            'endpoints': endpoints
+        }
+
+def percentile(sorted_values, fraction):
+    """最近秩法分位数"""
+    index = max(math.ceil(fraction * len(sorted_values)) - 1, 0)
+    return sorted_values[min(index, len(sorted_values) - 1)]
+
+class Session:
+    """场景中的一次请求序列：记录结果，成功时返回解析后的 JSON"""
+
+    def __init__(self, client, results):
+        self.client = client
+        self.results = results
+
+    def call(self, label, method, path, token, params=None, body=None):
+        status, payload, elapsed = self.client.request(method, path, token, params, body)
+        self.results.add(label, status, elapsed)
+        if 200 <= status < 300 and payload[:1] in (b'{', b'['):
+            return json.loads(payload)
+        return None
+
+    def get(self, label, path, token, **params):
+        return self.call('GET ' + label, 'GET', path, token, params or None)
+
+    def post(self, label, path, token, body=None):
+        return self.call('POST ' + label, 'POST', path, token, body=body)
+
+class Context:
+    """压测用的令牌和待审批记录（从数据库读取，本地签发令牌）"""
+
+    def __init__(self, app, users, random_seed=42):
+        rng = random.Random(random_seed)
+        with app.app_context():
+            employees = [user_id for (user_id,) in db.session.query(User.id).filter(
+                User.username.like(USERNAME_PREFIX + '%'), User.role == 'employee').order_by(User.id)]
+            if not employees:
+                raise RuntimeError('数据库中没有压测数据，请先运行 python -m benchmarks.seed')
+            managers = [user_id for (user_id,) in db.session.query(User.id).filter(
+                User.username.like(USERNAME_PREFIX + '%'), User.role == 'manager')]
+            admin = User.query.filter_by(role='admin').order_by(User.id).first()
+
+            self.employee_ids = rng.sample(employees, min(users, len(employees)))
+            self.employee_tokens = [create_access_token(identity=user_id) for user_id in self.employee_ids]
+            self.admin_token = create_access_token(identity=admin.id)
+            self.approver_tokens = [create_access_token(identity=user_id) for user_id in managers] or [self.admin_token]
+
+            pending = {}
+            for model in (LeaveRequest, ExpenseReport):
+                ids = [row_id for (row_id,) in db.session.query(model.id).filter(model.status == 'pending')]
+                rng.shuffle(ids)
+                pending[model.__tablename__] = deque(ids)
+            self.pending = pending
+
+        last_month = date.today().replace(day=1) - timedelta(days=1)
+        self.month = last_month.strftime('%Y-%m')
+        self.month_start = last_month.replace(day=1).isoformat()
+        self.month_end = last_month.isoformat()
+
+    def employee(self, index):
+        return self.employee_tokens[index % len(self.employee_tokens)]
+
+    def approver(self, index):
+        return self.approver_tokens[index % len(self.approver_tokens)]
+
+    def take_pending(self, table, count):
+        """取出待审批记录，并发会话之间不重复"""
+        ids = []
+        queue = self.pending[table]
+        for _ in range(count):
+            try:
+                ids.append(queue.popleft())
+            except IndexError:
+                break
+        return ids
+
+def punch_storm(session, ctx, index):
+    token = ctx.employee(index)
+    session.post('/api/attendance/clock-in', '/api/attendance/clock-in', token)
+    session.get('/api/attendance/today', '/api/attendance/today', token)
+    session.get('/api/schedule/today', '/api/schedule/today', token)
+
+def month_end_approvals(session, ctx, index):
+    token = ctx.approver(index)
+    session.get('/api/leave/requests?status=pending', '/api/leave/requests', token, status='pending', per_page=20)
+    for request_id in ctx.take_pending('leave_request', APPROVALS_PER_SESSION):
+        session.post('/api/leave/requests/<id>/approve', '/api/leave/requests/%d/approve' % request_id, token,
+                     {'action': 'approve', 'notes': '压测'})
+    session.get('/api/expense/reports?status=pending', '/api/expense/reports', token, status='pending', per_page=20)
+    for report_id in ctx.take_pending('expense_report', APPROVALS_PER_SESSION):
+        session.post('/api/expense/reports/<id>/approve', '/api/expense/reports/%d/approve' % report_id, token,
+                     {'action': 'approve', 'notes': '压测'})
+
+def payroll_export(session, ctx, index):
+    token = ctx.admin_token
+    session.get('/api/admin/attendance/statistics', '/api/admin/attendance/statistics', token, month=ctx.month)
+    session.get('/api/admin/attendance/records', '/api/admin/attendance/records', token,
+                start_date=ctx.month_start, end_date=ctx.month_end, page=index % 10 + 1, per_page=100)
+    session.get('/api/expense/statistics', '/api/expense/statistics', token, month=ctx.month)
+    if index % 10 == 0:
+        session.get('/api/admin/expense/receipts/export', '/api/admin/expense/receipts/export', token,
+                    month=ctx.month)
+
+def admin_browsing(session, ctx, index):
+    token = ctx.admin_token
+    session.get('/api/admin/users', '/api/admin/users', token, page=index % 20 + 1, per_page=20)
+    session.get('/api/admin/users?search', '/api/admin/users', token, search='%s%d' % (USERNAME_PREFIX, index % 10))
+    session.get('/api/admin/attendance/records?user_id', '/api/admin/attendance/records', token,
+                user_id=ctx.employee_ids[index % len(ctx.employee_ids)], per_page=31)
+    session.get('/api/diary/diaries', '/api/diary/diaries', token, page=index % 10 + 1)
+    session.get('/api/schedule/calendar', '/api/schedule/calendar', token, month=ctx.month)
+    session.get('/api/outing/board', '/api/outing/board', token)
+    session.get('/api/attendance/presence', '/api/attendance/presence', token)
+    session.post('/api/batch', '/api/batch', token, {'requests': [
+        {'id': 'leave', 'method': 'GET', 'path': '/api/leave/requests',
+         'params': {'status': 'pending', 'per_page': 1, 'fields': 'id'}},
+        {'id': 'expense', 'method': 'GET', 'path': '/api/expense/reports',
+         'params': {'status': 'pending', 'per_page': 1, 'fields': 'id'}},
+        {'id': 'attendance', 'method': 'GET', 'path': '/api/attendance/today'},
+        {'id': 'schedule', 'method': 'GET', 'path': '/api/schedule/today'}
+    ]})
+
+SCENARIOS = {
+    'punch_storm': punch_storm,
+    'month_end_approvals': month_end_approvals,
+    'payroll_export': payroll_export,
+    'admin_browsing': admin_browsing
+}
+
+def run_scenario(scenario, client, ctx, sessions, concurrency):
+    results = Results()
+    session = Session(client, results)
+    started = perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for future in [executor.submit(scenario, session, ctx, index) for index in range(sessions)]:
+            future.result()
+    return results.summary(perf_counter() - started)
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def print_summary(name, summary):
+    print('\n== %s: %d 请求 %.1fs %.1f 请求/秒 错误 %d' % (
+        name, summary['requests'], summary['duration_s'], summary['throughput'], summary['errors']))
+    print('%-46s %7s %6s %9s %9s %9s %9s' % ('接口', '请求数', '错误', '请求/秒', 'p50(ms)', 'p95(ms)', 'p99(ms)'))
+    for label, item in summary['endpoints'].items():
+        print('%-46s %7d %6d %9.1f %9.1f %9.1f %9.1f' % (
+            label, item['requests'], item['errors'], item['throughput'], item['p50_ms'], item['p95_ms'],
+            item['p99_ms']))
+
+def print_comparison(previous, current):
+    """与之前的结果对比吞吐量和 p95"""
+    print('\n== 对比 %s (%s)' % (previous.get('started_at'), previous.get('git_commit')))
+    print('%-66s %18s %22s' % ('场景 / 接口', '请求/秒', 'p95(ms)'))
+    for name, summary in current['scenarios'].items():
+        old_summary = previous.get('scenarios', {}).get(name)
+        if not old_summary:
+            continue
+        for label, item in summary['endpoints'].items():
+            old = old_summary['endpoints'].get(label)
+            if not old:
+                continue
+            print('%-66s %8.1f -> %-8.1f %9.1f -> %-9.1f' % (
+                '%s %s' % (name, label), old['throughput'], item['throughput'], old['p95_ms'], item['p95_ms']))
+
+def main():
+    parser = argparse.ArgumentParser(description='压测场景')
+    parser.add_argument('--base-url', default='http://127.0.0.1:5000')
+    parser.add_argument('--database-url', help='与服务相同的数据库，用于读取用户和待审批记录（默认 DATABASE_URL）')
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS), help='逗号分隔，默认全部')
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--sessions', type=int, default=200, help='每个场景的会话数（打卡高峰默认每个员工一次）')
+    parser.add_argument('--users', type=int, default=1000, help='参与打卡高峰的员工数')
+    parser.add_argument('--output', help='结果文件，默认 benchmarks/results/load-<时间>.json')
+    parser.add_argument('--compare', help='与之前的结果文件对比')
+    args = parser.parse_args()
+
+    names = [name.strip() for name in args.scenarios.split(',') if name.strip()]
+    unknown = [name for name in names if name not in SCENARIOS]
+    if unknown:
+        parser.error('未知场景: %s' % ', '.join(unknown))
+
+    app = create_app({'SQLALCHEMY_DATABASE_URI': args.database_url} if args.database_url else None)
+    ctx = Context(app, args.users)
+    client = HttpClient(args.base_url)
+
+    report = {
+        'started_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'git_commit': git_commit(),
+        'base_url': args.base_url,
+        'concurrency': args.concurrency,
+        'scenarios': {}
+    }
+    for name in names:
+        sessions = len(ctx.employee_tokens) if name == 'punch_storm' else args.sessions
+        summary = run_scenario(SCENARIOS[name], client, ctx, sessions, args.concurrency)
+        summary['sessions'] = sessions
+        report['scenarios'][name] = summary
+        print_summary(name, summary)
+
+    output = args.output or os.path.join(RESULTS_DIR, 'load-%s.json' % time.strftime('%Y%m%d-%H%M%S'))
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print('\n结果已写入 %s' % output)
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            print_comparison(json.load(f), report)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,274 @@
+"""压测数据生成：批量插入（executemany）写入接近实际规模的数据
+
+按门店（department）生成员工，每个门店一名店长（manager），另有管理员 admin。数据截止到昨天，
+压测时可以在当天打卡。所有员工密码相同（--password），默认管理员为 admin / admin123。
+
+运行（在 backend 目录下，使用新的数据库文件）：
+    python -m benchmarks.seed --database-url sqlite:///bench.db --stores 20 --users 10000 --years 3
+"""
+from werkzeug.security import generate_password_hash
+from sqlalchemy import Date, DateTime, Time
+from datetime import date, datetime, time, timedelta
+from itertools import islice
+import argparse
+import random
+import time as timer
+
+from app import create_app, init_db
+from models import (User, AttendanceRecord, Schedule, LeaveRequest, ExpenseReport, WorkDiary,
+                    OutingReport, db)
+from utils.diary_search import rebuild_search_index
+
+USERNAME_PREFIX = 'bench'
+SHIFTS = [
+    ('morning', time(8, 0), time(16, 0)),
+    ('afternoon', time(12, 0), time(20, 0)),
+    ('evening', time(14, 0), time(22, 0))
+]
+LEAVE_TYPES = ('sick', 'personal', 'annual', 'other')
+EXPENSE_TYPES = ('travel', 'meal', 'transportation', 'office', 'communication')
+DIARY_CONTENT = ('整理货架并盘点库存', '接待顾客并处理退换货', '完成新品陈列', '参加门店例会', '培训新员工收银流程')
+
+def username(number):
+    return '%s%05d' % (USERNAME_PREFIX, number)
+
+def user_rows(stores, users, password_hash, now):
+    for number in range(users):
+        store = number % stores
+        yield {
+            'username': username(number),
+            'email': '%s@bench.example.com' % username(number),
+            'password': password_hash,
+            'real_name': '员工%05d' % number,
+            'employee_id': 'B%05d' % number,
+            'department': '门店%02d' % (store + 1),
+            'position': '店长' if number < stores else '店员',
+            'role': 'manager' if number < stores else 'employee',
+            'is_active': True,
+            'created_at': now,
+            'updated_at': now
+        }
+
+def workdays(start, end, user_id):
+    """每人每周休息两天（按用户错开）"""
+    day = start
+    while day < end:
+        if (day.toordinal() + user_id) % 7 not in (0, 1):
+            yield day
+        day += timedelta(days=1)
+
+def attendance_and_schedule_rows(user_ids, start, end, rng):
+    """同时生成考勤和排班（排班决定上下班时间）"""
+    for user_id in user_ids:
+        shift_type, shift_start, shift_end = SHIFTS[user_id % len(SHIFTS)]
+        for day in workdays(start, end, user_id):
+            created_at = datetime.combine(day, time(0, 0))
+            schedule = {
+                'user_id': user_id, 'date': day, 'shift_type': shift_type, 'start_time': shift_start,
+                'end_time': shift_end, 'created_at': created_at, 'updated_at': created_at
+            }
+            if rng.random() < 0.02:
+                # executemany 要求每行的列相同
+                attendance = {
+                    'user_id': user_id, 'date': day, 'clock_in_time': None, 'clock_out_time': None,
+                    'clock_in_ip': None, 'work_hours': 0.0, 'status': 'absent',
+                    'created_at': created_at, 'updated_at': created_at
+                }
+            else:
+                clock_in = datetime.combine(day, shift_start) + timedelta(minutes=rng.randint(-15, 10))
+                clock_out = datetime.combine(day, shift_end) + timedelta(minutes=rng.randint(-10, 30))
+                if clock_in > datetime.combine(day, shift_start):
+                    status = 'late'
+                elif clock_out < datetime.combine(day, shift_end):
+                    status = 'early_leave'
+                else:
+                    status = 'normal'
+                attendance = {
+                    'user_id': user_id, 'date': day, 'clock_in_time': clock_in, 'clock_out_time': clock_out,
+                    'clock_in_ip': '10.0.%d.%d' % (user_id % 256, rng.randint(1, 254)),
+                    'work_hours': round((clock_out - clock_in).total_seconds() / 3600, 2), 'status': status,
+                    'created_at': clock_in, 'updated_at': clock_out
+                }
+            yield attendance, schedule
+
+def diary_rows(user_ids, start, end, rate, rng):
+    for user_id in user_ids:
+        for day in workdays(start, end, user_id):
+            if rng.random() < rate:
+                created_at = datetime.combine(day, time(18, rng.randint(0, 59)))
+                yield {
+                    'user_id': user_id, 'date': day, 'content': rng.choice(DIARY_CONTENT),
+                    'achievements': '完成当日销售目标' if rng.random() < 0.5 else None,
+                    'issues': None, 'next_plan': rng.choice(DIARY_CONTENT),
+                    'created_at': created_at, 'updated_at': created_at
+                }
+
+def status_for(created_at, end, rng):
+    """最近 30 天内的申请部分仍待审批"""
+    if (end - created_at.date()).days <= 30 and rng.random() < 0.5:
+        return 'pending'
+    return 'approved' if rng.random() < 0.9 else 'rejected'
+
+def request_rows(user_ids, approver_ids, start, end, rng):
+    """请假、报销、外出申请：(模型, 行)"""
+    days = (end - start).days
+    for user_id in user_ids:
+        approver_id = approver_ids[user_id % len(approver_ids)]
+        for kind, per_month in ((LeaveRequest, 0.5), (ExpenseReport, 2), (OutingReport, 1)):
+            for _ in range(int(days / 30 * per_month)):
+                day = start + timedelta(days=rng.randrange(days))
+                created_at = datetime.combine(day, time(rng.randint(8, 20), rng.randint(0, 59)))
+                status = status_for(created_at, end, rng)
+                row = {
+                    'user_id': user_id, 'status': status, 'created_at': created_at, 'updated_at': created_at,
+                    'approver_id': None if status == 'pending' else approver_id,
+                    'approved_at': None if status == 'pending' else created_at + timedelta(hours=rng.randint(1, 48))
+                }
+                if kind is LeaveRequest:
+                    length = rng.randint(1, 3)
+                    row.update(leave_type=rng.choice(LEAVE_TYPES), start_date=day + timedelta(days=7),
+                               end_date=day + timedelta(days=6 + length), days=length, reason='个人事务')
+                elif kind is ExpenseReport:
+                    row.update(expense_type=rng.choice(EXPENSE_TYPES), amount_cents=rng.randint(1000, 200000),
+                               date=day, description='门店日常支出')
+                else:
+                    start_time = created_at + timedelta(hours=1)
+                    expected = start_time + timedelta(hours=rng.randint(1, 4))
+                    row.update(destination='供应商仓库', purpose='提货', start_time=start_time,
+                               expected_return_time=expected,
+                               actual_return_time=expected if status == 'approved' else None,
+                               status='completed' if status == 'approved' else status)
+                yield kind, row
+
+def bind_processor(type_, dialect):
+    """SQLite 的日期时间按 ISO 格式存储文本，与 SQLAlchemy 的存储格式相同，用 isoformat 转换更快"""
+    if dialect.name == 'sqlite':
+        if isinstance(type_, DateTime):
+            return lambda value: value.isoformat(' ', 'microseconds')
+        if isinstance(type_, Date):
+            return date.isoformat
+        if isinstance(type_, Time):
+            return lambda value: value.isoformat('microseconds')
+    return type_.dialect_impl(dialect).bind_processor(dialect)
+
+def driver_insert(table, columns):
+    """编译一次 INSERT 语句，返回 (语句, 行转换函数)：直接交给驱动 executemany，
+    省去 SQLAlchemy 逐行构造参数的开销（各列的类型转换仍按方言处理）"""
+    dialect = db.engine.dialect
+    compiled = table.insert().compile(dialect=dialect, column_keys=columns)
+    keys = list(compiled.positiontup) if dialect.positional else columns
+    processors = [bind_processor(table.c[key].type, dialect) for key in keys]
+    pairs = list(zip(keys, processors))
+    # 行中没有给出、由 Python 端默认值填充的列（如 suspected_duplicate），取一次默认值
+    defaults = {}
+    for key in keys:
+        default = table.c[key].default
+        if key not in columns and default is not None:
+            defaults[key] = default.arg if default.is_scalar else default.arg(None)
+
+    def convert(row):
+        if defaults:
+            row = dict(defaults, **row)
+        values = [row[key] if processor is None or row[key] is None else processor(row[key])
+                  for key, processor in pairs]
+        return tuple(values) if dialect.positional else dict(zip(keys, values))
+    return str(compiled), convert
+
+def insert_chunks(table, rows, chunk_size):
+    """分批写入，返回写入行数（每批的行必须包含相同的列）"""
+    total = 0
+    statement = convert = None
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            return total
+        if statement is None:
+            statement, convert = driver_insert(table, list(chunk[0]))
+        db.session.connection().exec_driver_sql(statement, [convert(row) for row in chunk])
+        db.session.commit()
+        total += len(chunk)
+
+def seed(stores, users, years, diary_rate=0.3, password='bench123', chunk_size=5000, random_seed=42, log=print):
+    rng = random.Random(random_seed)
+    now = datetime.now()
+    end = date.today()
+    start = end - timedelta(days=365 * years)
+
+    if User.query.filter(User.username == username(0)).first():
+        raise RuntimeError('数据库中已有压测数据，请使用新的数据库')
+    if db.engine.dialect.name == 'sqlite':
+        # 加大页缓存，减少按日期等非插入顺序的索引写入时的磁盘读写
+        db.session.connection().exec_driver_sql('PRAGMA cache_size=-262144')
+
+    def step(name, func):
+        started = timer.perf_counter()
+        count = func()
+        elapsed = timer.perf_counter() - started
+        log('%-20s %10d 行 %8.1fs %10.0f 行/秒' % (name, count, elapsed, count / elapsed if elapsed else 0))
+        return count
+
+    # 所有员工使用同一个密码哈希（逐个计算哈希需要很长时间）
+    password_hash = generate_password_hash(password)
+    step('user', lambda: insert_chunks(User.__table__, user_rows(stores, users, password_hash, now), chunk_size))
+    rows = db.session.query(User.id, User.role).filter(User.username.like(USERNAME_PREFIX + '%')).order_by(User.id).all()
+    user_ids = [user_id for user_id, _ in rows]
+    approver_ids = [user_id for user_id, role in rows if role == 'manager'] or user_ids[:1]
+
+    schedules = []
+    def attendance():
+        def split():
+            for attendance_row, schedule_row in attendance_and_schedule_rows(user_ids, start, end, rng):
+                schedules.append(schedule_row)
+                if len(schedules) >= chunk_size:
+                    insert_chunks(Schedule.__table__, iter(schedules), chunk_size)
+                    schedules.clear()
+                yield attendance_row
+        count = insert_chunks(AttendanceRecord.__table__, split(), chunk_size)
+        insert_chunks(Schedule.__table__, iter(schedules), chunk_size)
+        return count
+    step('attendance+schedule', attendance)
+    step('work_diary', lambda: insert_chunks(WorkDiary.__table__, diary_rows(user_ids, start, end, diary_rate, rng),
+                                             chunk_size))
+
+    def diary_index():
+        # 批量插入不经过 ORM，全文索引需要单独重建
+        count = rebuild_search_index(db.session.connection())
+        db.session.commit()
+        return count
+    step('work_diary_fts', diary_index)
+
+    def requests():
+        buffers = {LeaveRequest: [], ExpenseReport: [], OutingReport: []}
+        count = 0
+        for kind, row in request_rows(user_ids, approver_ids, start, end, rng):
+            buffers[kind].append(row)
+            if len(buffers[kind]) >= chunk_size:
+                count += insert_chunks(kind.__table__, iter(buffers[kind]), chunk_size)
+                buffers[kind].clear()
+        for kind, rows in buffers.items():
+            count += insert_chunks(kind.__table__, iter(rows), chunk_size)
+        return count
+    step('leave/expense/outing', requests)
+
+    # 更新查询规划器的统计信息
+    db.session.execute(db.text('ANALYZE'))
+    db.session.commit()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='生成压测数据')
+    parser.add_argument('--database-url', help='默认使用 DATABASE_URL')
+    parser.add_argument('--stores', type=int, default=20)
+    parser.add_argument('--users', type=int, default=10000)
+    parser.add_argument('--years', type=int, default=3)
+    parser.add_argument('--diary-rate', type=float, default=0.3, help='提交日报的工作日比例')
+    parser.add_argument('--password', default='bench123')
+    parser.add_argument('--chunk-size', type=int, default=5000)
+    parser.add_argument('--seed', type=int, default=42, help='随机数种子')
+    args = parser.parse_args()
+
+    app = create_app({'SQLALCHEMY_DATABASE_URI': args.database_url} if args.database_url else None)
+    with app.app_context():
+        init_db()
+        started = timer.perf_counter()
+        seed(args.stores, args.users, args.years, args.diary_rate, args.password, args.chunk_size, args.seed)
+        print('完成，用时 %.1fs' % (timer.perf_counter() - started))
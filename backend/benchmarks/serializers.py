@@ -0,0 +1,131 @@
+"""行序列化器基准测试：对比原先逐行构造字典 + 标准库 JSON 与列查询 + 预编译序列化器 + orjson
+
+运行（在 backend 目录下）：
+    python -m benchmarks.serializers --rows 20000
+"""
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+from datetime import datetime, date, timedelta
+import argparse
+import time
+
+from models import AttendanceRecord, LeaveRequest, User, db
+from utils.json_provider import OrjsonProvider, orjson
+from utils.serializers import ATTENDANCE_RECORD, LEAVE_REQUEST, with_user_names
+
+def create_app():
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+    db.init_app(app)
+    return app
+
+def seed(rows):
+    users = [User(username='user%d' % i, email='user%d@example.com' % i, password='x', real_name='员工%d' % i)
+             for i in range(50)]
+    db.session.add_all(users)
+    db.session.flush()
+
+    start = datetime(2026, 1, 1, 9, 0, 0)
+    for i in range(rows):
+        day = start + timedelta(days=i // 50)
+        user_id = users[i % 50].id
+        db.session.add(AttendanceRecord(
+            user_id=user_id, date=day.date(), clock_in_time=day, clock_out_time=day + timedelta(hours=9),
+            work_hours=8.0, status='normal', notes=None if i % 3 else '备注'
+        ))
+        db.session.add(LeaveRequest(
+            user_id=user_id, leave_type='annual', start_date=day.date(), end_date=day.date(), days=1,
+            reason='事假', status='approved', approved_at=day, created_at=day
+        ))
+    db.session.commit()
+
+def legacy_attendance(records):
+    return [{
+        'id': record.id,
+        'user_id': record.user_id,
+        'username': record.user.username,
+        'real_name': record.user.real_name,
+        'date': record.date.strftime('%Y-%m-%d'),
+        'clock_in_time': record.clock_in_time.strftime('%Y-%m-%d %H:%M:%S') if record.clock_in_time else None,
+        'clock_out_time': record.clock_out_time.strftime('%Y-%m-%d %H:%M:%S') if record.clock_out_time else None,
+        'work_hours': record.work_hours,
+        'status': record.status,
+        'notes': record.notes
+    } for record in records]
+
+def legacy_leave(requests):
+    return [{
+        'id': req.id,
+        'user_id': req.user_id,
+        'username': req.user.username,
+        'real_name': req.user.real_name,
+        'leave_type': req.leave_type,
+        'start_date': req.start_date.strftime('%Y-%m-%d'),
+        'end_date': req.end_date.strftime('%Y-%m-%d'),
+        'days': req.days,
+        'reason': req.reason,
+        'status': req.status,
+        'approver_id': req.approver_id,
+        'approved_at': req.approved_at.strftime('%Y-%m-%d %H:%M:%S') if req.approved_at else None,
+        'approval_notes': req.approval_notes,
+        'created_at': req.created_at.strftime('%Y-%m-%d %H:%M:%S')
+    } for req in requests]
+
+def measure(func, repeat):
+    best = None
+    for _ in range(repeat):
+        db.session.expunge_all()
+        started = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None or elapsed < best else best
+    return best
+
+def run(rows, repeat):
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        seed(rows)
+
+        default_json = DefaultJSONProvider(app)
+        fast_json = OrjsonProvider(app) if orjson is not None else default_json
+
+        cases = [
+            ('attendance', AttendanceRecord, legacy_attendance, with_user_names(ATTENDANCE_RECORD, True)),
+            ('leave', LeaveRequest, legacy_leave, with_user_names(LEAVE_REQUEST, True))
+        ]
+
+        print('rows=%d repeat=%d orjson=%s' % (rows, repeat, 'yes' if orjson is not None else 'no'))
+        print('%-12s %-28s %14s' % ('model', 'variant', 'rows/s'))
+        for name, model, legacy, serializer in cases:
+            # 原实现：查询 ORM 实例（用户名通过连接预加载），逐行构造字典，标准库 JSON 编码
+            def legacy_full():
+                items = model.query.join(User, model.user_id == User.id).options(
+                    db.contains_eager(model.user)
+                ).all()
+                default_json.dumps({'items': legacy(items)})
+
+            # 新实现：只查询所需列，预编译序列化器，orjson 编码
+            def serializer_full():
+                items = serializer.query().join(User, model.user_id == User.id).all()
+                fast_json.dumps({'items': serializer.serialize_rows(items)})
+
+            instances = model.query.join(User, model.user_id == User.id).options(db.contains_eager(model.user)).all()
+            tuples = serializer.query().join(User, model.user_id == User.id).all()
+
+            results = [
+                ('serialize: legacy dict', lambda: legacy(instances)),
+                ('serialize: row serializer', lambda: serializer.serialize_rows(tuples)),
+                ('end-to-end: legacy', legacy_full),
+                ('end-to-end: serializer', serializer_full)
+            ]
+            for variant, func in results:
+                elapsed = measure(func, repeat)
+                print('%-12s %-28s %14.0f' % (name, variant, rows / elapsed))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='行序列化器基准测试')
+    parser.add_argument('--rows', type=int, default=20000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+    run(args.rows, args.repeat)
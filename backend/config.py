@@ -0,0 +1,84 @@
+from datetime import timedelta
+from sqlalchemy.engine import make_url
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+DEFAULT_GEVENT_POOL_SIZE = 10
+
+def env_bool(name, default):
+    return os.environ.get(name, 'true' if default else 'false').lower() == 'true'
+
+def env_int(name, default):
+    return int(os.environ.get(name, default))
+
+class Config:
+    """默认配置（从环境变量读取），create_app(config) 传入的配置会覆盖这里的值"""
+
+    SECRET_KEY = os.environ.get('SECRET_KEY', 'your-secret-key-here')
+    SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL', 'sqlite:///attendance.db')
+    SQLALCHEMY_TRACK_MODIFICATIONS = False
+    JWT_SECRET_KEY = os.environ.get('JWT_SECRET_KEY', 'jwt-secret-key')
+    JWT_ACCESS_TOKEN_EXPIRES = timedelta(hours=8)
+    RECEIPT_STORAGE_DIR = os.environ.get('RECEIPT_STORAGE_DIR')
+    RECEIPT_MAX_SIZE = env_int('RECEIPT_MAX_SIZE', 10 * 1024 * 1024)
+    OUTING_SWEEP_INTERVAL = env_int('OUTING_SWEEP_INTERVAL', 60)
+    EVENT_STREAM_HEARTBEAT = env_int('EVENT_STREAM_HEARTBEAT', 15)
+    EVENT_STREAM_MAX_DURATION = env_int('EVENT_STREAM_MAX_DURATION', 3600)
+    EVENT_STREAM_POLL_INTERVAL = float(os.environ.get('EVENT_STREAM_POLL_INTERVAL', 1))   # 秒
+    EVENT_LOG_RETENTION = env_int('EVENT_LOG_RETENTION', 24 * 3600)          # 秒
+    OUTING_SWEEPER_ENABLED = env_bool('OUTING_SWEEPER_ENABLED', True)
+    PRESENCE_RECONCILE_INTERVAL = env_int('PRESENCE_RECONCILE_INTERVAL', 300)
+    COMPRESS_ENABLED = env_bool('COMPRESS_ENABLED', True)
+    COMPRESS_MIN_SIZE = env_int('COMPRESS_MIN_SIZE', 1024)
+    METRICS_ENABLED = env_bool('METRICS_ENABLED', True)
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+    METRICS_LOCAL_ONLY = env_bool('METRICS_LOCAL_ONLY', False)   # 只允许本机抓取，可不设置令牌
+    METRICS_DIR = os.environ.get('METRICS_DIR')                  # 多进程汇总目录（gunicorn.conf.py 默认设置）
+    METRICS_FLUSH_INTERVAL = env_int('METRICS_FLUSH_INTERVAL', 5)
+    SLOW_QUERY_ENABLED = env_bool('SLOW_QUERY_ENABLED', True)
+    SLOW_QUERY_THRESHOLD_MS = env_int('SLOW_QUERY_THRESHOLD_MS', 200)
+    SLOW_QUERY_LOG_SIZE = env_int('SLOW_QUERY_LOG_SIZE', 200)
+    SLOW_QUERY_EXPLAIN_SAMPLE = float(os.environ.get('SLOW_QUERY_EXPLAIN_SAMPLE', 0.2))
+    IDEMPOTENCY_ENABLED = env_bool('IDEMPOTENCY_ENABLED', True)
+    IDEMPOTENCY_TTL = env_int('IDEMPOTENCY_TTL', 24 * 3600)          # 秒
+    KIOSK_SYNC_MAX_PUNCHES = env_int('KIOSK_SYNC_MAX_PUNCHES', 1000)
+    KIOSK_MAX_OFFLINE_DAYS = env_int('KIOSK_MAX_OFFLINE_DAYS', 7)
+    KIOSK_CLOCK_SKEW = env_int('KIOSK_CLOCK_SKEW', 300)          # 秒，允许终端时钟比服务器快的时间
+    DATABASE_REPLICA_URLS = [url.strip() for url in os.environ.get('DATABASE_REPLICA_URLS', '').split(',') if url.strip()]
+    DB_REPLICA_READ_YOUR_WRITES = env_int('DB_REPLICA_READ_YOUR_WRITES', 5)          # 秒
+    DB_REPLICA_RETRY_INTERVAL = env_int('DB_REPLICA_RETRY_INTERVAL', 30)
+    DB_REPLICA_HEALTH_CHECK_INTERVAL = env_int('DB_REPLICA_HEALTH_CHECK_INTERVAL', 10)
+    SQLITE_PROFILE = env_bool('SQLITE_PROFILE', True)
+    SQLITE_BUSY_TIMEOUT = env_int('SQLITE_BUSY_TIMEOUT', 5000)       # 毫秒
+    SQLITE_MMAP_SIZE = env_int('SQLITE_MMAP_SIZE', 256 * 1024 * 1024)
+
+    # gunicorn 部署（gunicorn.conf.py）：默认单个 gevent worker 进程，协程处理并发请求；
+    # gthread worker 时每个 worker 进程的线程数决定同时处理的请求数
+    WEB_WORKERS = env_int('WEB_WORKERS', 1)          # 0 表示按 CPU 核数计算
+    WEB_THREADS = env_int('WEB_THREADS', 8)
+    WEB_WORKER_CLASS = os.environ.get('WEB_WORKER_CLASS', 'gevent')
+    DB_POOL_SIZE = env_int('DB_POOL_SIZE', 0)        # 0 表示按 worker 类型计算（见 engine_options）
+    DB_MAX_OVERFLOW = env_int('DB_MAX_OVERFLOW', 5)
+    DB_POOL_RECYCLE = env_int('DB_POOL_RECYCLE', 1800)
+
+def default_pool_size(config):
+    """gthread：每个线程最多占用一个连接，再加上后台任务所需的连接；
+    gevent：协程数不设上限，连接池大小即每个进程同时访问数据库的请求数，超出的请求排队等待连接
+    """
+    if config.get('WEB_WORKER_CLASS', 'gevent') == 'gevent':
+        return DEFAULT_GEVENT_POOL_SIZE
+    return config.get('WEB_THREADS', 8) + 2
+
+def engine_options(config):
+    """确定连接池大小；内存 SQLite 使用单连接池，不设置连接池参数"""
+    url = make_url(config['SQLALCHEMY_DATABASE_URI'])
+    if url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:'):
+        return {}
+    return {
+        'pool_size': config.get('DB_POOL_SIZE') or default_pool_size(config),
+        'max_overflow': config.get('DB_MAX_OVERFLOW', 5),
+        'pool_recycle': config.get('DB_POOL_RECYCLE', 1800),
+        'pool_pre_ping': True
+    }
@@ -0,0 +1,66 @@
+"""gunicorn 配置：gunicorn -c gunicorn.conf.py wsgi:app
+
+预加载应用（preload_app）后由主进程 fork 出 worker，worker 数、连接池大小等从 config.Config 读取。
+默认使用 gevent 协程 worker：事件推送（SSE）长连接在等待期间只占用一个协程，不占用线程，也不占用数据库连接。
+改用 WEB_WORKER_CLASS=gthread 时每个 SSE 连接在 EVENT_STREAM_MAX_DURATION 秒内独占一个线程，
+WEB_THREADS 需大于同时在线的推送连接数，否则其他请求会排队等待空闲线程。
+"""
+import multiprocessing
+import os
+import shutil
+import tempfile
+from dotenv import load_dotenv
+
+load_dotenv()
+
+if os.environ.get('WEB_WORKER_CLASS', 'gevent') == 'gevent':
+    # 在预加载应用之前打补丁：应用导入时创建的锁、条件变量和后台线程都是协程版本，等待时不阻塞整个 worker
+    from gevent import monkey
+    monkey.patch_all()
+
+# 监控指标按进程写入该目录，抓取时汇总所有 worker（须在读取配置之前设置）
+os.environ.setdefault('METRICS_DIR', os.path.join(tempfile.gettempdir(), 'attendance-metrics-%d' % os.getpid()))
+
+from config import Config
+
+bind = os.environ.get('WEB_BIND', '0.0.0.0:5000')
+workers = Config.WEB_WORKERS or multiprocessing.cpu_count()
+worker_class = Config.WEB_WORKER_CLASS
+threads = Config.WEB_THREADS  # 仅 gthread worker 使用
+worker_connections = int(os.environ.get('WEB_WORKER_CONNECTIONS', 1000))  # 仅 gevent worker 使用
+preload_app = True
+timeout = int(os.environ.get('WEB_TIMEOUT', 60))
+graceful_timeout = int(os.environ.get('WEB_GRACEFUL_TIMEOUT', 30))
+keepalive = 5
+accesslog = '-'
+
+def post_fork(server, worker):
+    """fork 之后：丢弃从主进程继承的数据库连接池，再启动本进程的后台任务"""
+    from wsgi import app
+    from app import start_background_jobs
+    from models import db
+
+    with app.app_context():
+        # close=False：不关闭主进程仍在使用的连接，只让本进程重新建立连接
+        for engine in db.engines.values():
+            engine.dispose(close=False)
+
+    start_background_jobs(app)
+
+def on_starting(server):
+    """主进程启动：清空上次运行留下的监控指标"""
+    from utils.metrics import multiprocess_metrics
+    multiprocess_metrics(Config.METRICS_DIR).reset()
+
+def worker_exit(server, worker):
+    """worker 退出前写入最后的监控指标"""
+    from utils.metrics import multiprocess_metrics
+    multiprocess_metrics(Config.METRICS_DIR).flush()
+
+def child_exit(server, worker):
+    """worker 退出后（主进程中）把它的监控指标并入已退出进程的合计，计数不会回退"""
+    from utils.metrics import multiprocess_metrics
+    multiprocess_metrics(Config.METRICS_DIR).retire(worker.pid)
+
+def on_exit(server):
+    shutil.rmtree(Config.METRICS_DIR, ignore_errors=True)
@@ -0,0 +1,40 @@
+"""store expense amounts as integer cents
+
+Revision ID: 0002
+Revises: 0001a
+Create Date: 2026-10-19 10:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0002'
+down_revision = '0001a'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('expense_report') as batch_op:
+        batch_op.add_column(sa.Column('amount_cents', sa.BigInteger(), nullable=True))
+
+    op.execute('UPDATE expense_report SET amount_cents = ROUND(amount * 100)')
+
+    with op.batch_alter_table('expense_report') as batch_op:
+        batch_op.alter_column('amount_cents', existing_type=sa.BigInteger(), nullable=False)
+        batch_op.drop_column('amount')
+        batch_op.create_index('ix_expense_report_date_status', ['date', 'status'])
+
+
+def downgrade():
+    with op.batch_alter_table('expense_report') as batch_op:
+        batch_op.drop_index('ix_expense_report_date_status')
+        batch_op.add_column(sa.Column('amount', sa.Float(), nullable=True))
+
+    op.execute('UPDATE expense_report SET amount = amount_cents / 100.0')
+
+    with op.batch_alter_table('expense_report') as batch_op:
+        batch_op.alter_column('amount', existing_type=sa.Float(), nullable=False)
+        batch_op.drop_column('amount_cents')
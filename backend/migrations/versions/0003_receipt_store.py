@@ -0,0 +1,41 @@
+"""content-addressed receipt store
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-19 11:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0003'
+down_revision = '0002'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('receipt',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('sha256', sa.String(length=64), nullable=False),
+    sa.Column('size', sa.Integer(), nullable=False),
+    sa.Column('content_type', sa.String(length=100), nullable=False),
+    sa.Column('uploader_id', sa.Integer(), nullable=True),
+    sa.Column('has_thumbnail', sa.Boolean(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['uploader_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('sha256')
+    )
+    with op.batch_alter_table('expense_report') as batch_op:
+        batch_op.add_column(sa.Column('receipt_hash', sa.String(length=64), nullable=True))
+        batch_op.create_index('ix_expense_report_receipt_hash', ['receipt_hash'])
+
+
+def downgrade():
+    with op.batch_alter_table('expense_report') as batch_op:
+        batch_op.drop_index('ix_expense_report_receipt_hash')
+        batch_op.drop_column('receipt_hash')
+    op.drop_table('receipt')
@@ -0,0 +1,40 @@
+"""expense duplicate-detection fingerprint index
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-19 12:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0004'
+down_revision = '0003'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('expense_fingerprint',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('report_id', sa.Integer(), nullable=False),
+    sa.Column('kind', sa.String(length=20), nullable=False),
+    sa.Column('fingerprint', sa.String(length=40), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['report_id'], ['expense_report.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_expense_fingerprint_report_id', 'expense_fingerprint', ['report_id'])
+    op.create_index('ix_expense_fingerprint_fingerprint', 'expense_fingerprint', ['fingerprint'])
+    with op.batch_alter_table('expense_report') as batch_op:
+        batch_op.add_column(sa.Column('suspected_duplicate', sa.Boolean(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('expense_report') as batch_op:
+        batch_op.drop_column('suspected_duplicate')
+    op.drop_index('ix_expense_fingerprint_fingerprint', table_name='expense_fingerprint')
+    op.drop_index('ix_expense_fingerprint_report_id', table_name='expense_fingerprint')
+    op.drop_table('expense_fingerprint')
@@ -0,0 +1,64 @@
+"""full-text search index over work diaries
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-19 13:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0005'
+down_revision = '0004'
+branch_labels = None
+depends_on = None
+
+
+SQLITE_UPGRADE = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS work_diary_fts USING fts5("
+    "content, achievements, issues, next_plan, "
+    "content='work_diary', content_rowid='id', tokenize='trigram')",
+    "CREATE TRIGGER IF NOT EXISTS work_diary_fts_insert AFTER INSERT ON work_diary BEGIN "
+    "INSERT INTO work_diary_fts(rowid, content, achievements, issues, next_plan) "
+    "VALUES (new.id, new.content, new.achievements, new.issues, new.next_plan); END",
+    "CREATE TRIGGER IF NOT EXISTS work_diary_fts_delete AFTER DELETE ON work_diary BEGIN "
+    "INSERT INTO work_diary_fts(work_diary_fts, rowid, content, achievements, issues, next_plan) "
+    "VALUES ('delete', old.id, old.content, old.achievements, old.issues, old.next_plan); END",
+    "CREATE TRIGGER IF NOT EXISTS work_diary_fts_update AFTER UPDATE ON work_diary BEGIN "
+    "INSERT INTO work_diary_fts(work_diary_fts, rowid, content, achievements, issues, next_plan) "
+    "VALUES ('delete', old.id, old.content, old.achievements, old.issues, old.next_plan); "
+    "INSERT INTO work_diary_fts(rowid, content, achievements, issues, next_plan) "
+    "VALUES (new.id, new.content, new.achievements, new.issues, new.next_plan); END",
+    # 为已有日报建立索引
+    "INSERT INTO work_diary_fts(work_diary_fts) VALUES ('rebuild')"
+]
+
+SQLITE_DOWNGRADE = [
+    "DROP TRIGGER IF EXISTS work_diary_fts_update",
+    "DROP TRIGGER IF EXISTS work_diary_fts_delete",
+    "DROP TRIGGER IF EXISTS work_diary_fts_insert",
+    "DROP TABLE IF EXISTS work_diary_fts"
+]
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'sqlite':
+        for statement in SQLITE_UPGRADE:
+            op.execute(statement)
+    elif dialect == 'mysql':
+        op.execute(
+            "CREATE FULLTEXT INDEX ft_work_diary ON work_diary "
+            "(content, achievements, issues, next_plan) WITH PARSER ngram"
+        )
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'sqlite':
+        for statement in SQLITE_DOWNGRADE:
+            op.execute(statement)
+    elif dialect == 'mysql':
+        op.drop_index('ft_work_diary', table_name='work_diary')
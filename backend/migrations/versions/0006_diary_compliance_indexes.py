@@ -0,0 +1,26 @@
+"""indexes for the diary compliance report
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-19 14:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0006'
+down_revision = '0005'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_work_diary_user_date', 'work_diary', ['user_id', 'date'])
+    op.create_index('ix_schedule_date_user', 'schedule', ['date', 'user_id'])
+
+
+def downgrade():
+    op.drop_index('ix_schedule_date_user', table_name='schedule')
+    op.drop_index('ix_work_diary_user_date', table_name='work_diary')
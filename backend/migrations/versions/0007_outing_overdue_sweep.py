@@ -0,0 +1,29 @@
+"""overdue outing sweeper column and index
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-19 15:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0007'
+down_revision = '0006'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('outing_report') as batch_op:
+        batch_op.add_column(sa.Column('overdue_at', sa.DateTime(), nullable=True))
+        batch_op.create_index('ix_outing_report_status_return',
+                              ['status', 'actual_return_time', 'expected_return_time'])
+
+
+def downgrade():
+    with op.batch_alter_table('outing_report') as batch_op:
+        batch_op.drop_index('ix_outing_report_status_return')
+        batch_op.drop_column('overdue_at')
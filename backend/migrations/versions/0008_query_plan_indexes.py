@@ -0,0 +1,36 @@
+"""indexes for per-user, per-month and pending-status queries
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-19 18:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0008'
+down_revision = '0007'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_attendance_record_user_date', 'attendance_record', ['user_id', 'date'])
+    op.create_index('ix_attendance_record_date', 'attendance_record', ['date'])
+    op.create_index('ix_leave_request_status_created', 'leave_request', ['status', 'created_at'])
+    op.create_index('ix_leave_request_user_created', 'leave_request', ['user_id', 'created_at'])
+    op.create_index('ix_expense_report_status_created', 'expense_report', ['status', 'created_at'])
+    op.create_index('ix_expense_report_user_created', 'expense_report', ['user_id', 'created_at'])
+    op.create_index('ix_outing_report_user_created', 'outing_report', ['user_id', 'created_at'])
+
+
+def downgrade():
+    op.drop_index('ix_outing_report_user_created', table_name='outing_report')
+    op.drop_index('ix_expense_report_user_created', table_name='expense_report')
+    op.drop_index('ix_expense_report_status_created', table_name='expense_report')
+    op.drop_index('ix_leave_request_user_created', table_name='leave_request')
+    op.drop_index('ix_leave_request_status_created', table_name='leave_request')
+    op.drop_index('ix_attendance_record_date', table_name='attendance_record')
+    op.drop_index('ix_attendance_record_user_date', table_name='attendance_record')
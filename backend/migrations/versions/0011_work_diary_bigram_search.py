@@ -0,0 +1,87 @@
+"""index work diaries with bigrams so two-character terms use full-text search
+
+Revision ID: 0011
+Revises: 0010
+Create Date: 2026-10-19 21:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from utils.diary_search import BIGRAM_FUNCTION, bigram_segment
+
+
+# revision identifiers, used by Alembic.
+revision = '0011'
+down_revision = '0010'
+branch_labels = None
+depends_on = None
+
+
+DROP_INDEX = [
+    "DROP TRIGGER IF EXISTS work_diary_fts_update",
+    "DROP TRIGGER IF EXISTS work_diary_fts_delete",
+    "DROP TRIGGER IF EXISTS work_diary_fts_insert",
+    "DROP TABLE IF EXISTS work_diary_fts"
+]
+
+BIGRAM_INDEX = [
+    "CREATE VIRTUAL TABLE work_diary_fts USING fts5("
+    "content, achievements, issues, next_plan, content='', tokenize='unicode61')",
+    "CREATE TRIGGER work_diary_fts_insert AFTER INSERT ON work_diary BEGIN "
+    "INSERT INTO work_diary_fts(rowid, content, achievements, issues, next_plan) "
+    "VALUES (new.id, bigram_segment(new.content), bigram_segment(new.achievements), "
+    "bigram_segment(new.issues), bigram_segment(new.next_plan)); END",
+    "CREATE TRIGGER work_diary_fts_delete AFTER DELETE ON work_diary BEGIN "
+    "INSERT INTO work_diary_fts(work_diary_fts, rowid, content, achievements, issues, next_plan) "
+    "VALUES ('delete', old.id, bigram_segment(old.content), bigram_segment(old.achievements), "
+    "bigram_segment(old.issues), bigram_segment(old.next_plan)); END",
+    "CREATE TRIGGER work_diary_fts_update AFTER UPDATE OF "
+    "content, achievements, issues, next_plan ON work_diary BEGIN "
+    "INSERT INTO work_diary_fts(work_diary_fts, rowid, content, achievements, issues, next_plan) "
+    "VALUES ('delete', old.id, bigram_segment(old.content), bigram_segment(old.achievements), "
+    "bigram_segment(old.issues), bigram_segment(old.next_plan)); "
+    "INSERT INTO work_diary_fts(rowid, content, achievements, issues, next_plan) "
+    "VALUES (new.id, bigram_segment(new.content), bigram_segment(new.achievements), "
+    "bigram_segment(new.issues), bigram_segment(new.next_plan)); END",
+    # 为已有日报建立索引
+    "INSERT INTO work_diary_fts(rowid, content, achievements, issues, next_plan) "
+    "SELECT id, bigram_segment(content), bigram_segment(achievements), "
+    "bigram_segment(issues), bigram_segment(next_plan) FROM work_diary"
+]
+
+TRIGRAM_INDEX = [
+    "CREATE VIRTUAL TABLE work_diary_fts USING fts5("
+    "content, achievements, issues, next_plan, "
+    "content='work_diary', content_rowid='id', tokenize='trigram')",
+    "CREATE TRIGGER work_diary_fts_insert AFTER INSERT ON work_diary BEGIN "
+    "INSERT INTO work_diary_fts(rowid, content, achievements, issues, next_plan) "
+    "VALUES (new.id, new.content, new.achievements, new.issues, new.next_plan); END",
+    "CREATE TRIGGER work_diary_fts_delete AFTER DELETE ON work_diary BEGIN "
+    "INSERT INTO work_diary_fts(work_diary_fts, rowid, content, achievements, issues, next_plan) "
+    "VALUES ('delete', old.id, old.content, old.achievements, old.issues, old.next_plan); END",
+    "CREATE TRIGGER work_diary_fts_update AFTER UPDATE ON work_diary BEGIN "
+    "INSERT INTO work_diary_fts(work_diary_fts, rowid, content, achievements, issues, next_plan) "
+    "VALUES ('delete', old.id, old.content, old.achievements, old.issues, old.next_plan); "
+    "INSERT INTO work_diary_fts(rowid, content, achievements, issues, next_plan) "
+    "VALUES (new.id, new.content, new.achievements, new.issues, new.next_plan); END",
+    "INSERT INTO work_diary_fts(work_diary_fts) VALUES ('rebuild')"
+]
+
+
+def upgrade():
+    # MySQL 的 ngram 全文索引默认即按二元组分词，无需修改
+    bind = op.get_bind()
+    if bind.dialect.name != 'sqlite':
+        return
+    # 应用的连接已注册分词函数，这里再注册一次，以便单独运行迁移
+    bind.connection.driver_connection.create_function(BIGRAM_FUNCTION, 1, bigram_segment, deterministic=True)
+    for statement in DROP_INDEX + BIGRAM_INDEX:
+        op.execute(statement)
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    for statement in DROP_INDEX + TRIGRAM_INDEX:
+        op.execute(statement)
@@ -0,0 +1,37 @@
+"""store pushed events in a shared event log
+
+Revision ID: 0012
+Revises: 0011
+Create Date: 2026-10-19 22:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0012'
+down_revision = '0011'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('event_log',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('event_type', sa.String(length=50), nullable=False),
+    sa.Column('data', sa.Text(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=True),
+    sa.Column('managers', sa.Boolean(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sqlite_autoincrement=True
+    )
+    with op.batch_alter_table('event_log') as batch_op:
+        batch_op.create_index(batch_op.f('ix_event_log_created_at'), ['created_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('event_log') as batch_op:
+        batch_op.drop_index(batch_op.f('ix_event_log_created_at'))
+    op.drop_table('event_log')
@@ -0,0 +1,30 @@
+"""track per-user table versions for the today cache
+
+Revision ID: 0013
+Revises: 0012
+Create Date: 2026-10-19 23:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0013'
+down_revision = '0012'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('user_table_version',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('table_name', sa.String(length=64), nullable=False),
+    sa.Column('version', sa.Integer(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('user_id', 'table_name')
+    )
+
+
+def downgrade():
+    op.drop_table('user_table_version')
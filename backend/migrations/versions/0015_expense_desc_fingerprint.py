@@ -0,0 +1,34 @@
+"""drop description fingerprints without date and type
+
+Revision ID: 0015
+Revises: 0014
+Create Date: 2026-10-20 01:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0015'
+down_revision = '0014'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # 旧的描述指纹不含日期和类型，周期性报销会一直被误判为重复；
+    # 新指纹蕴含"金额、日期、类型完全相同"，命中时必然同时命中 exact 指纹，
+    # 因此删除旧指纹后按剩余指纹重算标记即可，描述原因在报销单下次修改时补建
+    op.execute("DELETE FROM expense_fingerprint WHERE kind = 'desc'")
+    op.execute(
+        "UPDATE expense_report SET suspected_duplicate = EXISTS ("
+        "SELECT 1 FROM expense_fingerprint f1 JOIN expense_fingerprint f2 "
+        "ON f2.fingerprint = f1.fingerprint AND f2.report_id <> f1.report_id "
+        "WHERE f1.report_id = expense_report.id)"
+    )
+
+
+def downgrade():
+    # 旧格式的描述指纹无法还原，也不需要还原
+    pass
@@ -0,0 +1,62 @@
+"""segment work diaries in the application instead of fts triggers
+
+Revision ID: 0016
+Revises: 0015
+Create Date: 2026-10-20 02:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from utils.diary_search import BIGRAM_FUNCTION, bigram_segment
+
+
+# revision identifiers, used by Alembic.
+revision = '0016'
+down_revision = '0015'
+branch_labels = None
+depends_on = None
+
+
+DROP_TRIGGERS = [
+    "DROP TRIGGER IF EXISTS work_diary_fts_update",
+    "DROP TRIGGER IF EXISTS work_diary_fts_delete",
+    "DROP TRIGGER IF EXISTS work_diary_fts_insert"
+]
+
+BIGRAM_TRIGGERS = [
+    "CREATE TRIGGER work_diary_fts_insert AFTER INSERT ON work_diary BEGIN "
+    "INSERT INTO work_diary_fts(rowid, content, achievements, issues, next_plan) "
+    "VALUES (new.id, bigram_segment(new.content), bigram_segment(new.achievements), "
+    "bigram_segment(new.issues), bigram_segment(new.next_plan)); END",
+    "CREATE TRIGGER work_diary_fts_delete AFTER DELETE ON work_diary BEGIN "
+    "INSERT INTO work_diary_fts(work_diary_fts, rowid, content, achievements, issues, next_plan) "
+    "VALUES ('delete', old.id, bigram_segment(old.content), bigram_segment(old.achievements), "
+    "bigram_segment(old.issues), bigram_segment(old.next_plan)); END",
+    "CREATE TRIGGER work_diary_fts_update AFTER UPDATE OF "
+    "content, achievements, issues, next_plan ON work_diary BEGIN "
+    "INSERT INTO work_diary_fts(work_diary_fts, rowid, content, achievements, issues, next_plan) "
+    "VALUES ('delete', old.id, bigram_segment(old.content), bigram_segment(old.achievements), "
+    "bigram_segment(old.issues), bigram_segment(old.next_plan)); "
+    "INSERT INTO work_diary_fts(rowid, content, achievements, issues, next_plan) "
+    "VALUES (new.id, bigram_segment(new.content), bigram_segment(new.achievements), "
+    "bigram_segment(new.issues), bigram_segment(new.next_plan)); END"
+]
+
+
+def upgrade():
+    # 触发器调用的 bigram_segment() 只在应用的连接上注册，其他连接写入日报表会失败；
+    # 改由应用在 flush 时分词写入索引，分词结果不变，已有索引无需重建
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    for statement in DROP_TRIGGERS:
+        op.execute(statement)
+
+
+def downgrade():
+    bind = op.get_bind()
+    if bind.dialect.name != 'sqlite':
+        return
+    bind.connection.driver_connection.create_function(BIGRAM_FUNCTION, 1, bigram_segment, deterministic=True)
+    for statement in BIGRAM_TRIGGERS:
+        op.execute(statement)
@@ -1,8 +1,11 @@
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime
 from werkzeug.security import generate_password_hash, check_password_hash
+from utils.money import cents_to_amount
+from utils.replicas import RoutingSession
 
-db = SQLAlchemy()
+# 只读接口的查询可路由到只读副本（见 utils/replicas.py）
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 
 class User(db.Model):
     """用户表"""
@@ -17,15 +20,17 @@ class User(db.Model):
     phone = db.Column(db.String(20), nullable=True)
     role = db.Column(db.String(20), default='employee')  # admin, manager, employee
     is_active = db.Column(db.Boolean, default=True)
+    # 排班订阅令牌版本，重置订阅地址时递增，旧令牌随之失效
+    feed_token_version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     # 关联关系
     attendance_records = db.relationship('AttendanceRecord', backref='user', lazy=True)
-    leave_requests = db.relationship('LeaveRequest', backref='user', lazy=True)
-    expense_reports = db.relationship('ExpenseReport', backref='user', lazy=True)
+    leave_requests = db.relationship('LeaveRequest', backref='user', lazy=True, foreign_keys='LeaveRequest.user_id')
+    expense_reports = db.relationship('ExpenseReport', backref='user', lazy=True, foreign_keys='ExpenseReport.user_id')
     work_diaries = db.relationship('WorkDiary', backref='user', lazy=True)
-    outing_reports = db.relationship('OutingReport', backref='user', lazy=True)
+    outing_reports = db.relationship('OutingReport', backref='user', lazy=True, foreign_keys='OutingReport.user_id')
     schedules = db.relationship('Schedule', backref='user', lazy=True)
 
 class AttendanceRecord(db.Model):
@@ -42,6 +47,11 @@ class AttendanceRecord(db.Model):
     notes = db.Column(db.Text, nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    __table_args__ = (
+        db.Index('ix_attendance_record_user_date', 'user_id', 'date'),
+        db.Index('ix_attendance_record_date', 'date'),
+    )
 
 class LeaveRequest(db.Model):
     """请假申请表"""
@@ -58,22 +68,58 @@ class LeaveRequest(db.Model):
     approval_notes = db.Column(db.Text, nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    __table_args__ = (
+        db.Index('ix_leave_request_status_created', 'status', 'created_at'),
+        db.Index('ix_leave_request_user_created', 'user_id', 'created_at'),
+    )
 
 class ExpenseReport(db.Model):
     """费用报销表"""
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     expense_type = db.Column(db.String(50), nullable=False)  # travel, meal, office, etc.
-    amount = db.Column(db.Float, nullable=False)
+    amount_cents = db.Column(db.BigInteger, nullable=False)  # 金额（分），定点存储避免浮点误差
     date = db.Column(db.Date, nullable=False)
     description = db.Column(db.Text, nullable=False)
     receipt_url = db.Column(db.String(255), nullable=True)
+    receipt_hash = db.Column(db.String(64), nullable=True, index=True)  # 上传凭证的 SHA-256
+    suspected_duplicate = db.Column(db.Boolean, default=False)  # 指纹索引检测到疑似重复报销
     status = db.Column(db.String(20), default='pending')  # pending, approved, rejected
     approver_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
     approved_at = db.Column(db.DateTime, nullable=True)
     approval_notes = db.Column(db.Text, nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    __table_args__ = (
+        db.Index('ix_expense_report_date_status', 'date', 'status'),
+        db.Index('ix_expense_report_status_created', 'status', 'created_at'),
+        db.Index('ix_expense_report_user_created', 'user_id', 'created_at'),
+    )
+    
+    @property
+    def amount(self):
+        """金额（元）"""
+        return cents_to_amount(self.amount_cents)
+
+class ExpenseFingerprint(db.Model):
+    """报销指纹索引表（用于重复报销检测）"""
+    id = db.Column(db.Integer, primary_key=True)
+    report_id = db.Column(db.Integer, db.ForeignKey('expense_report.id'), nullable=False, index=True)
+    kind = db.Column(db.String(20), nullable=False)  # receipt, exact, desc
+    fingerprint = db.Column(db.String(40), nullable=False, index=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class Receipt(db.Model):
+    """报销凭证文件表（按内容 SHA-256 寻址，相同文件只存一份）"""
+    id = db.Column(db.Integer, primary_key=True)
+    sha256 = db.Column(db.String(64), unique=True, nullable=False)
+    size = db.Column(db.Integer, nullable=False)
+    content_type = db.Column(db.String(100), nullable=False)
+    uploader_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
+    has_thumbnail = db.Column(db.Boolean, default=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
 class WorkDiary(db.Model):
     """工作日报表"""
@@ -86,6 +132,10 @@ class WorkDiary(db.Model):
     next_plan = db.Column(db.Text, nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    __table_args__ = (
+        db.Index('ix_work_diary_user_date', 'user_id', 'date'),
+    )
 
 class OutingReport(db.Model):
     """外出报备表"""
@@ -101,8 +151,14 @@ class OutingReport(db.Model):
     approver_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
     approved_at = db.Column(db.DateTime, nullable=True)
     approval_notes = db.Column(db.Text, nullable=True)
+    overdue_at = db.Column(db.DateTime, nullable=True)  # 超时扫描发现未按时返回的时间
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    __table_args__ = (
+        db.Index('ix_outing_report_status_return', 'status', 'actual_return_time', 'expected_return_time'),
+        db.Index('ix_outing_report_user_created', 'user_id', 'created_at'),
+    )
 
 class Schedule(db.Model):
     """排班表"""
@@ -117,6 +173,22 @@ class Schedule(db.Model):
     notes = db.Column(db.Text, nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    __table_args__ = (
+        db.Index('ix_schedule_date_user', 'date', 'user_id'),
+    )
+
+class Kiosk(db.Model):
+    """门店打卡终端（断网时离线打卡，恢复后批量同步）"""
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), nullable=False)
+    department = db.Column(db.String(100), nullable=True)  # 所在门店，为空时不限制员工所属门店
+    secret = db.Column(db.String(64), nullable=False)  # 批量同步请求的 HMAC 签名密钥
+    last_sequence = db.Column(db.Integer, nullable=False, default=0)  # 已处理的最大打卡序号
+    last_sync_at = db.Column(db.DateTime, nullable=True)
+    is_active = db.Column(db.Boolean, default=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
 class SystemSettings(db.Model):
     """系统设置表"""
@@ -125,4 +197,44 @@ class SystemSettings(db.Model):
     value = db.Column(db.Text, nullable=False)
     description = db.Column(db.String(255), nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
\ No newline at end of file
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class TableVersion(db.Model):
+    """数据表版本表（用于缓存校验）"""
+    table_name = db.Column(db.String(64), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class UserTableVersion(db.Model):
+    """按用户的数据表版本表（用于按用户缓存的校验）"""
+    user_id = db.Column(db.Integer, primary_key=True)
+    table_name = db.Column(db.String(64), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class EventLog(db.Model):
+    """事件日志（实时推送）：与业务数据在同一事务中写入，各进程按自增 ID 轮询推送"""
+    id = db.Column(db.Integer, primary_key=True)
+    event_type = db.Column(db.String(50), nullable=False)
+    data = db.Column(db.Text, nullable=False)  # JSON
+    user_id = db.Column(db.Integer, nullable=True)  # 相关员工（推送给本人）
+    managers = db.Column(db.Boolean, nullable=False, default=False)  # 是否同时推送给管理员和经理
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    
+    # ID 不复用：清理旧事件后新事件的 ID 仍然递增，客户端的 Last-Event-ID 不会指向其他事件
+    __table_args__ = {'sqlite_autoincrement': True}
+
+class IdempotencyKey(db.Model):
+    """写请求的幂等键：与处理函数写入的数据在同一事务中插入，所有进程共享"""
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, nullable=False)
+    idempotency_key = db.Column(db.String(255), nullable=False)
+    fingerprint = db.Column(db.String(64), nullable=False)  # 请求方法、路径和请求体的 SHA-256
+    status_code = db.Column(db.Integer, nullable=True)  # 为空表示请求仍在处理中
+    body = db.Column(db.LargeBinary, nullable=True)
+    content_type = db.Column(db.String(255), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'idempotency_key', name='uq_idempotency_key_user_key'),
+    )
@@ -1,6 +1,16 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app, Response, stream_with_context
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from models import User, SystemSettings, AttendanceRecord, db
+from sqlalchemy import func
+from models import User, SystemSettings, AttendanceRecord, ExpenseReport, Receipt, Kiosk, db
+from utils.dates import month_range
+from utils.receipts import ALLOWED_CONTENT_TYPES, receipt_path, stream_zip
+from utils.expense_dedup import scan_duplicates
+from utils.events import event_bus, publish_user_changed
+from utils.pagination import paginate_projected
+from utils.serializers import USER, ATTENDANCE_RECORD, with_user_names, select_fields
+from utils.replicas import read_only
+from utils.slow_queries import slow_query_log
+from utils.kiosk import new_secret
 from datetime import datetime, date
 from werkzeug.security import generate_password_hash
 
@@ -20,13 +30,19 @@ def admin_required(func):
 @bp.route('/users', methods=['GET'])
 @jwt_required()
 @admin_required
+@read_only
 def get_users():
     """获取用户列表"""
     page = request.args.get('page', 1, type=int)
     per_page = request.args.get('per_page', 20, type=int)
     search = request.args.get('search', '')
     
-    query = User.query
+    try:
+        serializer = select_fields(USER, request.args.get('fields'))
+    except ValueError as e:
+        return jsonify({'error': '未知字段: %s' % e}), 400
+    
+    query = serializer.query()
     if search:
         query = query.filter(
             User.username.contains(search) |
@@ -34,23 +50,13 @@ def get_users():
             User.email.contains(search)
         )
     
-    pagination = query.paginate(page=page, per_page=per_page, error_out=False)
-    users = pagination.items
+    count_query = query.with_entities(func.count(User.id))
+    query = query.order_by(User.id)
+    
+    pagination = paginate_projected(query, count_query, page, per_page)
     
     return jsonify({
-        'users': [{
-            'id': user.id,
-            'username': user.username,
-            'email': user.email,
-            'real_name': user.real_name,
-            'employee_id': user.employee_id,
-            'department': user.department,
-            'position': user.position,
-            'phone': user.phone,
-            'role': user.role,
-            'is_active': user.is_active,
-            'created_at': user.created_at.isoformat() if user.created_at else None
-        } for user in users],
+        'users': serializer.serialize_rows(pagination.items),
         'pagination': {
             'page': pagination.page,
             'per_page': pagination.per_page,
@@ -97,6 +103,8 @@ def create_user():
     )
     
     db.session.add(user)
+    db.session.flush()
+    publish_user_changed(user)
     db.session.commit()
     
     return jsonify({'message': '用户创建成功', 'user_id': user.id}), 201
@@ -135,6 +143,7 @@ def update_user(user_id):
         user.email = data['email']
     
     user.updated_at = datetime.utcnow()
+    publish_user_changed(user)
     db.session.commit()
     
     return jsonify({'message': '用户信息更新成功'}), 200
@@ -153,6 +162,7 @@ def delete_user(user_id):
         return jsonify({'error': '不能删除管理员用户'}), 400
     
     db.session.delete(user)
+    event_bus.publish('user.deleted', {'id': user_id}, managers=True)
     db.session.commit()
     
     return jsonify({'message': '用户删除成功'}), 200
@@ -194,6 +204,7 @@ def update_settings():
 @bp.route('/attendance/records', methods=['GET'])
 @jwt_required()
 @admin_required
+@read_only
 def get_attendance_records():
     """获取所有考勤记录"""
     page = request.args.get('page', 1, type=int)
@@ -202,7 +213,12 @@ def get_attendance_records():
     end_date = request.args.get('end_date')
     user_id = request.args.get('user_id', type=int)
     
-    query = AttendanceRecord.query.join(User)
+    serializer = with_user_names(ATTENDANCE_RECORD, True)
+    try:
+        serializer = select_fields(serializer, request.args.get('fields'))
+    except ValueError as e:
+        return jsonify({'error': '未知字段: %s' % e}), 400
+    query = serializer.query().join(User, AttendanceRecord.user_id == User.id)
     
     if start_date:
         query = query.filter(AttendanceRecord.date >= datetime.strptime(start_date, '%Y-%m-%d').date())
@@ -211,24 +227,13 @@ def get_attendance_records():
     if user_id:
         query = query.filter(AttendanceRecord.user_id == user_id)
     
+    count_query = query.with_entities(func.count(AttendanceRecord.id))
     query = query.order_by(AttendanceRecord.date.desc())
     
-    pagination = query.paginate(page=page, per_page=per_page, error_out=False)
-    records = pagination.items
+    pagination = paginate_projected(query, count_query, page, per_page)
     
     return jsonify({
-        'records': [{
-            'id': record.id,
-            'user_id': record.user_id,
-            'username': record.user.username,
-            'real_name': record.user.real_name,
-            'date': record.date.strftime('%Y-%m-%d'),
-            'clock_in_time': record.clock_in_time.strftime('%Y-%m-%d %H:%M:%S') if record.clock_in_time else None,
-            'clock_out_time': record.clock_out_time.strftime('%Y-%m-%d %H:%M:%S') if record.clock_out_time else None,
-            'work_hours': record.work_hours,
-            'status': record.status,
-            'notes': record.notes
-        } for record in records],
+        'records': serializer.serialize_rows(pagination.items),
         'pagination': {
             'page': pagination.page,
             'per_page': pagination.per_page,
@@ -242,17 +247,19 @@ def get_attendance_records():
 @bp.route('/attendance/statistics', methods=['GET'])
 @jwt_required()
 @admin_required
+@read_only
 def attendance_statistics():
     """获取考勤统计"""
     month = request.args.get('month', datetime.now().strftime('%Y-%m'))
     
     # 解析月份
     year, month_num = map(int, month.split('-'))
+    month_start, month_end = month_range(year, month_num)
     
-    # 获取当月考勤记录
+    # 获取当月考勤记录（按日期范围过滤，可以使用索引）
     records = AttendanceRecord.query.filter(
-        db.extract('year', AttendanceRecord.date) == year,
-        db.extract('month', AttendanceRecord.date) == month_num
+        AttendanceRecord.date >= month_start,
+        AttendanceRecord.date < month_end
     ).all()
     
     # 统计数据
@@ -271,4 +278,145 @@ def attendance_statistics():
         'late_count': late_count,
         'early_leave_count': early_leave_count,
         'absent_count': absent_count
-    }), 200
\ No newline at end of file
+    }), 200
+
+@bp.route('/expense/receipts/export', methods=['GET'])
+@jwt_required()
+@admin_required
+def export_expense_receipts():
+    """打包下载当月报销凭证（流式生成 ZIP，不在内存中构建整个文件）"""
+    month = request.args.get('month', datetime.now().strftime('%Y-%m'))
+    
+    # 解析月份
+    year, month_num = map(int, month.split('-'))
+    month_start, month_end = month_range(year, month_num)
+    
+    rows = db.session.query(
+        ExpenseReport.id,
+        ExpenseReport.date,
+        ExpenseReport.receipt_hash,
+        User.username,
+        Receipt.content_type
+    ).join(
+        User, ExpenseReport.user_id == User.id
+    ).join(
+        Receipt, Receipt.sha256 == ExpenseReport.receipt_hash
+    ).filter(
+        ExpenseReport.date >= month_start,
+        ExpenseReport.date < month_end
+    ).order_by(ExpenseReport.date, ExpenseReport.id).all()
+    
+    root = current_app.config['RECEIPT_STORAGE_DIR']
+    entries = [(
+        '%s_%s_%d%s' % (
+            row.date.strftime('%Y-%m-%d'),
+            row.username,
+            row.id,
+            ALLOWED_CONTENT_TYPES.get(row.content_type, '')
+        ),
+        receipt_path(row.receipt_hash, root)
+    ) for row in rows]
+    
+    response = Response(stream_with_context(stream_zip(entries)), mimetype='application/zip')
+    response.headers['Content-Disposition'] = 'attachment; filename="receipts-%s.zip"' % month
+    return response
+
+@bp.route('/expense/duplicates/scan', methods=['POST'])
+@jwt_required()
+@admin_required
+def scan_expense_duplicates():
+    """批量扫描全年疑似重复报销"""
+    year = request.args.get('year', datetime.now().year, type=int)
+    
+    groups = scan_duplicates(year)
+    
+    return jsonify({
+        'year': year,
+        'group_count': len(groups),
+        'groups': groups
+    }), 200
+
+@bp.route('/slow-queries', methods=['GET'])
+@jwt_required()
+@admin_required
+def get_slow_queries():
+    """查看最近的慢查询（按时间倒序）"""
+    limit = request.args.get('limit', 50, type=int)
+    endpoint = request.args.get('endpoint')
+    
+    slow_log = slow_query_log()
+    if slow_log is None:
+        return jsonify({'error': '慢查询记录未启用'}), 404
+    
+    entries = slow_log.recent()
+    if endpoint:
+        entries = [entry for entry in entries if entry['endpoint'] == endpoint]
+    if request.args.get('full_scan') == 'true':
+        entries = [entry for entry in entries if entry['full_scan']]
+    
+    return jsonify({
+        'threshold_ms': slow_log.threshold * 1000,
+        'total': len(entries),
+        'queries': entries[:limit]
+    }), 200
+
+@bp.route('/slow-queries', methods=['DELETE'])
+@jwt_required()
+@admin_required
+def clear_slow_queries():
+    """清空慢查询记录"""
+    slow_log = slow_query_log()
+    if slow_log is None:
+        return jsonify({'error': '慢查询记录未启用'}), 404
+    
+    slow_log.clear()
+    
+    return jsonify({'message': '慢查询记录已清空'}), 200
+
+def kiosk_to_dict(kiosk):
+    return {
+        'id': kiosk.id,
+        'name': kiosk.name,
+        'department': kiosk.department,
+        'last_sequence': kiosk.last_sequence,
+        'last_sync_at': kiosk.last_sync_at.strftime('%Y-%m-%d %H:%M:%S') if kiosk.last_sync_at else None,
+        'is_active': kiosk.is_active
+    }
+
+@bp.route('/kiosks', methods=['GET'])
+@jwt_required()
+@admin_required
+def get_kiosks():
+    """获取门店打卡终端列表"""
+    kiosks = Kiosk.query.order_by(Kiosk.id).all()
+    return jsonify({'kiosks': [kiosk_to_dict(kiosk) for kiosk in kiosks]}), 200
+
+@bp.route('/kiosks', methods=['POST'])
+@jwt_required()
+@admin_required
+def create_kiosk():
+    """登记门店打卡终端，返回签名密钥（只在登记时返回一次）"""
+    data = request.get_json() or {}
+    if not data.get('name'):
+        return jsonify({'error': 'name 是必填字段'}), 400
+    
+    kiosk = Kiosk(name=data['name'], department=data.get('department') or None, secret=new_secret(),
+                  last_sequence=0)
+    db.session.add(kiosk)
+    db.session.commit()
+    
+    return jsonify(dict(kiosk_to_dict(kiosk), secret=kiosk.secret)), 201
+
+@bp.route('/kiosks/<int:kiosk_id>', methods=['DELETE'])
+@jwt_required()
+@admin_required
+def deactivate_kiosk(kiosk_id):
+    """停用门店打卡终端（保留记录，之后的同步请求认证失败）"""
+    kiosk = Kiosk.query.get(kiosk_id)
+    if not kiosk:
+        return jsonify({'error': '终端不存在'}), 404
+    
+    kiosk.is_active = False
+    db.session.commit()
+    
+    return jsonify({'message': '终端已停用'}), 200
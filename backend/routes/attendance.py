@@ -1,6 +1,16 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from models import AttendanceRecord, User, SystemSettings, db
+from sqlalchemy import func
+from models import AttendanceRecord, User, SystemSettings, Kiosk, db
+from utils.events import event_bus
+from utils.presence import presence_index
+from utils.today_cache import today_json, SECTION_ATTENDANCE
+from utils.pagination import paginate_projected
+from utils.dates import month_range
+from utils.serializers import ATTENDANCE_HISTORY, select_fields
+from utils.replicas import read_only
+from utils.kiosk import (KIOSK_HEADER, SIGNATURE_HEADER, verify_signature, ip_allowed, load_settings,
+                         parse_punches, apply_punches)
 from datetime import datetime, date, time
 import ipaddress
 
@@ -54,6 +64,11 @@ def clock_in():
         )
         db.session.add(record)
     
+    event_bus.publish('attendance.clock_in', {
+        'date': today.strftime('%Y-%m-%d'),
+        'clock_in_time': current_time.strftime('%Y-%m-%d %H:%M:%S'),
+        'status': status
+    }, user_id=user_id, managers=True)
     db.session.commit()
     
     return jsonify({
@@ -112,6 +127,12 @@ def clock_out():
     record.work_hours = round(work_hours, 2)
     record.updated_at = datetime.utcnow()
     
+    event_bus.publish('attendance.clock_out', {
+        'date': today.strftime('%Y-%m-%d'),
+        'clock_out_time': current_time.strftime('%Y-%m-%d %H:%M:%S'),
+        'work_hours': record.work_hours,
+        'status': record.status
+    }, user_id=user_id, managers=True)
     db.session.commit()
     
     return jsonify({
@@ -121,6 +142,73 @@ def clock_out():
         'status': record.status
     }), 200
 
+@bp.route('/kiosk-sync', methods=['POST'])
+def kiosk_sync():
+    """门店终端批量同步离线打卡（终端密钥签名认证，不使用用户令牌）
+
+    请求体 {"punches": [{"sequence", "user_id", "type": "clock_in" | "clock_out", "timestamp"}]}，
+    请求头 X-Kiosk-Id 和 X-Kiosk-Signature（终端密钥对请求体的 HMAC-SHA256）。
+    整批在一个事务中按序号依次处理，重传的打卡（序号已处理过）返回 duplicate。
+    """
+    kiosk_id = request.headers.get(KIOSK_HEADER, type=int)
+    # 锁定终端记录，同一终端的并发上传按顺序处理
+    kiosk = Kiosk.query.filter_by(id=kiosk_id).with_for_update().first() if kiosk_id else None
+    if not kiosk or not kiosk.is_active or not verify_signature(
+        kiosk.secret, request.get_data(cache=True), request.headers.get(SIGNATURE_HEADER)
+    ):
+        return jsonify({'error': '终端认证失败'}), 401
+    
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'error': '请求格式错误'}), 400
+    try:
+        punches = parse_punches(data.get('punches'), current_app.config['KIOSK_SYNC_MAX_PUNCHES'])
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    settings = load_settings()
+    if not ip_allowed(request.remote_addr, settings['allowed_ips']):
+        return jsonify({'error': '只能在店内进行打卡操作'}), 403
+    
+    now = datetime.now()
+    results, applied = apply_punches(
+        kiosk, punches, settings, request.remote_addr, now,
+        current_app.config['KIOSK_MAX_OFFLINE_DAYS'], current_app.config['KIOSK_CLOCK_SKEW']
+    )
+    kiosk.last_sync_at = datetime.utcnow()
+    last_sequence = kiosk.last_sequence
+    
+    # 在岗看板和实时推送只反映今天的打卡，事件与打卡记录在同一事务中一条语句写入
+    today = now.date()
+    events = []
+    for punch_type, timestamp, user_id, day, status, work_hours in applied:
+        if day != today:
+            continue
+        if punch_type == 'clock_in':
+            events.append(('attendance.clock_in', {
+                'date': today.strftime('%Y-%m-%d'),
+                'clock_in_time': timestamp.strftime('%Y-%m-%d %H:%M:%S'),
+                'status': status
+            }, user_id, True))
+        else:
+            events.append(('attendance.clock_out', {
+                'date': today.strftime('%Y-%m-%d'),
+                'clock_out_time': timestamp.strftime('%Y-%m-%d %H:%M:%S'),
+                'work_hours': work_hours,
+                'status': status
+            }, user_id, True))
+    event_bus.publish_many(events)
+    db.session.commit()
+    
+    counts = {'applied': 0, 'duplicate': 0, 'rejected': 0}
+    for result in results:
+        counts[result['status']] += 1
+    return jsonify({
+        'last_sequence': last_sequence,
+        'counts': counts,
+        'results': results
+    }), 200
+
 @bp.route('/today', methods=['GET'])
 @jwt_required()
 def today_attendance():
@@ -128,31 +216,35 @@ def today_attendance():
     user_id = get_jwt_identity()
     today = date.today()
     
-    record = AttendanceRecord.query.filter_by(
-        user_id=user_id, 
-        date=today
-    ).first()
-    
-    if not record:
-        return jsonify({
-            'date': today.strftime('%Y-%m-%d'),
-            'clock_in_time': None,
-            'clock_out_time': None,
-            'work_hours': 0,
-            'status': 'not_clocked_in'
-        }), 200
+    def build():
+        record = AttendanceRecord.query.filter_by(
+            user_id=user_id, 
+            date=today
+        ).first()
+        
+        if not record:
+            return {
+                'date': today.strftime('%Y-%m-%d'),
+                'clock_in_time': None,
+                'clock_out_time': None,
+                'work_hours': 0,
+                'status': 'not_clocked_in'
+            }
+        
+        return {
+            'date': record.date.strftime('%Y-%m-%d'),
+            'clock_in_time': record.clock_in_time.strftime('%Y-%m-%d %H:%M:%S') if record.clock_in_time else None,
+            'clock_out_time': record.clock_out_time.strftime('%Y-%m-%d %H:%M:%S') if record.clock_out_time else None,
+            'work_hours': record.work_hours,
+            'status': record.status,
+            'notes': record.notes
+        }
     
-    return jsonify({
-        'date': record.date.strftime('%Y-%m-%d'),
-        'clock_in_time': record.clock_in_time.strftime('%Y-%m-%d %H:%M:%S') if record.clock_in_time else None,
-        'clock_out_time': record.clock_out_time.strftime('%Y-%m-%d %H:%M:%S') if record.clock_out_time else None,
-        'work_hours': record.work_hours,
-        'status': record.status,
-        'notes': record.notes
-    }), 200
+    return today_json(user_id, SECTION_ATTENDANCE, build)
 
 @bp.route('/history', methods=['GET'])
 @jwt_required()
+@read_only
 def attendance_history():
     """获取考勤历史记录"""
     user_id = get_jwt_identity()
@@ -161,28 +253,25 @@ def attendance_history():
     start_date = request.args.get('start_date')
     end_date = request.args.get('end_date')
     
-    query = AttendanceRecord.query.filter_by(user_id=user_id)
+    try:
+        serializer = select_fields(ATTENDANCE_HISTORY, request.args.get('fields'))
+    except ValueError as e:
+        return jsonify({'error': '未知字段: %s' % e}), 400
+    
+    query = serializer.query().filter(AttendanceRecord.user_id == user_id)
     
     if start_date:
         query = query.filter(AttendanceRecord.date >= datetime.strptime(start_date, '%Y-%m-%d').date())
     if end_date:
         query = query.filter(AttendanceRecord.date <= datetime.strptime(end_date, '%Y-%m-%d').date())
     
+    count_query = query.with_entities(func.count(AttendanceRecord.id))
     query = query.order_by(AttendanceRecord.date.desc())
     
-    pagination = query.paginate(page=page, per_page=per_page, error_out=False)
-    records = pagination.items
+    pagination = paginate_projected(query, count_query, page, per_page)
     
     return jsonify({
-        'records': [{
-            'id': record.id,
-            'date': record.date.strftime('%Y-%m-%d'),
-            'clock_in_time': record.clock_in_time.strftime('%Y-%m-%d %H:%M:%S') if record.clock_in_time else None,
-            'clock_out_time': record.clock_out_time.strftime('%Y-%m-%d %H:%M:%S') if record.clock_out_time else None,
-            'work_hours': record.work_hours,
-            'status': record.status,
-            'notes': record.notes
-        } for record in records],
+        'records': serializer.serialize_rows(pagination.items),
         'pagination': {
             'page': pagination.page,
             'per_page': pagination.per_page,
@@ -195,6 +284,7 @@ def attendance_history():
 
 @bp.route('/statistics', methods=['GET'])
 @jwt_required()
+@read_only
 def attendance_statistics():
     """获取考勤统计"""
     user_id = get_jwt_identity()
@@ -202,11 +292,12 @@ def attendance_statistics():
     
     # 解析月份
     year, month_num = map(int, month.split('-'))
+    month_start, month_end = month_range(year, month_num)
     
-    # 获取当月考勤记录
+    # 获取当月考勤记录（按日期范围过滤，可以使用索引）
     records = AttendanceRecord.query.filter_by(user_id=user_id).filter(
-        db.extract('year', AttendanceRecord.date) == year,
-        db.extract('month', AttendanceRecord.date) == month_num
+        AttendanceRecord.date >= month_start,
+        AttendanceRecord.date < month_end
     ).all()
     
     # 统计数据
@@ -227,6 +318,35 @@ def attendance_statistics():
         'absent_days': absent_days
     }), 200
 
+@bp.route('/presence', methods=['GET'])
+@jwt_required()
+def get_presence():
+    """门店在岗看板：已打卡、休息、外出、缺勤等状态（读取内存索引，只查询新的事件）"""
+    user_id = get_jwt_identity()
+    user = User.query.get(user_id)
+    
+    if user.role not in ['admin', 'manager']:
+        return jsonify({'error': '无权查看在岗看板'}), 403
+    
+    # 经理只能查看本部门（门店）
+    if user.role == 'admin':
+        department = request.args.get('department')
+    else:
+        department = user.department
+    
+    # 应用所有进程提交的新事件（尚未加载或跨天后从数据库重建）
+    presence_index.refresh()
+    
+    people, counts = presence_index.snapshot(department)
+    
+    return jsonify({
+        'department': department,
+        'reconciled_at': presence_index.reconciled_at.strftime('%Y-%m-%d %H:%M:%S'),
+        'counts': counts,
+        'people': people,
+        'departments': presence_index.departments() if user.role == 'admin' else None
+    }), 200
+
 def get_system_setting(key, default_value):
     """获取系统设置"""
     setting = SystemSettings.query.filter_by(key=key).first()
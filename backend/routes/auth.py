@@ -2,6 +2,7 @@ from flask import Blueprint, request, jsonify
 from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity
 from werkzeug.security import check_password_hash, generate_password_hash
 from models import User, db
+from utils.events import publish_user_changed
 from datetime import datetime
 import re
 
@@ -52,6 +53,8 @@ def register():
     )
     
     db.session.add(user)
+    db.session.flush()
+    publish_user_changed(user)
     db.session.commit()
     
     return jsonify({'message': '注册成功', 'user_id': user.id}), 201
@@ -143,6 +146,7 @@ def update_profile():
         user.email = data['email']
     
     user.updated_at = datetime.utcnow()
+    publish_user_changed(user)
     db.session.commit()
     
     return jsonify({'message': '资料更新成功'}), 200
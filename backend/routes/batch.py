@@ -0,0 +1,109 @@
+from flask import Blueprint, request, jsonify, current_app
+from flask_jwt_extended import jwt_required
+from werkzeug.test import EnvironBuilder
+from concurrent.futures import ThreadPoolExecutor
+from models import db
+from utils.sqlite_profile import READ_METHODS
+
+bp = Blueprint('batch', __name__, url_prefix='/api/batch')
+
+# 子请求可携带的请求头（认证信息统一使用批量请求本身的 Authorization）
+FORWARDED_HEADERS = ('If-None-Match', 'If-Modified-Since', 'Idempotency-Key')
+
+@bp.route('', methods=['POST'])
+@jwt_required()
+def batch():
+    """批量请求：在一次请求中依次执行多个子请求，合并返回结果
+
+    请求体 {"requests": [{"id", "method", "path", "params", "body", "headers"}], "parallel": false}。
+    子请求与批量请求共用应用上下文和数据库会话；parallel 为 true 且全部为 GET 时并发执行。
+    """
+    data = request.get_json(silent=True) or {}
+    sub_requests = data.get('requests')
+
+    if not isinstance(sub_requests, list) or not sub_requests:
+        return jsonify({'error': '请提供子请求列表'}), 400
+
+    max_requests = current_app.config.get('BATCH_MAX_REQUESTS', 20)
+    if len(sub_requests) > max_requests:
+        return jsonify({'error': f'子请求不能超过 {max_requests} 个'}), 400
+
+    environs = []
+    for index, sub_request in enumerate(sub_requests):
+        if not isinstance(sub_request, dict):
+            return jsonify({'error': f'第 {index + 1} 个子请求格式错误'}), 400
+        path = sub_request.get('path') or ''
+        if not path.startswith('/api/') or path.split('?')[0].rstrip('/') == bp.url_prefix:
+            return jsonify({'error': f'第 {index + 1} 个子请求路径无效'}), 400
+        environs.append(build_environ(sub_request))
+
+    read_only = all(environ['REQUEST_METHOD'] == 'GET' for environ in environs)
+    if data.get('parallel') and read_only and len(environs) > 1:
+        app = current_app._get_current_object()
+        workers = min(len(environs), current_app.config.get('BATCH_MAX_WORKERS', 4))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(lambda environ: run_isolated(app, environ), environs))
+    else:
+        results = [dispatch(environ) for environ in environs]
+
+    return jsonify({
+        'responses': [
+            dict(result, id=sub_request.get('id', index))
+            for index, (sub_request, result) in enumerate(zip(sub_requests, results))
+        ]
+    }), 200
+
+def build_environ(sub_request):
+    """构造子请求的 WSGI environ，沿用批量请求的认证信息和客户端地址（打卡 IP 校验）"""
+    headers = {'Authorization': request.headers.get('Authorization', '')}
+    for name in FORWARDED_HEADERS:
+        value = (sub_request.get('headers') or {}).get(name)
+        if value:
+            headers[name] = value
+
+    path, _, query_string = sub_request['path'].partition('?')
+    builder = EnvironBuilder(
+        path=path,
+        method=(sub_request.get('method') or 'GET').upper(),
+        query_string=sub_request.get('params') or query_string or None,
+        json=sub_request.get('body'),
+        headers=headers,
+        environ_base={'REMOTE_ADDR': request.remote_addr}
+    )
+    try:
+        return builder.get_environ()
+    finally:
+        builder.close()
+
+def dispatch(environ):
+    """在当前应用上下文中执行子请求（共用数据库会话），返回 {status, body, etag}"""
+    app = current_app._get_current_object()
+    # 写请求前结束之前子请求的读事务，写事务重新开始（SQLite 下按写事务排队）
+    if environ['REQUEST_METHOD'] not in READ_METHODS and db.session().in_transaction():
+        db.session.commit()
+    with app.request_context(environ):
+        try:
+            response = app.full_dispatch_request()
+        except Exception:
+            db.session.rollback()
+            app.logger.exception('批量子请求执行失败: %s', environ.get('PATH_INFO'))
+            return {'status': 500, 'body': {'error': '服务器内部错误'}, 'etag': None}
+
+    # 流式响应（事件推送、日历订阅、导出）不能合并返回
+    if response.is_streamed and response.status_code < 400:
+        response.close()
+        return {'status': 400, 'body': {'error': '不支持批量获取该接口'}, 'etag': None}
+
+    etag, _ = response.get_etag()
+    result = {
+        'status': response.status_code,
+        'body': response.get_json() if response.is_json else None,
+        'etag': etag
+    }
+    response.close()
+    return result
+
+def run_isolated(app, environ):
+    """在独立的应用上下文（独立数据库会话）中执行子请求，用于并发执行"""
+    with app.app_context():
+        return dispatch(environ)
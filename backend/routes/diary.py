@@ -1,12 +1,21 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from models import WorkDiary, User, db
+from sqlalchemy import func, case
+from models import WorkDiary, Schedule, User, db
+from utils.diary_search import search_work_diaries, SEARCH_FIELDS
+from utils.pagination import paginate_projected
+from utils.dates import month_range, utc_offset_seconds
+from utils.sql import local_date
+from utils.today_cache import today_json, SECTION_DIARY
+from utils.serializers import work_diary_list, parse_fields
+from utils.replicas import read_only
 from datetime import datetime, date
 
 bp = Blueprint('diary', __name__, url_prefix='/api/diary')
 
 @bp.route('/diaries', methods=['GET'])
 @jwt_required()
+@read_only
 def get_work_diaries():
     """获取工作日报列表"""
     user_id = get_jwt_identity()
@@ -16,37 +25,52 @@ def get_work_diaries():
     per_page = request.args.get('per_page', 20, type=int)
     start_date = request.args.get('start_date')
     end_date = request.args.get('end_date')
+    # 默认只返回正文预览和长度，full=true 时返回完整正文
+    include_full = request.args.get('full', 'false').lower() in ['1', 'true']
+    
+    # 默认大字段不加载到内存，在数据库中截取预览并计算长度
+    preview_length = None if include_full else current_app.config.get('DIARY_PREVIEW_LENGTH', 200)
+    serializer = work_diary_list(preview_length, user.role == 'admin')
+    
+    # fields 只返回指定字段；truncated 由各字段原文长度计算
+    fields = parse_fields(request.args.get('fields'))
+    include_truncated = preview_length is not None and (fields is None or 'truncated' in fields)
+    if fields is not None:
+        columns = set(fields) - {'truncated'}
+        if include_truncated:
+            columns.update(field + '_length' for field in SEARCH_FIELDS)
+        try:
+            serializer = serializer.only(columns)
+        except ValueError as e:
+            return jsonify({'error': '未知字段: %s' % e}), 400
     
     if user.role == 'admin':
         # 管理员可以查看所有工作日报
-        query = WorkDiary.query.join(User)
+        query = serializer.query().join(User, WorkDiary.user_id == User.id)
     else:
         # 普通用户只能查看自己的工作日报
-        query = WorkDiary.query.filter_by(user_id=user_id)
+        query = serializer.query().filter(WorkDiary.user_id == user_id)
     
     if start_date:
         query = query.filter(WorkDiary.date >= datetime.strptime(start_date, '%Y-%m-%d').date())
     if end_date:
         query = query.filter(WorkDiary.date <= datetime.strptime(end_date, '%Y-%m-%d').date())
     
+    count_query = query.with_entities(func.count(WorkDiary.id))
     query = query.order_by(WorkDiary.date.desc())
     
-    pagination = query.paginate(page=page, per_page=per_page, error_out=False)
-    diaries = pagination.items
+    pagination = paginate_projected(query, count_query, page, per_page)
+    
+    diaries = serializer.serialize_rows(pagination.items)
+    if include_truncated:
+        hidden = [] if fields is None else [field + '_length' for field in SEARCH_FIELDS if field + '_length' not in fields]
+        for diary in diaries:
+            diary['truncated'] = any(diary[field + '_length'] > preview_length for field in SEARCH_FIELDS)
+            for key in hidden:
+                del diary[key]
     
     return jsonify({
-        'diaries': [{
-            'id': diary.id,
-            'user_id': diary.user_id,
-            'username': diary.user.username if user.role == 'admin' else None,
-            'real_name': diary.user.real_name if user.role == 'admin' else None,
-            'date': diary.date.strftime('%Y-%m-%d'),
-            'content': diary.content,
-            'achievements': diary.achievements,
-            'issues': diary.issues,
-            'next_plan': diary.next_plan,
-            'created_at': diary.created_at.strftime('%Y-%m-%d %H:%M:%S')
-        } for diary in diaries],
+        'diaries': diaries,
         'pagination': {
             'page': pagination.page,
             'per_page': pagination.per_page,
@@ -57,6 +81,59 @@ def get_work_diaries():
         }
     }), 200
 
+@bp.route('/search', methods=['GET'])
+@jwt_required()
+@read_only
+def search_diaries():
+    """全文搜索工作日报（按相关度排序，只返回高亮片段）"""
+    user_id = get_jwt_identity()
+    user = User.query.get(user_id)
+    
+    query_text = request.args.get('q', '').strip()
+    page = max(request.args.get('page', 1, type=int), 1)
+    per_page = min(max(request.args.get('per_page', 20, type=int), 1), 100)
+    start_date = request.args.get('start_date')
+    end_date = request.args.get('end_date')
+    
+    if not query_text:
+        return jsonify({'error': '请输入搜索关键词'}), 400
+    
+    try:
+        start_date = datetime.strptime(start_date, '%Y-%m-%d').date() if start_date else None
+        end_date = datetime.strptime(end_date, '%Y-%m-%d').date() if end_date else None
+    except ValueError:
+        return jsonify({'error': '日期格式错误，请使用 YYYY-MM-DD 格式'}), 400
+    
+    # 与日报列表相同的可见范围：管理员可以搜索所有日报，普通用户只能搜索自己的日报
+    if user.role == 'admin':
+        search_user_id = request.args.get('user_id', type=int)
+    else:
+        search_user_id = user_id
+    
+    results, total = search_work_diaries(
+        query_text,
+        user_id=search_user_id,
+        start_date=start_date,
+        end_date=end_date,
+        page=page,
+        per_page=per_page,
+        with_user_names=user.role == 'admin'
+    )
+    
+    pages = (total + per_page - 1) // per_page
+    
+    return jsonify({
+        'results': results,
+        'pagination': {
+            'page': page,
+            'per_page': per_page,
+            'total': total,
+            'pages': pages,
+            'has_next': page < pages,
+            'has_prev': page > 1
+        }
+    }), 200
+
 @bp.route('/diaries', methods=['POST'])
 @jwt_required()
 def create_work_diary():
@@ -201,28 +278,32 @@ def get_today_diary():
     user_id = get_jwt_identity()
     today = date.today()
     
-    work_diary = WorkDiary.query.filter_by(
-        user_id=user_id,
-        date=today
-    ).first()
-    
-    if not work_diary:
-        return jsonify({'diary': None}), 200
-    
-    return jsonify({
-        'diary': {
-            'id': work_diary.id,
-            'date': work_diary.date.strftime('%Y-%m-%d'),
-            'content': work_diary.content,
-            'achievements': work_diary.achievements,
-            'issues': work_diary.issues,
-            'next_plan': work_diary.next_plan,
-            'created_at': work_diary.created_at.strftime('%Y-%m-%d %H:%M:%S')
+    def build():
+        work_diary = WorkDiary.query.filter_by(
+            user_id=user_id,
+            date=today
+        ).first()
+        
+        if not work_diary:
+            return {'diary': None}
+        
+        return {
+            'diary': {
+                'id': work_diary.id,
+                'date': work_diary.date.strftime('%Y-%m-%d'),
+                'content': work_diary.content,
+                'achievements': work_diary.achievements,
+                'issues': work_diary.issues,
+                'next_plan': work_diary.next_plan,
+                'created_at': work_diary.created_at.strftime('%Y-%m-%d %H:%M:%S')
+            }
         }
-    }), 200
+    
+    return today_json(user_id, SECTION_DIARY, build)
 
 @bp.route('/statistics', methods=['GET'])
 @jwt_required()
+@read_only
 def diary_statistics():
     """获取日报统计"""
     user_id = get_jwt_identity()
@@ -233,34 +314,145 @@ def diary_statistics():
     # 解析月份
     year, month_num = map(int, month.split('-'))
     
-    # 查询条件
-    query = WorkDiary.query.filter(
-        db.extract('year', WorkDiary.date) == year,
-        db.extract('month', WorkDiary.date) == month_num
+    month_start, month_end = month_range(year, month_num)
+    
+    # 按用户分组计数，不加载日报正文
+    query = db.session.query(
+        WorkDiary.user_id,
+        func.count(WorkDiary.id)
+    ).filter(
+        WorkDiary.date >= month_start,
+        WorkDiary.date < month_end
     )
     
     if user.role != 'admin':
-        query = query.filter_by(user_id=user_id)
+        query = query.filter(WorkDiary.user_id == user_id)
     
-    diaries = query.all()
+    counts = query.group_by(WorkDiary.user_id).all()
     
     # 统计数据
-    total_diaries = len(diaries)
+    total_diaries = sum(count for _, count in counts)
     
     # 按用户统计（管理员可见）
     user_statistics = {}
-    if user.role == 'admin':
-        for diary in diaries:
-            username = diary.user.username
-            if username not in user_statistics:
-                user_statistics[username] = {
-                    'real_name': diary.user.real_name,
-                    'count': 0
-                }
-            user_statistics[username]['count'] += 1
+    if user.role == 'admin' and counts:
+        users = db.session.query(User.id, User.username, User.real_name).filter(
+            User.id.in_([diary_user_id for diary_user_id, _ in counts])
+        )
+        count_by_user = dict(counts)
+        for diary_user_id, username, real_name in users:
+            user_statistics[username] = {
+                'real_name': real_name,
+                'count': count_by_user[diary_user_id]
+            }
     
     return jsonify({
         'month': month,
         'total_diaries': total_diaries,
         'user_statistics': user_statistics if user.role == 'admin' else None
-    }), 200
\ No newline at end of file
+    }), 200
+
+@bp.route('/compliance', methods=['GET'])
+@jwt_required()
+@read_only
+def diary_compliance():
+    """日报提交合规报告：按排班统计每人应交、已交、缺交、迟交天数"""
+    user_id = get_jwt_identity()
+    user = User.query.get(user_id)
+    
+    today = date.today()
+    try:
+        start_date = request.args.get('start_date')
+        end_date = request.args.get('end_date')
+        start_date = datetime.strptime(start_date, '%Y-%m-%d').date() if start_date else today.replace(day=1)
+        end_date = datetime.strptime(end_date, '%Y-%m-%d').date() if end_date else today
+    except ValueError:
+        return jsonify({'error': '日期格式错误，请使用 YYYY-MM-DD 格式'}), 400
+    
+    if start_date > end_date:
+        return jsonify({'error': '开始日期不能晚于结束日期'}), 400
+    
+    # 今天之后的排班还不需要交日报
+    end_date = min(end_date, today)
+    
+    if user.role == 'admin':
+        report_user_id = request.args.get('user_id', type=int)
+        department = request.args.get('department')
+    else:
+        report_user_id = user_id
+        department = None
+    
+    rows = query_diary_compliance(start_date, end_date, report_user_id, department)
+    
+    users = []
+    totals = {'expected': 0, 'submitted': 0, 'missing': 0, 'late': 0}
+    for row in rows:
+        item = {
+            'user_id': row.user_id,
+            'username': row.username,
+            'real_name': row.real_name,
+            'department': row.department,
+            'expected': row.expected,
+            'submitted': row.submitted,
+            'missing': row.missing,
+            'late': row.late,
+            'compliance_rate': round(row.submitted / row.expected * 100, 1) if row.expected else None
+        }
+        for key in totals:
+            totals[key] += item[key]
+        users.append(item)
+    
+    return jsonify({
+        'start_date': start_date.strftime('%Y-%m-%d'),
+        'end_date': end_date.strftime('%Y-%m-%d'),
+        'totals': totals,
+        'users': users
+    }), 200
+
+def query_diary_compliance(start_date, end_date, user_id=None, department=None):
+    """一次分组查询统计日报提交情况
+
+    以排班日（同一天多个班次只算一天）左连接当天日报：连接不到的是缺交（反连接），
+    日报创建日期晚于日报日期的是迟交。created_at 按 UTC 保存，先换算为本地日期再比较，
+    避免 UTC+8 下凌晨 0 点到 8 点写的日报被算到前一天。
+    """
+    expected_days = db.session.query(
+        Schedule.user_id.label('user_id'),
+        Schedule.date.label('date')
+    ).filter(
+        Schedule.date >= start_date,
+        Schedule.date <= end_date
+    )
+    if user_id is not None:
+        expected_days = expected_days.filter(Schedule.user_id == user_id)
+    expected_days = expected_days.distinct().subquery()
+    
+    missing = case((WorkDiary.id.is_(None), 1), else_=0)
+    late = case((local_date(WorkDiary.created_at, utc_offset_seconds()) > WorkDiary.date, 1), else_=0)
+    
+    query = db.session.query(
+        User.id.label('user_id'),
+        User.username,
+        User.real_name,
+        User.department,
+        func.count(expected_days.c.date).label('expected'),
+        func.count(WorkDiary.id).label('submitted'),
+        func.coalesce(func.sum(missing), 0).label('missing'),
+        func.coalesce(func.sum(late), 0).label('late')
+    ).select_from(expected_days).join(
+        User, User.id == expected_days.c.user_id
+    ).outerjoin(
+        WorkDiary,
+        db.and_(
+            WorkDiary.user_id == expected_days.c.user_id,
+            WorkDiary.date == expected_days.c.date
+        )
+    )
+    if department:
+        query = query.filter(User.department == department)
+    
+    return query.group_by(
+        User.id, User.username, User.real_name, User.department
+    ).order_by(
+        func.coalesce(func.sum(missing), 0).desc(), User.id
+    ).all()
@@ -0,0 +1,61 @@
+from flask import Blueprint, request, jsonify, current_app, url_for, Response
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from itsdangerous import URLSafeTimedSerializer, BadSignature, SignatureExpired
+from models import User
+from utils.events import stream_events
+
+bp = Blueprint('events', __name__, url_prefix='/api/events')
+
+@bp.route('/token', methods=['POST'])
+@jwt_required()
+def get_stream_token():
+    """获取事件推送连接令牌（EventSource 不能设置 Authorization 请求头）"""
+    user_id = get_jwt_identity()
+    token = stream_serializer().dumps(user_id)
+
+    return jsonify({
+        'token': token,
+        'stream_url': url_for('events.event_stream', token=token)
+    }), 200
+
+@bp.route('/stream', methods=['GET'])
+def event_stream():
+    """服务器推送事件（SSE）：审批结果、外出和打卡状态变化
+
+    断线重连时浏览器自动携带 Last-Event-ID 请求头，从该事件之后续传（可以连接到任意 worker 进程）。
+    """
+    try:
+        user_id = stream_serializer().loads(
+            request.args.get('token', ''),
+            max_age=current_app.config.get('EVENT_STREAM_TOKEN_MAX_AGE', 8 * 3600)
+        )
+    except SignatureExpired:
+        return jsonify({'error': '推送令牌已过期'}), 401
+    except BadSignature:
+        return jsonify({'error': '无效的推送令牌'}), 401
+
+    user = User.query.get(user_id)
+    if not user or not user.is_active:
+        return jsonify({'error': '用户不存在'}), 401
+
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+
+    # 生成器轮询事件日志时各自借用并立即归还数据库连接，连接期间不占用请求的数据库会话
+    stream = stream_events(
+        current_app._get_current_object(),
+        user.id,
+        user.role,
+        last_event_id=last_event_id,
+        heartbeat=current_app.config.get('EVENT_STREAM_HEARTBEAT', 15),
+        max_duration=current_app.config.get('EVENT_STREAM_MAX_DURATION', 3600),
+        poll_interval=current_app.config.get('EVENT_STREAM_POLL_INTERVAL', 1)
+    )
+
+    response = Response(stream, mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+def stream_serializer():
+    """事件推送令牌签名器"""
+    return URLSafeTimedSerializer(current_app.config['SECRET_KEY'], salt='event-stream')
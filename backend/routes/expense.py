@@ -1,12 +1,24 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app, send_file, url_for
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from models import ExpenseReport, User, db
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+from werkzeug.exceptions import BadRequest, RequestEntityTooLarge
+from models import ExpenseReport, Receipt, User, db
+from utils.receipts import save_multipart_upload, receipt_path, thumbnail_path, thumbnail_worker
+from utils.expense_dedup import index_expense_report, remove_expense_fingerprints, find_duplicate_candidates, fingerprint_keys
+from utils.dates import month_range
+from utils.money import amount_to_cents, cents_to_amount
+from utils.events import event_bus
+from utils.pagination import paginate_projected
+from utils.serializers import EXPENSE_REPORT, with_user_names, select_fields
+from utils.replicas import read_only
 from datetime import datetime, date
 
 bp = Blueprint('expense', __name__, url_prefix='/api/expense')
 
 @bp.route('/reports', methods=['GET'])
 @jwt_required()
+@read_only
 def get_expense_reports():
     """获取费用报销列表"""
     user_id = get_jwt_identity()
@@ -16,38 +28,29 @@ def get_expense_reports():
     per_page = request.args.get('per_page', 20, type=int)
     status = request.args.get('status')
     
+    serializer = with_user_names(EXPENSE_REPORT, user.role == 'admin')
+    try:
+        serializer = select_fields(serializer, request.args.get('fields'))
+    except ValueError as e:
+        return jsonify({'error': '未知字段: %s' % e}), 400
+    
     if user.role == 'admin':
         # 管理员可以查看所有费用报销
-        query = ExpenseReport.query.join(User)
+        query = serializer.query().join(User, ExpenseReport.user_id == User.id)
     else:
         # 普通用户只能查看自己的费用报销
-        query = ExpenseReport.query.filter_by(user_id=user_id)
+        query = serializer.query().filter(ExpenseReport.user_id == user_id)
     
     if status:
         query = query.filter(ExpenseReport.status == status)
     
+    count_query = query.with_entities(func.count(ExpenseReport.id))
     query = query.order_by(ExpenseReport.created_at.desc())
     
-    pagination = query.paginate(page=page, per_page=per_page, error_out=False)
-    reports = pagination.items
+    pagination = paginate_projected(query, count_query, page, per_page)
     
     return jsonify({
-        'reports': [{
-            'id': report.id,
-            'user_id': report.user_id,
-            'username': report.user.username if user.role == 'admin' else None,
-            'real_name': report.user.real_name if user.role == 'admin' else None,
-            'expense_type': report.expense_type,
-            'amount': report.amount,
-            'date': report.date.strftime('%Y-%m-%d'),
-            'description': report.description,
-            'receipt_url': report.receipt_url,
-            'status': report.status,
-            'approver_id': report.approver_id,
-            'approved_at': report.approved_at.strftime('%Y-%m-%d %H:%M:%S') if report.approved_at else None,
-            'approval_notes': report.approval_notes,
-            'created_at': report.created_at.strftime('%Y-%m-%d %H:%M:%S')
-        } for report in reports],
+        'reports': serializer.serialize_rows(pagination.items),
         'pagination': {
             'page': pagination.page,
             'per_page': pagination.per_page,
@@ -73,8 +76,8 @@ def create_expense_report():
     
     # 验证金额
     try:
-        amount = float(data['amount'])
-        if amount <= 0:
+        amount_cents = amount_to_cents(data['amount'])
+        if amount_cents <= 0:
             return jsonify({'error': '金额必须大于0'}), 400
     except ValueError:
         return jsonify({'error': '金额格式错误'}), 400
@@ -89,22 +92,36 @@ def create_expense_report():
     if expense_date > date.today():
         return jsonify({'error': '费用日期不能晚于今天'}), 400
     
+    # 验证凭证
+    receipt_hash = data.get('receipt_hash')
+    if receipt_hash and not Receipt.query.filter_by(sha256=receipt_hash).first():
+        return jsonify({'error': '凭证文件不存在'}), 400
+    
     # 创建费用报销
     expense_report = ExpenseReport(
         user_id=user_id,
         expense_type=data['expense_type'],
-        amount=amount,
+        amount_cents=amount_cents,
         date=expense_date,
         description=data['description'],
-        receipt_url=data.get('receipt_url')
+        receipt_url=data.get('receipt_url'),
+        receipt_hash=receipt_hash
     )
     
     db.session.add(expense_report)
+    db.session.flush()
+    
+    # 更新指纹索引并检测疑似重复
+    candidates = index_expense_report(expense_report)
+    event_bus.publish('expense.submitted', {'id': expense_report.id, 'status': expense_report.status},
+                      user_id=expense_report.user_id, managers=True)
     db.session.commit()
     
     return jsonify({
         'message': '费用报销提交成功',
-        'report_id': expense_report.id
+        'report_id': expense_report.id,
+        'suspected_duplicate': bool(candidates),
+        'duplicate_candidates': format_duplicate_candidates(candidates)
     }), 201
 
 @bp.route('/reports/<int:report_id>', methods=['GET'])
@@ -132,6 +149,11 @@ def get_expense_report(report_id):
         'date': expense_report.date.strftime('%Y-%m-%d'),
         'description': expense_report.description,
         'receipt_url': expense_report.receipt_url,
+        'receipt_hash': expense_report.receipt_hash,
+        'suspected_duplicate': bool(expense_report.suspected_duplicate),
+        'duplicate_candidates': format_duplicate_candidates(
+            find_duplicate_candidates(expense_report.id, fingerprint_keys(expense_report))
+        ),
         'status': expense_report.status,
         'approver_id': expense_report.approver_id,
         'approved_at': expense_report.approved_at.strftime('%Y-%m-%d %H:%M:%S') if expense_report.approved_at else None,
@@ -164,10 +186,10 @@ def update_expense_report(report_id):
         expense_report.expense_type = data['expense_type']
     if 'amount' in data:
         try:
-            amount = float(data['amount'])
-            if amount <= 0:
+            amount_cents = amount_to_cents(data['amount'])
+            if amount_cents <= 0:
                 return jsonify({'error': '金额必须大于0'}), 400
-            expense_report.amount = amount
+            expense_report.amount_cents = amount_cents
         except ValueError:
             return jsonify({'error': '金额格式错误'}), 400
     if 'date' in data:
@@ -177,12 +199,22 @@ def update_expense_report(report_id):
         expense_report.description = data['description']
     if 'receipt_url' in data:
         expense_report.receipt_url = data['receipt_url']
+    if 'receipt_hash' in data:
+        if data['receipt_hash'] and not Receipt.query.filter_by(sha256=data['receipt_hash']).first():
+            return jsonify({'error': '凭证文件不存在'}), 400
+        expense_report.receipt_hash = data['receipt_hash'] or None
     
     expense_report.updated_at = datetime.utcnow()
     
+    # 更新指纹索引并检测疑似重复
+    candidates = index_expense_report(expense_report)
     db.session.commit()
     
-    return jsonify({'message': '费用报销更新成功'}), 200
+    return jsonify({
+        'message': '费用报销更新成功',
+        'suspected_duplicate': bool(candidates),
+        'duplicate_candidates': format_duplicate_candidates(candidates)
+    }), 200
 
 @bp.route('/reports/<int:report_id>/approve', methods=['POST'])
 @jwt_required()
@@ -216,6 +248,8 @@ def approve_expense_report(report_id):
     expense_report.approval_notes = notes
     expense_report.updated_at = datetime.utcnow()
     
+    event_bus.publish('expense.' + expense_report.status, {'id': expense_report.id, 'status': expense_report.status},
+                      user_id=expense_report.user_id, managers=True)
     db.session.commit()
     
     return jsonify({
@@ -240,11 +274,81 @@ def delete_expense_report(report_id):
     if expense_report.status != 'pending':
         return jsonify({'error': '只能删除待审批状态的费用报销'}), 400
     
+    remove_expense_fingerprints(expense_report.id)
     db.session.delete(expense_report)
+    event_bus.publish('expense.deleted', {'id': report_id}, user_id=user_id, managers=True)
     db.session.commit()
     
     return jsonify({'message': '费用报销删除成功'}), 200
 
+@bp.route('/receipts', methods=['POST'])
+@jwt_required()
+def upload_receipt():
+    """上传报销凭证（流式写入磁盘，按内容去重）"""
+    user_id = get_jwt_identity()
+    
+    try:
+        sha256, size, content_type = save_multipart_upload(
+            request.stream,
+            request.headers.get('Content-Type', ''),
+            max_size=current_app.config.get('RECEIPT_MAX_SIZE', 10 * 1024 * 1024)
+        )
+    except RequestEntityTooLarge:
+        return jsonify({'error': '凭证文件过大'}), 413
+    except BadRequest:
+        return jsonify({'error': '请上传 JPG、PNG、GIF、WEBP 或 PDF 格式的凭证文件'}), 400
+    
+    receipt = Receipt.query.filter_by(sha256=sha256).first()
+    if not receipt:
+        receipt = Receipt(
+            sha256=sha256,
+            size=size,
+            content_type=content_type,
+            uploader_id=user_id
+        )
+        db.session.add(receipt)
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # 并发上传了相同文件
+            db.session.rollback()
+            receipt = Receipt.query.filter_by(sha256=sha256).first()
+    
+    if not receipt.has_thumbnail:
+        thumbnail_worker.submit(current_app._get_current_object(), sha256, receipt.content_type)
+    
+    return jsonify({
+        'message': '凭证上传成功',
+        'receipt_hash': sha256,
+        'size': receipt.size,
+        'content_type': receipt.content_type,
+        'url': url_for('expense.get_receipt', sha256=sha256),
+        'thumbnail_url': url_for('expense.get_receipt_thumbnail', sha256=sha256)
+    }), 201
+
+@bp.route('/receipts/<sha256>', methods=['GET'])
+@jwt_required()
+def get_receipt(sha256):
+    """获取报销凭证文件"""
+    receipt, error = load_visible_receipt(sha256)
+    if error:
+        return error
+    
+    return send_immutable_file(receipt_path(sha256), receipt.content_type, sha256)
+
+@bp.route('/receipts/<sha256>/thumbnail', methods=['GET'])
+@jwt_required()
+def get_receipt_thumbnail(sha256):
+    """获取报销凭证缩略图"""
+    receipt, error = load_visible_receipt(sha256)
+    if error:
+        return error
+    
+    if not receipt.has_thumbnail:
+        return jsonify({'error': '缩略图尚未生成'}), 404
+    
+    return send_immutable_file(thumbnail_path(sha256), 'image/jpeg', sha256 + '-thumb')
+
 @bp.route('/types', methods=['GET'])
 @jwt_required()
 def get_expense_types():
@@ -265,6 +369,7 @@ def get_expense_types():
 
 @bp.route('/statistics', methods=['GET'])
 @jwt_required()
+@read_only
 def expense_statistics():
     """获取费用统计"""
     user_id = get_jwt_identity()
@@ -275,36 +380,84 @@ def expense_statistics():
     # 解析月份
     year, month_num = map(int, month.split('-'))
     
-    # 查询条件
-    query = ExpenseReport.query.filter(
-        db.extract('year', ExpenseReport.date) == year,
-        db.extract('month', ExpenseReport.date) == month_num
+    month_start, month_end = month_range(year, month_num)
+    
+    # 一次分组聚合查询得到 状态 x 类型 的金额矩阵（整数分求和，无浮点误差）
+    query = db.session.query(
+        ExpenseReport.status,
+        ExpenseReport.expense_type,
+        func.count(ExpenseReport.id),
+        func.coalesce(func.sum(ExpenseReport.amount_cents), 0)
+    ).filter(
+        ExpenseReport.date >= month_start,
+        ExpenseReport.date < month_end
     )
     
     if user.role != 'admin':
-        query = query.filter_by(user_id=user_id)
+        query = query.filter(ExpenseReport.user_id == user_id)
     
-    reports = query.all()
+    rows = query.group_by(ExpenseReport.status, ExpenseReport.expense_type).all()
     
     # 统计数据
-    total_amount = sum(report.amount for report in reports)
-    approved_amount = sum(report.amount for report in reports if report.status == 'approved')
-    pending_amount = sum(report.amount for report in reports if report.status == 'pending')
-    rejected_amount = sum(report.amount for report in reports if report.status == 'rejected')
+    status_cents = {'approved': 0, 'pending': 0, 'rejected': 0}
+    type_counts = {}
+    type_cents = {}
+    total_cents = 0
+    for status, expense_type, count, cents in rows:
+        cents = int(cents)
+        total_cents += cents
+        status_cents[status] = status_cents.get(status, 0) + cents
+        type_counts[expense_type] = type_counts.get(expense_type, 0) + count
+        type_cents[expense_type] = type_cents.get(expense_type, 0) + cents
     
     # 按类型统计
-    type_statistics = {}
-    for report in reports:
-        if report.expense_type not in type_statistics:
-            type_statistics[report.expense_type] = {'count': 0, 'amount': 0}
-        type_statistics[report.expense_type]['count'] += 1
-        type_statistics[report.expense_type]['amount'] += report.amount
+    type_statistics = {
+        expense_type: {
+            'count': type_counts[expense_type],
+            'amount': cents_to_amount(type_cents[expense_type])
+        } for expense_type in type_counts
+    }
     
     return jsonify({
         'month': month,
-        'total_amount': round(total_amount, 2),
-        'approved_amount': round(approved_amount, 2),
-        'pending_amount': round(pending_amount, 2),
-        'rejected_amount': round(rejected_amount, 2),
+        'total_amount': cents_to_amount(total_cents),
+        'approved_amount': cents_to_amount(status_cents['approved']),
+        'pending_amount': cents_to_amount(status_cents['pending']),
+        'rejected_amount': cents_to_amount(status_cents['rejected']),
         'type_statistics': type_statistics
-    }), 200
\ No newline at end of file
+    }), 200
+
+def load_visible_receipt(sha256):
+    """查找当前用户有权查看的凭证，返回 (凭证, 错误响应)"""
+    user_id = get_jwt_identity()
+    user = User.query.get(user_id)
+    
+    receipt = Receipt.query.filter_by(sha256=sha256).first()
+    if not receipt:
+        return None, (jsonify({'error': '凭证文件不存在'}), 404)
+    
+    if user.role not in ['admin', 'manager'] and receipt.uploader_id != user_id:
+        # 相同文件可能由多人上传，报销单所有人也可以查看
+        owns_report = db.session.query(ExpenseReport.id).filter_by(
+            receipt_hash=sha256,
+            user_id=user_id
+        ).first()
+        if not owns_report:
+            return None, (jsonify({'error': '无权访问此凭证'}), 403)
+    
+    return receipt, None
+
+def send_immutable_file(path, mimetype, etag):
+    """发送按内容寻址的文件，内容不会变化，允许客户端长期缓存"""
+    response = send_file(path, mimetype=mimetype, conditional=True, etag=etag, max_age=31536000)
+    response.cache_control.public = False
+    response.cache_control.private = True
+    response.cache_control.immutable = True
+    return response
+
+def format_duplicate_candidates(candidates):
+    """疑似重复报销单列表"""
+    return [{
+        'report_id': report_id,
+        'reasons': reasons
+    } for report_id, reasons in sorted(candidates.items())]
\ No newline at end of file
@@ -1,12 +1,18 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
+from sqlalchemy import func
 from models import LeaveRequest, User, db
+from utils.events import event_bus
+from utils.pagination import paginate_projected
+from utils.serializers import LEAVE_REQUEST, with_user_names, select_fields
+from utils.replicas import read_only
 from datetime import datetime, date
 
 bp = Blueprint('leave', __name__, url_prefix='/api/leave')
 
 @bp.route('/requests', methods=['GET'])
 @jwt_required()
+@read_only
 def get_leave_requests():
     """获取请假申请列表"""
     user_id = get_jwt_identity()
@@ -16,38 +22,29 @@ def get_leave_requests():
     per_page = request.args.get('per_page', 20, type=int)
     status = request.args.get('status')
     
+    serializer = with_user_names(LEAVE_REQUEST, user.role == 'admin')
+    try:
+        serializer = select_fields(serializer, request.args.get('fields'))
+    except ValueError as e:
+        return jsonify({'error': '未知字段: %s' % e}), 400
+    
     if user.role == 'admin':
         # 管理员可以查看所有请假申请
-        query = LeaveRequest.query.join(User)
+        query = serializer.query().join(User, LeaveRequest.user_id == User.id)
     else:
         # 普通用户只能查看自己的请假申请
-        query = LeaveRequest.query.filter_by(user_id=user_id)
+        query = serializer.query().filter(LeaveRequest.user_id == user_id)
     
     if status:
         query = query.filter(LeaveRequest.status == status)
     
+    count_query = query.with_entities(func.count(LeaveRequest.id))
     query = query.order_by(LeaveRequest.created_at.desc())
     
-    pagination = query.paginate(page=page, per_page=per_page, error_out=False)
-    requests = pagination.items
+    pagination = paginate_projected(query, count_query, page, per_page)
     
     return jsonify({
-        'requests': [{
-            'id': req.id,
-            'user_id': req.user_id,
-            'username': req.user.username if user.role == 'admin' else None,
-            'real_name': req.user.real_name if user.role == 'admin' else None,
-            'leave_type': req.leave_type,
-            'start_date': req.start_date.strftime('%Y-%m-%d'),
-            'end_date': req.end_date.strftime('%Y-%m-%d'),
-            'days': req.days,
-            'reason': req.reason,
-            'status': req.status,
-            'approver_id': req.approver_id,
-            'approved_at': req.approved_at.strftime('%Y-%m-%d %H:%M:%S') if req.approved_at else None,
-            'approval_notes': req.approval_notes,
-            'created_at': req.created_at.strftime('%Y-%m-%d %H:%M:%S')
-        } for req in requests],
+        'requests': serializer.serialize_rows(pagination.items),
         'pagination': {
             'page': pagination.page,
             'per_page': pagination.per_page,
@@ -99,6 +96,9 @@ def create_leave_request():
     )
     
     db.session.add(leave_request)
+    db.session.flush()
+    event_bus.publish('leave.submitted', {'id': leave_request.id, 'status': leave_request.status},
+                      user_id=leave_request.user_id, managers=True)
     db.session.commit()
     
     return jsonify({
@@ -210,6 +210,8 @@ def approve_leave_request(request_id):
     leave_request.approval_notes = notes
     leave_request.updated_at = datetime.utcnow()
     
+    event_bus.publish('leave.' + leave_request.status, {'id': leave_request.id, 'status': leave_request.status},
+                      user_id=leave_request.user_id, managers=True)
     db.session.commit()
     
     return jsonify({
@@ -235,6 +237,7 @@ def delete_leave_request(request_id):
         return jsonify({'error': '只能删除待审批状态的请假申请'}), 400
     
     db.session.delete(leave_request)
+    event_bus.publish('leave.deleted', {'id': request_id}, user_id=user_id, managers=True)
     db.session.commit()
     
     return jsonify({'message': '请假申请删除成功'}), 200
@@ -1,12 +1,21 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app
 from flask_jwt_extended import jwt_required, get_jwt_identity
+from sqlalchemy import func
 from models import OutingReport, User, db
+from utils.outing_sweeper import outing_board, sweep_overdue_outings, DEFAULT_SWEEP_INTERVAL
+from utils.sqlite_profile import write_transaction
+from utils.events import event_bus
+from utils.today_cache import today_json, SECTION_OUTING
+from utils.pagination import paginate_projected
+from utils.serializers import OUTING_REPORT, with_user_names, select_fields
+from utils.replicas import read_only
 from datetime import datetime
 
 bp = Blueprint('outing', __name__, url_prefix='/api/outing')
 
 @bp.route('/reports', methods=['GET'])
 @jwt_required()
+@read_only
 def get_outing_reports():
     """获取外出报备列表"""
     user_id = get_jwt_identity()
@@ -16,39 +25,29 @@ def get_outing_reports():
     per_page = request.args.get('per_page', 20, type=int)
     status = request.args.get('status')
     
+    serializer = with_user_names(OUTING_REPORT, user.role == 'admin')
+    try:
+        serializer = select_fields(serializer, request.args.get('fields'))
+    except ValueError as e:
+        return jsonify({'error': '未知字段: %s' % e}), 400
+    
     if user.role == 'admin':
         # 管理员可以查看所有外出报备
-        query = OutingReport.query.join(User)
+        query = serializer.query().join(User, OutingReport.user_id == User.id)
     else:
         # 普通用户只能查看自己的外出报备
-        query = OutingReport.query.filter_by(user_id=user_id)
+        query = serializer.query().filter(OutingReport.user_id == user_id)
     
     if status:
         query = query.filter(OutingReport.status == status)
     
+    count_query = query.with_entities(func.count(OutingReport.id))
     query = query.order_by(OutingReport.created_at.desc())
     
-    pagination = query.paginate(page=page, per_page=per_page, error_out=False)
-    reports = pagination.items
+    pagination = paginate_projected(query, count_query, page, per_page)
     
     return jsonify({
-        'reports': [{
-            'id': report.id,
-            'user_id': report.user_id,
-            'username': report.user.username if user.role == 'admin' else None,
-            'real_name': report.user.real_name if user.role == 'admin' else None,
-            'destination': report.destination,
-            'purpose': report.purpose,
-            'start_time': report.start_time.strftime('%Y-%m-%d %H:%M:%S'),
-            'expected_return_time': report.expected_return_time.strftime('%Y-%m-%d %H:%M:%S'),
-            'actual_return_time': report.actual_return_time.strftime('%Y-%m-%d %H:%M:%S') if report.actual_return_time else None,
-            'contact_info': report.contact_info,
-            'status': report.status,
-            'approver_id': report.approver_id,
-            'approved_at': report.approved_at.strftime('%Y-%m-%d %H:%M:%S') if report.approved_at else None,
-            'approval_notes': report.approval_notes,
-            'created_at': report.created_at.strftime('%Y-%m-%d %H:%M:%S')
-        } for report in reports],
+        'reports': serializer.serialize_rows(pagination.items),
         'pagination': {
             'page': pagination.page,
             'per_page': pagination.per_page,
@@ -97,6 +96,9 @@ def create_outing_report():
     )
     
     db.session.add(outing_report)
+    db.session.flush()
+    event_bus.publish('outing.submitted', {'id': outing_report.id, 'status': outing_report.status},
+                      user_id=outing_report.user_id, managers=True)
     db.session.commit()
     
     return jsonify({
@@ -134,6 +136,7 @@ def get_outing_report(report_id):
         'approver_id': outing_report.approver_id,
         'approved_at': outing_report.approved_at.strftime('%Y-%m-%d %H:%M:%S') if outing_report.approved_at else None,
         'approval_notes': outing_report.approval_notes,
+        'overdue_at': outing_report.overdue_at.strftime('%Y-%m-%d %H:%M:%S') if outing_report.overdue_at else None,
         'created_at': outing_report.created_at.strftime('%Y-%m-%d %H:%M:%S')
     }), 200
 
@@ -213,7 +216,15 @@ def approve_outing_report(report_id):
     outing_report.approval_notes = notes
     outing_report.updated_at = datetime.utcnow()
     
+    event_bus.publish('outing.' + outing_report.status, {
+        'id': outing_report.id,
+        'status': outing_report.status,
+        'destination': outing_report.destination,
+        'start_time': outing_report.start_time.strftime('%Y-%m-%d %H:%M:%S'),
+        'expected_return_time': outing_report.expected_return_time.strftime('%Y-%m-%d %H:%M:%S')
+    }, user_id=outing_report.user_id, managers=True)
     db.session.commit()
+    outing_board.invalidate()
     
     return jsonify({
         'message': f'外出报备已{"通过" if action == "approve" else "拒绝"}'
@@ -245,7 +256,13 @@ def complete_outing_report(report_id):
     outing_report.status = 'completed'
     outing_report.updated_at = datetime.utcnow()
     
+    event_bus.publish('outing.completed', {
+        'id': outing_report.id,
+        'status': outing_report.status,
+        'actual_return_time': outing_report.actual_return_time.strftime('%Y-%m-%d %H:%M:%S')
+    }, user_id=outing_report.user_id, managers=True)
     db.session.commit()
+    outing_board.invalidate()
     
     return jsonify({'message': '外出报备完成'}), 200
 
@@ -268,6 +285,7 @@ def delete_outing_report(report_id):
         return jsonify({'error': '只能删除待审批状态的外出报备'}), 400
     
     db.session.delete(outing_report)
+    event_bus.publish('outing.deleted', {'id': report_id}, user_id=user_id, managers=True)
     db.session.commit()
     
     return jsonify({'message': '外出报备删除成功'}), 200
@@ -278,27 +296,67 @@ def get_current_outing():
     """获取当前进行中的外出报备"""
     user_id = get_jwt_identity()
     
-    # 查找已审批但未完成的外出报备
-    current_outing = OutingReport.query.filter_by(
-        user_id=user_id,
-        status='approved'
-    ).filter(
-        OutingReport.actual_return_time.is_(None)
-    ).filter(
-        OutingReport.start_time <= datetime.utcnow()
-    ).first()
+    def build():
+        # 查找已审批但未完成的外出报备
+        current_outing = OutingReport.query.filter_by(
+            user_id=user_id,
+            status='approved'
+        ).filter(
+            OutingReport.actual_return_time.is_(None)
+        ).filter(
+            OutingReport.start_time <= datetime.now()
+        ).first()
+        
+        if not current_outing:
+            return {'outing': None}
+        
+        return {
+            'outing': {
+                'id': current_outing.id,
+                'destination': current_outing.destination,
+                'purpose': current_outing.purpose,
+                'start_time': current_outing.start_time.strftime('%Y-%m-%d %H:%M:%S'),
+                'expected_return_time': current_outing.expected_return_time.strftime('%Y-%m-%d %H:%M:%S'),
+                'contact_info': current_outing.contact_info,
+                'status': current_outing.status
+            }
+        }
     
-    if not current_outing:
-        return jsonify({'outing': None}), 200
+    def expires():
+        # 已审批但尚未开始的外出到开始时间后才成为当前外出，缓存到那时为止
+        return db.session.query(func.min(OutingReport.start_time)).filter(
+            OutingReport.user_id == user_id,
+            OutingReport.status == 'approved',
+            OutingReport.actual_return_time.is_(None),
+            OutingReport.start_time > datetime.now()
+        ).scalar()
+    
+    return today_json(user_id, SECTION_OUTING, build, expires)
+
+@bp.route('/board', methods=['GET'])
+@jwt_required()
+def get_outing_board():
+    """外出人员看板：当前外出和超时未返回的人员（读取超时扫描的结果）"""
+    user_id = get_jwt_identity()
+    user = User.query.get(user_id)
+    
+    if user.role not in ['admin', 'manager']:
+        return jsonify({'error': '无权查看外出看板'}), 403
+    
+    # 定时扫描未运行（或结果已过期）时在本次请求中扫描一次
+    max_age = current_app.config.get('OUTING_SWEEP_INTERVAL', DEFAULT_SWEEP_INTERVAL) * 2
+    snapshot = outing_board.get(max_age)
+    if snapshot is None:
+        with write_transaction():
+            snapshot, _ = sweep_overdue_outings()
+    
+    outings = snapshot['outings']
+    if request.args.get('overdue', 'false').lower() in ['1', 'true']:
+        outings = [outing for outing in outings if outing['overdue']]
     
     return jsonify({
-        'outing': {
-            'id': current_outing.id,
-            'destination': current_outing.destination,
-            'purpose': current_outing.purpose,
-            'start_time': current_outing.start_time.strftime('%Y-%m-%d %H:%M:%S'),
-            'expected_return_time': current_outing.expected_return_time.strftime('%Y-%m-%d %H:%M:%S'),
-            'contact_info': current_outing.contact_info,
-            'status': current_outing.status
-        }
-    }), 200
\ No newline at end of file
+        'swept_at': snapshot['swept_at'].strftime('%Y-%m-%d %H:%M:%S'),
+        'out_count': snapshot['out_count'],
+        'overdue_count': snapshot['overdue_count'],
+        'outings': outings
+    }), 200
@@ -1,12 +1,37 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app, url_for, Response, stream_with_context
 from flask_jwt_extended import jwt_required, get_jwt_identity
+from itsdangerous import URLSafeSerializer, BadSignature
+from sqlalchemy import func
+from sqlalchemy.orm import contains_eager
 from models import Schedule, User, db
-from datetime import datetime, date, time, timedelta
+from utils.http_cache import conditional_json
+from utils.versioning import get_table_versions, track_tables
+from utils import ical
+from utils.dates import month_range
+from utils.events import event_bus
+from utils.today_cache import today_json, SECTION_SCHEDULE
+from utils.pagination import paginate_projected
+from utils.serializers import SCHEDULE, with_user_names, select_fields
+from utils.replicas import read_only
+from datetime import datetime, date, time, timedelta, timezone
+from threading import Lock
+import hashlib
 
 bp = Blueprint('schedule', __name__, url_prefix='/api/schedule')
 
+# 排班视图依赖的表（日历中管理员可见用户名，因此也依赖用户表）
+track_tables(Schedule.__tablename__, User.__tablename__)
+
+SHIFT_TYPES = [
+    {'value': 'morning', 'label': '早班'},
+    {'value': 'afternoon', 'label': '中班'},
+    {'value': 'evening', 'label': '晚班'},
+    {'value': 'night', 'label': '夜班'}
+]
+
 @bp.route('/schedules', methods=['GET'])
 @jwt_required()
+@read_only
 def get_schedules():
     """获取排班列表"""
     user_id = get_jwt_identity()
@@ -18,40 +43,33 @@ def get_schedules():
     end_date = request.args.get('end_date')
     schedule_user_id = request.args.get('user_id', type=int)
     
+    serializer = with_user_names(SCHEDULE, user.role == 'admin')
+    try:
+        serializer = select_fields(serializer, request.args.get('fields'))
+    except ValueError as e:
+        return jsonify({'error': '未知字段: %s' % e}), 400
+    
     if user.role == 'admin':
         # 管理员可以查看所有排班
-        query = Schedule.query.join(User)
+        query = serializer.query().join(User, Schedule.user_id == User.id)
         if schedule_user_id:
             query = query.filter(Schedule.user_id == schedule_user_id)
     else:
         # 普通用户只能查看自己的排班
-        query = Schedule.query.filter_by(user_id=user_id)
+        query = serializer.query().filter(Schedule.user_id == user_id)
     
     if start_date:
         query = query.filter(Schedule.date >= datetime.strptime(start_date, '%Y-%m-%d').date())
     if end_date:
         query = query.filter(Schedule.date <= datetime.strptime(end_date, '%Y-%m-%d').date())
     
+    count_query = query.with_entities(func.count(Schedule.id))
     query = query.order_by(Schedule.date.desc())
     
-    pagination = query.paginate(page=page, per_page=per_page, error_out=False)
-    schedules = pagination.items
+    pagination = paginate_projected(query, count_query, page, per_page)
     
     return jsonify({
-        'schedules': [{
-            'id': schedule.id,
-            'user_id': schedule.user_id,
-            'username': schedule.user.username if user.role == 'admin' else None,
-            'real_name': schedule.user.real_name if user.role == 'admin' else None,
-            'date': schedule.date.strftime('%Y-%m-%d'),
-            'shift_type': schedule.shift_type,
-            'start_time': schedule.start_time.strftime('%H:%M:%S'),
-            'end_time': schedule.end_time.strftime('%H:%M:%S'),
-            'break_start': schedule.break_start.strftime('%H:%M:%S') if schedule.break_start else None,
-            'break_end': schedule.break_end.strftime('%H:%M:%S') if schedule.break_end else None,
-            'notes': schedule.notes,
-            'created_at': schedule.created_at.strftime('%Y-%m-%d %H:%M:%S')
-        } for schedule in schedules],
+        'schedules': serializer.serialize_rows(pagination.items),
         'pagination': {
             'page': pagination.page,
             'per_page': pagination.per_page,
@@ -128,6 +146,8 @@ def create_schedule():
     )
     
     db.session.add(schedule)
+    db.session.flush()
+    publish_schedule_changed(schedule)
     db.session.commit()
     
     return jsonify({
@@ -135,6 +155,18 @@ def create_schedule():
         'schedule_id': schedule.id
     }), 201
 
+def publish_schedule_changed(schedule):
+    """排班新增或修改事件（在岗看板据此更新当天的班次）"""
+    event_bus.publish('schedule.changed', {
+        'id': schedule.id,
+        'date': schedule.date.strftime('%Y-%m-%d'),
+        'shift_type': schedule.shift_type,
+        'start_time': schedule.start_time.strftime('%H:%M:%S'),
+        'end_time': schedule.end_time.strftime('%H:%M:%S'),
+        'break_start': schedule.break_start.strftime('%H:%M:%S') if schedule.break_start else None,
+        'break_end': schedule.break_end.strftime('%H:%M:%S') if schedule.break_end else None
+    }, user_id=schedule.user_id, managers=True)
+
 @bp.route('/schedules/<int:schedule_id>', methods=['GET'])
 @jwt_required()
 def get_schedule(schedule_id):
@@ -213,6 +245,7 @@ def update_schedule(schedule_id):
     
     schedule.updated_at = datetime.utcnow()
     
+    publish_schedule_changed(schedule)
     db.session.commit()
     
     return jsonify({'message': '排班更新成功'}), 200
@@ -232,13 +265,17 @@ def delete_schedule(schedule_id):
     if not schedule:
         return jsonify({'error': '排班不存在'}), 404
     
+    schedule_user_id, schedule_date = schedule.user_id, schedule.date
     db.session.delete(schedule)
+    event_bus.publish('schedule.deleted', {'id': schedule_id, 'date': schedule_date.strftime('%Y-%m-%d')},
+                      user_id=schedule_user_id, managers=True)
     db.session.commit()
     
     return jsonify({'message': '排班删除成功'}), 200
 
 @bp.route('/my-schedule', methods=['GET'])
 @jwt_required()
+@read_only
 def get_my_schedule():
     """获取我的排班"""
     user_id = get_jwt_identity()
@@ -259,28 +296,33 @@ def get_my_schedule():
             next_month = today.replace(month=today.month + 1, day=1)
         end_date = (next_month - timedelta(days=1)).strftime('%Y-%m-%d')
     
-    # 查询排班
-    schedules = Schedule.query.filter_by(user_id=user_id).filter(
-        Schedule.date >= datetime.strptime(start_date, '%Y-%m-%d').date(),
-        Schedule.date <= datetime.strptime(end_date, '%Y-%m-%d').date()
-    ).order_by(Schedule.date).all()
+    versions = get_table_versions(Schedule.__tablename__)
     
-    return jsonify({
-        'schedules': [{
-            'id': schedule.id,
-            'date': schedule.date.strftime('%Y-%m-%d'),
-            'shift_type': schedule.shift_type,
-            'start_time': schedule.start_time.strftime('%H:%M:%S'),
-            'end_time': schedule.end_time.strftime('%H:%M:%S'),
-            'break_start': schedule.break_start.strftime('%H:%M:%S') if schedule.break_start else None,
-            'break_end': schedule.break_end.strftime('%H:%M:%S') if schedule.break_end else None,
-            'notes': schedule.notes
-        } for schedule in schedules],
-        'period': {
-            'start_date': start_date,
-            'end_date': end_date
+    def build():
+        # 查询排班
+        schedules = Schedule.query.filter_by(user_id=user_id).filter(
+            Schedule.date >= datetime.strptime(start_date, '%Y-%m-%d').date(),
+            Schedule.date <= datetime.strptime(end_date, '%Y-%m-%d').date()
+        ).order_by(Schedule.date).all()
+        
+        return {
+            'schedules': [{
+                'id': schedule.id,
+                'date': schedule.date.strftime('%Y-%m-%d'),
+                'shift_type': schedule.shift_type,
+                'start_time': schedule.start_time.strftime('%H:%M:%S'),
+                'end_time': schedule.end_time.strftime('%H:%M:%S'),
+                'break_start': schedule.break_start.strftime('%H:%M:%S') if schedule.break_start else None,
+                'break_end': schedule.break_end.strftime('%H:%M:%S') if schedule.break_end else None,
+                'notes': schedule.notes
+            } for schedule in schedules],
+            'period': {
+                'start_date': start_date,
+                'end_date': end_date
+            }
         }
-    }), 200
+    
+    return conditional_json(('my_schedule', user_id, start_date, end_date), versions, build)
 
 @bp.route('/today', methods=['GET'])
 @jwt_required()
@@ -289,42 +331,39 @@ def get_today_schedule():
     user_id = get_jwt_identity()
     today = date.today()
     
-    schedule = Schedule.query.filter_by(
-        user_id=user_id,
-        date=today
-    ).first()
-    
-    if not schedule:
-        return jsonify({'schedule': None}), 200
-    
-    return jsonify({
-        'schedule': {
-            'id': schedule.id,
-            'date': schedule.date.strftime('%Y-%m-%d'),
-            'shift_type': schedule.shift_type,
-            'start_time': schedule.start_time.strftime('%H:%M:%S'),
-            'end_time': schedule.end_time.strftime('%H:%M:%S'),
-            'break_start': schedule.break_start.strftime('%H:%M:%S') if schedule.break_start else None,
-            'break_end': schedule.break_end.strftime('%H:%M:%S') if schedule.break_end else None,
-            'notes': schedule.notes
+    def build():
+        schedule = Schedule.query.filter_by(
+            user_id=user_id,
+            date=today
+        ).first()
+        
+        if not schedule:
+            return {'schedule': None}
+        
+        return {
+            'schedule': {
+                'id': schedule.id,
+                'date': schedule.date.strftime('%Y-%m-%d'),
+                'shift_type': schedule.shift_type,
+                'start_time': schedule.start_time.strftime('%H:%M:%S'),
+                'end_time': schedule.end_time.strftime('%H:%M:%S'),
+                'break_start': schedule.break_start.strftime('%H:%M:%S') if schedule.break_start else None,
+                'break_end': schedule.break_end.strftime('%H:%M:%S') if schedule.break_end else None,
+                'notes': schedule.notes
+            }
         }
-    }), 200
+    
+    return today_json(user_id, SECTION_SCHEDULE, build)
 
 @bp.route('/shift-types', methods=['GET'])
 @jwt_required()
 def get_shift_types():
     """获取班次类型列表"""
-    shift_types = [
-        {'value': 'morning', 'label': '早班'},
-        {'value': 'afternoon', 'label': '中班'},
-        {'value': 'evening', 'label': '晚班'},
-        {'value': 'night', 'label': '夜班'}
-    ]
-    
-    return jsonify({'shift_types': shift_types}), 200
+    return jsonify({'shift_types': SHIFT_TYPES}), 200
 
 @bp.route('/calendar', methods=['GET'])
 @jwt_required()
+@read_only
 def get_schedule_calendar():
     """获取排班日历视图"""
     user_id = get_jwt_identity()
@@ -335,45 +374,224 @@ def get_schedule_calendar():
     # 解析月份
     year, month_num = map(int, month.split('-'))
     
-    # 获取当月的排班
-    if user.role == 'admin':
-        # 管理员可以查看所有人的排班
-        schedules = Schedule.query.join(User).filter(
-            db.extract('year', Schedule.date) == year,
-            db.extract('month', Schedule.date) == month_num
-        ).all()
+    is_admin = user.role == 'admin'
+    
+    # 管理员可以查看所有人的排班，普通用户只能查看自己的排班
+    if is_admin:
+        scope = 'all'
+        versions = get_table_versions(Schedule.__tablename__, User.__tablename__)
     else:
-        # 普通用户只能查看自己的排班
-        schedules = Schedule.query.filter_by(user_id=user_id).filter(
-            db.extract('year', Schedule.date) == year,
-            db.extract('month', Schedule.date) == month_num
-        ).all()
-    
-    # 构建日历数据
-    calendar_data = {}
-    for schedule in schedules:
-        date_str = schedule.date.strftime('%Y-%m-%d')
-        if date_str not in calendar_data:
-            calendar_data[date_str] = []
+        scope = user_id
+        versions = get_table_versions(Schedule.__tablename__)
+    
+    def build():
+        month_start, month_end = month_range(year, month_num)
         
-        schedule_info = {
-            'id': schedule.id,
-            'shift_type': schedule.shift_type,
-            'start_time': schedule.start_time.strftime('%H:%M'),
-            'end_time': schedule.end_time.strftime('%H:%M'),
-            'notes': schedule.notes
-        }
+        # 获取当月的排班（按日期范围过滤以便使用索引）
+        if is_admin:
+            schedules = Schedule.query.join(User).options(
+                contains_eager(Schedule.user)
+            ).filter(
+                Schedule.date >= month_start,
+                Schedule.date < month_end
+            ).order_by(Schedule.date, Schedule.id).all()
+        else:
+            schedules = Schedule.query.filter_by(user_id=user_id).filter(
+                Schedule.date >= month_start,
+                Schedule.date < month_end
+            ).order_by(Schedule.date, Schedule.id).all()
         
-        if user.role == 'admin':
-            schedule_info.update({
-                'user_id': schedule.user_id,
-                'username': schedule.user.username,
-                'real_name': schedule.user.real_name
-            })
+        # 构建日历数据
+        calendar_data = {}
+        for schedule in schedules:
+            date_str = schedule.date.strftime('%Y-%m-%d')
+            if date_str not in calendar_data:
+                calendar_data[date_str] = []
+            
+            schedule_info = {
+                'id': schedule.id,
+                'shift_type': schedule.shift_type,
+                'start_time': schedule.start_time.strftime('%H:%M'),
+                'end_time': schedule.end_time.strftime('%H:%M'),
+                'notes': schedule.notes
+            }
+            
+            if is_admin:
+                schedule_info.update({
+                    'user_id': schedule.user_id,
+                    'username': schedule.user.username,
+                    'real_name': schedule.user.real_name
+                })
+            
+            calendar_data[date_str].append(schedule_info)
         
-        calendar_data[date_str].append(schedule_info)
+        return {
+            'month': month,
+            'calendar': calendar_data
+        }
     
-    return jsonify({
-        'month': month,
-        'calendar': calendar_data
-    }), 200
\ No newline at end of file
+    return conditional_json(('calendar', month, scope), versions, build)
+
+@bp.route('/feed-token', methods=['GET'])
+@jwt_required()
+def get_feed_token():
+    """获取个人排班日历订阅地址"""
+    user = User.query.get(get_jwt_identity())
+    if not user:
+        return jsonify({'error': '用户不存在'}), 404
+    
+    return jsonify(feed_token_response(user)), 200
+
+@bp.route('/feed-token/reset', methods=['POST'])
+@jwt_required()
+def reset_feed_token():
+    """重置排班日历订阅地址（地址泄露时使用），之前的订阅地址立即失效"""
+    user = User.query.get(get_jwt_identity())
+    if not user:
+        return jsonify({'error': '用户不存在'}), 404
+    
+    user.feed_token_version = (user.feed_token_version or 0) + 1
+    db.session.commit()
+    
+    return jsonify(feed_token_response(user)), 200
+
+def feed_token_response(user):
+    token = feed_serializer().dumps([user.id, user.feed_token_version or 0])
+    return {
+        'token': token,
+        'feed_url': url_for('schedule.get_schedule_feed', token=token, _external=True)
+    }
+
+@bp.route('/feed/<token>.ics', methods=['GET'])
+@read_only
+def get_schedule_feed(token):
+    """个人排班 iCalendar 订阅（使用订阅令牌认证）"""
+    try:
+        user_id, token_version = parse_feed_token(feed_serializer().loads(token))
+    except (BadSignature, TypeError, ValueError):
+        return jsonify({'error': '无效的订阅令牌'}), 404
+    
+    versions = get_table_versions(Schedule.__tablename__, User.__tablename__)
+    snapshot = get_feed_snapshot(versions)
+    
+    if user_id not in snapshot['active_users']:
+        return jsonify({'error': '用户不存在'}), 404
+    if snapshot['active_users'][user_id] != token_version:
+        return jsonify({'error': '订阅令牌已失效'}), 404
+    
+    events = snapshot['events'].get(user_id, [])
+    etag = snapshot['digests'].get(user_id, snapshot['empty_digest'])
+    last_modified = snapshot['last_modified']
+    
+    # 日历客户端的定期轮询大多在这里直接返回 304
+    not_modified = False
+    if request.if_none_match:
+        not_modified = request.if_none_match.contains_weak(etag)
+    elif request.if_modified_since and last_modified:
+        not_modified = last_modified <= request.if_modified_since.replace(tzinfo=None)
+    
+    if not_modified:
+        response = Response(status=304)
+    else:
+        def generate():
+            yield ical.calendar_header('我的排班')
+            for event in events:
+                yield event
+            yield ical.calendar_footer()
+        
+        response = Response(stream_with_context(generate()), mimetype='text/calendar')
+        response.headers['Content-Disposition'] = 'inline; filename="schedule.ics"'
+    
+    response.set_etag(etag)
+    if last_modified:
+        response.last_modified = last_modified
+    response.cache_control.private = True
+    response.cache_control.max_age = 0
+    return response
+
+def feed_serializer():
+    """排班订阅令牌签名器"""
+    return URLSafeSerializer(current_app.config['SECRET_KEY'], salt='schedule-feed')
+
+def parse_feed_token(payload):
+    """订阅令牌内容为 [用户, 令牌版本]；早期签发的令牌只有用户 ID，按版本 0 处理"""
+    if isinstance(payload, list):
+        user_id, token_version = payload
+        return int(user_id), int(token_version)
+    return int(payload), 0
+
+# 排班订阅快照：所有订阅者共享，排班表或用户表版本变化、或日期变化（订阅窗口随之移动）时整体重建一次
+_feed_snapshot = {'key': None}
+_feed_snapshot_lock = Lock()
+
+def get_feed_snapshot(versions):
+    """获取与当前数据版本和当天日期一致的订阅快照"""
+    global _feed_snapshot
+    key = (versions, date.today())
+    snapshot = _feed_snapshot
+    if snapshot['key'] == key:
+        return snapshot
+    
+    with _feed_snapshot_lock:
+        if _feed_snapshot['key'] != key:
+            _feed_snapshot = build_feed_snapshot(versions, key[1])
+        return _feed_snapshot
+
+def build_feed_snapshot(versions, today):
+    """一次扫描生成订阅窗口内所有用户的 VEVENT"""
+    window_start = today - timedelta(days=current_app.config.get('SCHEDULE_FEED_PAST_DAYS', 30))
+    window_end = today + timedelta(days=current_app.config.get('SCHEDULE_FEED_FUTURE_DAYS', 90))
+    domain = current_app.config.get('SCHEDULE_FEED_DOMAIN', 'attendance.local')
+    shift_labels = {shift['value']: shift['label'] for shift in SHIFT_TYPES}
+    
+    # 有效用户及其订阅令牌版本
+    active_users = {
+        row.id: row.feed_token_version or 0
+        for row in db.session.query(User.id, User.feed_token_version).filter(User.is_active.isnot(False))
+    }
+    
+    rows = db.session.query(
+        Schedule.id,
+        Schedule.user_id,
+        Schedule.date,
+        Schedule.shift_type,
+        Schedule.start_time,
+        Schedule.end_time,
+        Schedule.notes,
+        Schedule.created_at,
+        Schedule.updated_at
+    ).filter(
+        Schedule.date >= window_start,
+        Schedule.date <= window_end
+    ).order_by(Schedule.user_id, Schedule.date, Schedule.id).yield_per(1000)
+    
+    events = {}
+    hashes = {}
+    for row in rows:
+        event = ical.schedule_event(
+            row.id,
+            row.date,
+            row.start_time,
+            row.end_time,
+            shift_labels.get(row.shift_type, row.shift_type),
+            row.notes,
+            row.updated_at or row.created_at or datetime.utcnow(),
+            domain
+        )
+        events.setdefault(row.user_id, []).append(event)
+        hashes.setdefault(row.user_id, hashlib.sha1()).update(event.encode('utf-8'))
+    
+    # 窗口每天移动一次，最后修改时间不早于当天零点（本地时间，换算为 UTC）
+    last_modified = datetime.combine(today, time.min).astimezone(timezone.utc).replace(tzinfo=None)
+    schedule_modified = versions[Schedule.__tablename__][1]
+    if schedule_modified and schedule_modified > last_modified:
+        last_modified = schedule_modified
+    
+    return {
+        'key': (versions, today),
+        'events': events,
+        'digests': {user_id: digest.hexdigest() for user_id, digest in hashes.items()},
+        'empty_digest': hashlib.sha1(b'').hexdigest(),
+        'active_users': active_users,
+        'last_modified': last_modified.replace(microsecond=0)
+    }
\ No newline at end of file
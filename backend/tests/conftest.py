@@ -0,0 +1,133 @@
+"""测试环境：临时 SQLite 文件数据库，批量写入接近实际规模的数据"""
+from flask_jwt_extended import create_access_token
+from sqlalchemy import event
+from contextlib import contextmanager
+from datetime import date, datetime, time, timedelta
+import pytest
+import re
+
+from app import create_app
+from models import (User, AttendanceRecord, Schedule, LeaveRequest, ExpenseReport, WorkDiary,
+                    OutingReport, db)
+from utils.diary_search import rebuild_search_index
+
+EMPLOYEES = 60
+DAYS = 120
+TODAY = date.today()
+
+# 事务控制语句不计入查询数
+TRANSACTION_STATEMENT = re.compile(r'^\s*(BEGIN|COMMIT|ROLLBACK|SAVEPOINT|RELEASE)\b', re.IGNORECASE)
+
+def seed(now=None):
+    """用 Core 批量插入写入测试数据：1 名管理员、EMPLOYEES 名员工，每人 DAYS 天的考勤和排班"""
+    now = now or datetime.now()
+    statuses = ('pending', 'approved', 'rejected')
+
+    users = [{'username': 'admin', 'email': 'admin@example.com', 'password': 'x', 'real_name': '管理员',
+              'role': 'admin', 'created_at': now}]
+    users += [{'username': 'user%d' % i, 'email': 'user%d@example.com' % i, 'password': 'x',
+               'real_name': '员工%d' % i, 'role': 'employee', 'created_at': now} for i in range(EMPLOYEES)]
+    db.session.execute(User.__table__.insert(), users)
+    employee_ids = [row[0] for row in db.session.query(User.id).filter(User.role == 'employee')]
+
+    attendance, schedules, diaries = [], [], []
+    leaves, expenses, outings = [], [], []
+    for index, user_id in enumerate(employee_ids):
+        for offset in range(1, DAYS + 1):
+            day = TODAY - timedelta(days=offset)
+            clock_in = datetime.combine(day, time(9, index % 15))
+            attendance.append({
+                'user_id': user_id, 'date': day, 'clock_in_time': clock_in,
+                'clock_out_time': clock_in + timedelta(hours=9), 'work_hours': 8.0,
+                'status': 'late' if index % 15 > 10 else 'normal', 'created_at': clock_in, 'updated_at': clock_in
+            })
+            schedules.append({
+                'user_id': user_id, 'date': day, 'shift_type': 'morning', 'start_time': time(9),
+                'end_time': time(18), 'created_at': now, 'updated_at': now
+            })
+            if offset % 2:
+                diaries.append({
+                    'user_id': user_id, 'date': day, 'content': '完成第%d天的工作' % offset,
+                    'created_at': clock_in, 'updated_at': clock_in
+                })
+        for number in range(5):
+            created_at = now - timedelta(days=number * 7 + index % 7)
+            status = statuses[(index + number) % 3]
+            leaves.append({
+                'user_id': user_id, 'leave_type': 'annual', 'start_date': created_at.date(),
+                'end_date': created_at.date(), 'days': 1, 'reason': '休假', 'status': status,
+                'created_at': created_at, 'updated_at': created_at
+            })
+            expenses.append({
+                'user_id': user_id, 'expense_type': 'travel', 'amount_cents': 1000 * (number + 1),
+                'date': created_at.date(), 'description': '差旅', 'status': status,
+                'created_at': created_at, 'updated_at': created_at
+            })
+            outings.append({
+                'user_id': user_id, 'destination': '客户现场', 'purpose': '拜访',
+                'start_time': created_at, 'expected_return_time': created_at + timedelta(hours=3),
+                'actual_return_time': created_at + timedelta(hours=3) if status == 'approved' else None,
+                'status': status, 'created_at': created_at, 'updated_at': created_at
+            })
+
+    for model, rows in ((AttendanceRecord, attendance), (Schedule, schedules), (WorkDiary, diaries),
+                        (LeaveRequest, leaves), (ExpenseReport, expenses), (OutingReport, outings)):
+        db.session.execute(model.__table__.insert(), rows)
+    rebuild_search_index(db.session.connection())
+    db.session.commit()
+
+@pytest.fixture(scope='session')
+def app(tmp_path_factory):
+    database = tmp_path_factory.mktemp('db') / 'attendance.db'
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': 'sqlite:///%s' % database,
+        'RECEIPT_STORAGE_DIR': str(tmp_path_factory.mktemp('receipts')),
+        'TESTING': True,
+        'SLOW_QUERY_ENABLED': False
+    })
+    with app.app_context():
+        db.create_all()
+        seed()
+        db.session.execute(db.text('ANALYZE'))
+        db.session.commit()
+    return app
+
+@pytest.fixture(scope='session')
+def engine(app):
+    with app.app_context():
+        return db.engine
+
+@pytest.fixture(scope='session')
+def headers(app):
+    """按角色返回请求头：headers['admin']、headers['employee']"""
+    with app.app_context():
+        admin_id = User.query.filter_by(role='admin').first().id
+        employee_id = User.query.filter_by(role='employee').first().id
+        return {
+            'admin': {'Authorization': 'Bearer %s' % create_access_token(identity=admin_id)},
+            'employee': {'Authorization': 'Bearer %s' % create_access_token(identity=employee_id)}
+        }
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+@pytest.fixture
+def capture(engine):
+    """capture() 返回记录 SQL 的上下文管理器"""
+    return lambda: capture_queries(engine)
+
+@contextmanager
+def capture_queries(engine):
+    """记录代码块中执行的 SQL：返回 [(statement, parameters)]，不含事务控制语句"""
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if not TRANSACTION_STATEMENT.match(statement):
+            statements.append((statement, parameters))
+
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, 'before_cursor_execute', before_cursor_execute)
@@ -0,0 +1,19 @@
+"""响应压缩：压缩后的响应使用弱 ETag，带弱 ETag 的条件请求仍返回 304"""
+
+def test_compressed_response_has_weak_etag(client, headers):
+    url = '/api/schedule/calendar?scope=all'
+    plain = client.get(url, headers=headers['admin'])
+    assert plain.status_code == 200
+    assert 'Content-Encoding' not in plain.headers
+    assert not plain.headers['ETag'].startswith('W/')
+
+    gzip_headers = dict(headers['admin'], **{'Accept-Encoding': 'gzip'})
+    compressed = client.get(url, headers=gzip_headers)
+    assert compressed.headers['Content-Encoding'] == 'gzip'
+    assert compressed.headers['ETag'] == 'W/' + plain.headers['ETag']
+
+    response = client.get(url, headers=dict(gzip_headers, **{'If-None-Match': compressed.headers['ETag']}))
+    assert response.status_code == 304
+    assert response.headers['ETag'] == compressed.headers['ETag']
+    # 未压缩版本的强 ETag 同样匹配
+    assert client.get(url, headers=dict(headers['admin'], **{'If-None-Match': plain.headers['ETag']})).status_code == 304
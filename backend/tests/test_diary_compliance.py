@@ -0,0 +1,35 @@
+"""日报合规报告：迟交按本地日期判断（created_at 为 UTC）"""
+from datetime import date, datetime, time
+from models import Schedule, User, WorkDiary, db
+from routes.diary import query_diary_compliance
+
+DAY = date(2099, 7, 1)
+
+def test_late_uses_local_date(app, monkeypatch):
+    # 服务器在 UTC+8：当地 7 月 2 日 06:00 写 7 月 1 日的日报（UTC 为 7 月 1 日 22:00）
+    monkeypatch.setattr('routes.diary.utc_offset_seconds', lambda: 8 * 3600)
+    with app.app_context():
+        user_id = db.session.query(User.id).filter_by(role='employee').first().id
+        schedule = Schedule(user_id=user_id, date=DAY, shift_type='morning', start_time=time(9), end_time=time(18))
+        diary = WorkDiary(user_id=user_id, date=DAY, content='补写日报', created_at=datetime(2099, 7, 1, 22, 0))
+        db.session.add_all([schedule, diary])
+        db.session.commit()
+        try:
+            row, = query_diary_compliance(DAY, DAY, user_id)
+            assert (row.submitted, row.late) == (1, 1)
+
+            # 当地 7 月 1 日 23:00 写的（UTC 为 7 月 1 日 15:00）不算迟交
+            diary.created_at = datetime(2099, 7, 1, 15, 0)
+            db.session.commit()
+            row, = query_diary_compliance(DAY, DAY, user_id)
+            assert (row.submitted, row.late) == (1, 0)
+
+            # 当地 7 月 2 日 02:00 写的（UTC 仍为 7 月 1 日 18:00）算迟交
+            diary.created_at = datetime(2099, 7, 1, 18, 0)
+            db.session.commit()
+            row, = query_diary_compliance(DAY, DAY, user_id)
+            assert row.late == 1
+        finally:
+            db.session.delete(diary)
+            db.session.delete(schedule)
+            db.session.commit()
@@ -0,0 +1,63 @@
+"""日报全文搜索：二元组索引，两个字的搜索词也走全文索引并按相关度排序"""
+from datetime import date
+from models import User, WorkDiary, db
+from utils.diary_search import bigram_segment, is_indexable, rebuild_search_index, search_work_diaries
+import sqlite3
+
+def test_bigram_segment():
+    assert bigram_segment('项目进度, OK!') == '项目 目进 进度 ok'
+    assert bigram_segment('第3天 a') == '第3 3天 a'
+    assert bigram_segment(None) is None
+    assert is_indexable('工作') and is_indexable('ab')
+    assert not is_indexable('工') and not is_indexable('a-b')
+
+def test_two_character_term_uses_index(client, headers, capture):
+    with capture() as queries:
+        response = client.get('/api/diary/search?q=工作', headers=headers['admin'])
+    assert response.status_code == 200
+    results = response.get_json()['results']
+    assert results and all(result['score'] > 0 for result in results)
+    assert '<mark>工作</mark>' in results[0]['snippets']['content']
+    assert any('work_diary_fts MATCH' in statement for statement, _ in queries)
+    assert not any('LIKE' in statement for statement, _ in queries)
+
+def test_index_follows_updates_and_deletes(app):
+    with app.app_context():
+        user_id = db.session.query(User.id).filter_by(role='employee').first().id
+        diary = WorkDiary(user_id=user_id, date=date(2099, 1, 1), content='检修锅炉管道')
+        db.session.add(diary)
+        db.session.commit()
+        assert [row['id'] for row in search_work_diaries('锅炉')[0]] == [diary.id]
+
+        diary.content = '巡检配电柜'
+        db.session.commit()
+        assert search_work_diaries('锅炉')[1] == 0
+        assert [row['id'] for row in search_work_diaries('配电')[0]] == [diary.id]
+
+        db.session.delete(diary)
+        db.session.commit()
+        assert search_work_diaries('配电')[1] == 0
+
+def test_other_connections_can_write(app):
+    # 索引由应用写入，没有注册分词函数的连接（sqlite3 命令行等）也能写入日报表，之后重建索引
+    with app.app_context():
+        user_id = db.session.query(User.id).filter_by(role='employee').first().id
+        db.session.rollback()
+        connection = sqlite3.connect(db.engine.url.database)
+        try:
+            cursor = connection.execute(
+                "INSERT INTO work_diary (user_id, date, content) VALUES (?, '2099-02-01', '更换冷却水泵')", (user_id,)
+            )
+            diary_id = cursor.lastrowid
+            connection.commit()
+        finally:
+            connection.close()
+        assert search_work_diaries('水泵')[1] == 0
+
+        rebuild_search_index(db.session.connection())
+        db.session.commit()
+        assert [row['id'] for row in search_work_diaries('水泵')[0]] == [diary_id]
+
+        db.session.delete(db.session.get(WorkDiary, diary_id))
+        db.session.commit()
+        assert search_work_diaries('水泵')[1] == 0
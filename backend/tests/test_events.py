@@ -0,0 +1,50 @@
+"""实时推送：事件随事务写入事件日志，各进程的事件总线都能读取并续传"""
+from itertools import islice
+from models import User, db
+from utils.events import EventBus, stream_events
+
+def employee_id(app):
+    with app.app_context():
+        return db.session.query(User.id).filter_by(role='employee').first().id
+
+def open_stream(app, bus, user_id, last_event_id=None):
+    return stream_events(app, user_id, 'employee', last_event_id=last_event_id, heartbeat=1, max_duration=5,
+                         poll_interval=0, bus=bus)
+
+def data_lines(chunks):
+    return [chunk for chunk in chunks if chunk.startswith(('id:', 'event:'))]
+
+def test_events_reach_other_processes_and_resume(app):
+    user_id = employee_id(app)
+    worker_a, worker_b = EventBus(), EventBus()
+    stream = open_stream(app, worker_a, user_id)
+    assert next(stream).startswith('retry:')
+    ready = next(stream)
+    assert 'event: ready' in ready
+
+    with app.app_context():
+        worker_b.publish('test.rolled_back', {'n': 0}, user_id=user_id)
+        db.session.rollback()
+        worker_b.publish('test.first', {'n': 1}, user_id=user_id)
+        worker_b.publish('test.hidden', {'n': 2}, user_id=-1)
+        db.session.commit()
+
+    first = next(stream)
+    assert 'event: test.first' in first
+    event_id = first.split('\n')[0][len('id: '):]
+
+    with app.app_context():
+        worker_a.publish('test.second', {'n': 3}, user_id=user_id)
+        db.session.commit()
+
+    # 断线后连接到另一个进程，从 Last-Event-ID 之后续传，不发送 reset
+    resumed = open_stream(app, worker_b, user_id, last_event_id=event_id)
+    chunks = data_lines(islice(resumed, 2))
+    assert 'event: test.second' in chunks[0]
+    assert int(chunks[0].split('\n')[0][len('id: '):]) > int(event_id)
+
+def test_unknown_event_id_resets(app):
+    stream = open_stream(app, EventBus(), employee_id(app), last_event_id='abc-12')
+    next(stream)
+    assert 'event: reset' in next(stream)
+    assert 'event: ready' in next(stream)
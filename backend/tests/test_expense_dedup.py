@@ -0,0 +1,39 @@
+"""报销查重：周期性报销不误判，修改或删除重复报销单后清除另一方的标记"""
+
+def create(client, headers, **fields):
+    data = dict({'expense_type': 'transport', 'amount': '36.00', 'date': '2026-03-02',
+                 'description': '公司到机场 打车费用'}, **fields)
+    response = client.post('/api/expense/reports', json=data, headers=headers)
+    assert response.status_code == 201
+    return response.get_json()
+
+def flagged(client, headers, report_id):
+    return client.get('/api/expense/reports/%d' % report_id, headers=headers).get_json()['suspected_duplicate']
+
+def test_recurring_expense_not_flagged(client, headers):
+    create(client, headers['employee'], expense_type='other', amount='300.00', date='2026-01-05',
+           description='1月 办公室停车月卡')
+    later = create(client, headers['employee'], expense_type='other', amount='300.00', date='2026-02-05',
+                   description='2月 办公室停车月卡')
+    assert later['suspected_duplicate'] is False
+
+def test_update_clears_previous_duplicate(client, headers):
+    first = create(client, headers['employee'])
+    second = create(client, headers['employee'], description='公司到机场打车费')
+    assert second['suspected_duplicate'] is True
+    assert second['duplicate_candidates'][0]['report_id'] == first['report_id']
+    assert flagged(client, headers['employee'], first['report_id']) is True
+
+    response = client.put('/api/expense/reports/%d' % second['report_id'], json={'date': '2026-03-03'},
+                          headers=headers['employee'])
+    assert response.get_json()['suspected_duplicate'] is False
+    assert flagged(client, headers['employee'], first['report_id']) is False
+
+def test_delete_clears_previous_duplicate(client, headers):
+    first = create(client, headers['employee'], date='2026-03-09')
+    second = create(client, headers['employee'], date='2026-03-09')
+    assert flagged(client, headers['employee'], first['report_id']) is True
+
+    response = client.delete('/api/expense/reports/%d' % second['report_id'], headers=headers['employee'])
+    assert response.status_code == 200
+    assert flagged(client, headers['employee'], first['report_id']) is False
@@ -0,0 +1,69 @@
+"""Idempotency-Key：重试返回第一次的响应，不重复执行（记录在数据库中，各进程共享）"""
+from models import IdempotencyKey, LeaveRequest, db
+
+BODY = {'leave_type': 'personal', 'start_date': '2099-03-01', 'end_date': '2099-03-02', 'reason': '幂等测试'}
+
+def with_key(headers, key):
+    return dict(headers, **{'Idempotency-Key': key})
+
+def count_requests(app, reason):
+    with app.app_context():
+        return LeaveRequest.query.filter_by(reason=reason).count()
+
+def test_retry_replays_first_response(app, client, headers, capture):
+    body = dict(BODY, reason='幂等重试')
+    first = client.post('/api/leave/requests', json=body, headers=with_key(headers['employee'], 'retry-1'))
+    assert first.status_code == 201
+    with capture() as queries:
+        retry = client.post('/api/leave/requests', json=body, headers=with_key(headers['employee'], 'retry-1'))
+    assert retry.status_code == 201
+    assert retry.headers['Idempotent-Replayed'] == 'true'
+    assert retry.get_data() == first.get_data()
+    # 只查询幂等键，不执行处理函数
+    assert len(queries) == 1, '\n'.join(statement for statement, _ in queries)
+    assert count_requests(app, body['reason']) == 1
+
+def test_key_reused_for_different_request(client, headers):
+    client.post('/api/leave/requests', json=dict(BODY, start_date='2099-04-01', end_date='2099-04-01'),
+                headers=with_key(headers['employee'], 'reuse-1'))
+    response = client.post('/api/leave/requests', json=dict(BODY, start_date='2099-05-01', end_date='2099-05-01'),
+                           headers=with_key(headers['employee'], 'reuse-1'))
+    assert response.status_code == 422
+
+def test_keys_are_scoped_per_user(client, headers):
+    body = dict(BODY, start_date='2099-06-01', end_date='2099-06-01')
+    client.post('/api/leave/requests', json=body, headers=with_key(headers['employee'], 'shared-1'))
+    response = client.post('/api/leave/requests', json=body, headers=with_key(headers['admin'], 'shared-1'))
+    assert response.status_code == 201
+    assert 'Idempotent-Replayed' not in response.headers
+
+def test_request_in_progress_in_another_worker(app, client, headers):
+    body = dict(BODY, start_date='2099-07-01', end_date='2099-07-01', reason='处理中')
+    client.post('/api/leave/requests', json=body, headers=with_key(headers['employee'], 'progress-1'))
+    # 模拟另一个进程已提交数据、尚未保存响应
+    with app.app_context():
+        IdempotencyKey.query.filter_by(idempotency_key='progress-1').update({'status_code': None, 'body': None})
+        db.session.commit()
+    response = client.post('/api/leave/requests', json=body, headers=with_key(headers['employee'], 'progress-1'))
+    assert response.status_code == 409
+    assert count_requests(app, body['reason']) == 1
+
+def test_concurrent_duplicate_rolled_back_at_commit(app, client, headers, monkeypatch):
+    body = dict(BODY, start_date='2099-08-01', end_date='2099-08-01', reason='并发重复')
+    first = client.post('/api/leave/requests', json=body, headers=with_key(headers['employee'], 'race-1'))
+
+    # 模拟两个进程同时处理：本次请求开始时还查不到另一个进程的键，提交时违反唯一约束
+    from utils import idempotency
+    find = idempotency._find
+    lookups = []
+
+    def find_after_first_lookup(pending):
+        lookups.append(pending)
+        return None if len(lookups) == 1 else find(pending)
+
+    monkeypatch.setattr(idempotency, '_find', find_after_first_lookup)
+    retry = client.post('/api/leave/requests', json=body, headers=with_key(headers['employee'], 'race-1'))
+    assert retry.status_code == 201
+    assert retry.headers['Idempotent-Replayed'] == 'true'
+    assert retry.get_data() == first.get_data()
+    assert count_requests(app, body['reason']) == 1
@@ -0,0 +1,68 @@
+"""门店终端离线打卡批量同步"""
+from datetime import date, datetime, time
+import json
+import pytest
+
+from models import AttendanceRecord, User, db
+from utils.kiosk import sign_body
+
+@pytest.fixture
+def kiosk(client, headers):
+    response = client.post('/api/admin/kiosks', json={'name': '一号店前台'}, headers=headers['admin'])
+    assert response.status_code == 201
+    return response.get_json()
+
+@pytest.fixture(scope='module')
+def employee_ids(app):
+    # 其他测试使用第一名员工，这里使用最后 20 名
+    with app.app_context():
+        return [row[0] for row in db.session.query(User.id).filter(User.role == 'employee')
+                .order_by(User.id.desc()).limit(20)]
+
+def sync(client, kiosk, punches, signature=None):
+    body = json.dumps({'punches': punches}).encode('utf-8')
+    return client.post('/api/attendance/kiosk-sync', data=body, content_type='application/json', headers={
+        'X-Kiosk-Id': str(kiosk['id']),
+        'X-Kiosk-Signature': signature or sign_body(kiosk['secret'], body)
+    })
+
+def punches_for(user_ids, punch_type, at, first_sequence=1):
+    return [{'sequence': first_sequence + index, 'user_id': user_id, 'type': punch_type,
+             'timestamp': at.isoformat()} for index, user_id in enumerate(user_ids)]
+
+def test_batch_applied_once(app, client, kiosk, employee_ids, capture):
+    users = employee_ids[:10]
+    punches = punches_for(users, 'clock_in', datetime.combine(date.today(), time(0, 5)))
+    with capture() as queries:
+        response = sync(client, kiosk, punches)
+    assert response.status_code == 200
+    data = response.get_json()
+    assert data['counts'] == {'applied': 10, 'duplicate': 0, 'rejected': 0}
+    assert data['last_sequence'] == 10
+    # 语句数与批次大小无关：终端、设置、用户、考勤记录、批量写入、员工版本号
+    assert len(queries) <= 10, '\n'.join(statement for statement, _ in queries)
+
+    # 重传：全部按重复跳过
+    response = sync(client, kiosk, punches)
+    assert response.get_json()['counts'] == {'applied': 0, 'duplicate': 10, 'rejected': 0}
+    with app.app_context():
+        assert AttendanceRecord.query.filter(AttendanceRecord.user_id.in_(users),
+                                             AttendanceRecord.date == date.today()).count() == 10
+
+def test_rules_checked_per_punch(client, kiosk, employee_ids):
+    user_id = employee_ids[10]
+    punches = [(user_id, 'clock_out'), (user_id, 'clock_in'), (user_id, 'clock_in'), (999999, 'clock_in'),
+               (user_id, 'clock_out')]
+    response = sync(client, kiosk, [
+        {'sequence': sequence, 'user_id': punch_user, 'type': punch_type,
+         'timestamp': datetime.combine(date.today(), time(0, sequence)).isoformat()}
+        for sequence, (punch_user, punch_type) in enumerate(punches, 1)
+    ])
+    data = response.get_json()
+    # 未上班先下班、重复上班、用户不存在均被拒绝，序号仍计为已处理
+    assert [result['status'] for result in data['results']] == ['rejected', 'applied', 'rejected', 'rejected', 'applied']
+    assert data['last_sequence'] == 5
+
+def test_invalid_signature(client, kiosk, employee_ids):
+    response = sync(client, kiosk, punches_for(employee_ids[:1], 'clock_in', datetime.now()), signature='0' * 64)
+    assert response.status_code == 401
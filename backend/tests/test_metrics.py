@@ -0,0 +1,42 @@
+"""监控指标：多进程汇总后计数不回退，未设置令牌时不公开"""
+from utils.metrics import MetricsRegistry, MultiprocessMetrics, render_prometheus
+
+def total_requests(stats):
+    return sum(sum(endpoint_stats.statuses.values()) for endpoint_stats in stats.values())
+
+def test_totals_summed_across_workers_and_kept_after_exit(tmp_path, monkeypatch):
+    workers = {}
+    for pid in (101, 102):
+        registry = MetricsRegistry()
+        for _ in range(pid - 100):
+            registry.observe('leave.get_requests', 'GET', 200, 0.01, 3, 0.002, 512)
+        workers[pid] = MultiprocessMetrics(str(tmp_path), registry)
+        monkeypatch.setattr('utils.metrics.os.getpid', lambda pid=pid: pid)
+        workers[pid].flush()
+
+    monkeypatch.setattr('utils.metrics.os.getpid', lambda: 103)
+    scraper = MultiprocessMetrics(str(tmp_path), MetricsRegistry())
+    assert total_requests(scraper.collect()) == 3
+
+    # worker 101 退出后它的计数并入合计，不会回退
+    scraper.retire(101)
+    assert not any(path.name.startswith('101-') for path in tmp_path.iterdir())
+    stats = scraper.collect()
+    assert total_requests(stats) == 3
+    assert 'http_requests_total{endpoint="leave.get_requests",method="GET",status="200"} 3' in render_prometheus(stats)
+
+def test_token_required_unless_local_only(client, app, monkeypatch):
+    monkeypatch.setitem(app.config, 'METRICS_TOKEN', None)
+    monkeypatch.setitem(app.config, 'METRICS_LOCAL_ONLY', False)
+    assert client.get('/api/metrics').status_code == 403
+
+    monkeypatch.setitem(app.config, 'METRICS_LOCAL_ONLY', True)
+    assert client.get('/api/metrics').status_code == 200
+    assert client.get('/api/metrics', environ_base={'REMOTE_ADDR': '10.0.0.8'}).status_code == 403
+
+    monkeypatch.setitem(app.config, 'METRICS_TOKEN', 'secret')
+    monkeypatch.setitem(app.config, 'METRICS_LOCAL_ONLY', False)
+    assert client.get('/api/metrics', environ_base={'REMOTE_ADDR': '10.0.0.8'}).status_code == 401
+    response = client.get('/api/metrics', headers={'Authorization': 'Bearer secret'},
+                          environ_base={'REMOTE_ADDR': '10.0.0.8'})
+    assert response.status_code == 200
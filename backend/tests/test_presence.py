@@ -0,0 +1,58 @@
+"""在岗看板：各进程的索引都按事件日志更新，重建时重放读取期间提交的事件"""
+from datetime import date, datetime
+from models import User, db
+from utils.events import event_bus
+from utils.presence import PresenceIndex
+
+def employee_ids(app):
+    # 其他测试使用第一名和最后 20 名员工，这里从第 21 名开始
+    with app.app_context():
+        return [row.id for row in db.session.query(User.id).filter_by(role='employee').order_by(User.id)
+                .offset(20)]
+
+def publish(app, event_type, data, user_id):
+    with app.app_context():
+        event_bus.publish(event_type, data, user_id=user_id, managers=True)
+        db.session.commit()
+
+def status_of(app, index, user_id):
+    with app.app_context():
+        index.refresh()
+        people, _ = index.snapshot()
+        db.session.remove()
+    return next(person for person in people if person['user_id'] == user_id)
+
+def test_events_from_any_process_update_every_index(app):
+    user_id = employee_ids(app)[0]
+    worker_a, worker_b = PresenceIndex(), PresenceIndex()
+    assert status_of(app, worker_a, user_id)['clock_in_time'] is None
+    assert status_of(app, worker_b, user_id)['clock_in_time'] is None
+
+    today = date.today()
+    clock_in_time = datetime.combine(today, datetime.min.time()).replace(hour=0, minute=1)
+    publish(app, 'attendance.clock_in', {
+        'date': today.strftime('%Y-%m-%d'),
+        'clock_in_time': clock_in_time.strftime('%Y-%m-%d %H:%M:%S'),
+        'status': 'normal'
+    }, user_id)
+    publish(app, 'user.changed', {'id': user_id, 'username': 'renamed', 'real_name': '改名',
+                                  'department': '新门店', 'is_active': True}, user_id)
+
+    for index in (worker_a, worker_b):
+        person = status_of(app, index, user_id)
+        assert person['clock_in_time'] == clock_in_time.strftime('%Y-%m-%d %H:%M:%S')
+        assert (person['real_name'], person['department']) == ('改名', '新门店')
+        assert '新门店' in index.departments()
+
+def test_reconcile_replays_recent_events(app):
+    # 事件已提交但读取的数据中没有（读取期间提交）：重建后仍然反映该事件
+    user_id = employee_ids(app)[1]
+    today = date.today()
+    publish(app, 'schedule.changed', {
+        'id': 0, 'date': today.strftime('%Y-%m-%d'), 'shift_type': 'night',
+        'start_time': '00:00:00', 'end_time': '23:59:00', 'break_start': None, 'break_end': None
+    }, user_id)
+
+    index = PresenceIndex()
+    person = status_of(app, index, user_id)
+    assert person['shift_start'] == today.strftime('%Y-%m-%d') + ' 00:00:00'
@@ -0,0 +1,76 @@
+"""每个接口的 SQL 语句数上限，且语句数不随每页条数增加（防止 N+1 查询回归）"""
+import pytest
+
+# (路径, 角色, 首次请求允许的最多语句数)
+ENDPOINTS = [
+    ('/api/auth/profile', 'employee', 1),
+    ('/api/admin/users', 'admin', 3),
+    ('/api/admin/attendance/records', 'admin', 3),
+    ('/api/admin/attendance/statistics', 'admin', 2),
+    ('/api/admin/settings', 'admin', 2),
+    ('/api/attendance/today', 'employee', 2),
+    ('/api/attendance/history', 'employee', 2),
+    ('/api/attendance/statistics', 'employee', 1),
+    ('/api/attendance/presence', 'admin', 7),
+    ('/api/leave/requests', 'admin', 3),
+    ('/api/leave/requests', 'employee', 3),
+    ('/api/leave/requests?status=pending', 'admin', 3),
+    ('/api/leave/requests/1', 'admin', 3),
+    ('/api/leave/types', 'employee', 0),
+    ('/api/expense/reports', 'admin', 3),
+    ('/api/expense/reports', 'employee', 3),
+    ('/api/expense/reports?status=pending', 'admin', 3),
+    ('/api/expense/reports/1', 'admin', 4),
+    ('/api/expense/statistics', 'employee', 2),
+    ('/api/expense/types', 'employee', 0),
+    ('/api/diary/diaries', 'admin', 3),
+    ('/api/diary/diaries', 'employee', 3),
+    ('/api/diary/diaries/1', 'admin', 3),
+    ('/api/diary/today', 'employee', 2),
+    ('/api/diary/search?q=工作', 'admin', 4),
+    ('/api/diary/statistics', 'admin', 3),
+    ('/api/diary/compliance', 'admin', 2),
+    ('/api/outing/reports', 'admin', 3),
+    ('/api/outing/reports?status=pending', 'admin', 3),
+    ('/api/outing/reports/1', 'admin', 3),
+    ('/api/outing/current', 'employee', 3),
+    ('/api/outing/board', 'admin', 3),
+    ('/api/schedule/schedules', 'admin', 3),
+    ('/api/schedule/schedules/1', 'admin', 3),
+    ('/api/schedule/my-schedule', 'employee', 2),
+    ('/api/schedule/calendar', 'admin', 3),
+    ('/api/schedule/today', 'employee', 2),
+    ('/api/schedule/shift-types', 'employee', 0),
+]
+
+def with_page_size(path, per_page):
+    return '%s%sper_page=%d' % (path, '&' if '?' in path else '?', per_page)
+
+@pytest.mark.parametrize('path,role,budget', ENDPOINTS)
+def test_query_budget(client, headers, capture, path, role, budget):
+    with capture() as queries:
+        response = client.get(with_page_size(path, 50), headers=headers[role])
+    assert response.status_code == 200, response.get_data(as_text=True)
+    assert len(queries) <= budget, '\n'.join(statement for statement, _ in queries)
+
+@pytest.mark.parametrize('path,role,budget', ENDPOINTS)
+def test_query_count_independent_of_page_size(client, headers, capture, path, role, budget):
+    counts = []
+    for per_page in (5, 50):
+        # 先请求一次，排除缓存对语句数的影响
+        client.get(with_page_size(path, per_page), headers=headers[role])
+        with capture() as queries:
+            client.get(with_page_size(path, per_page), headers=headers[role])
+        counts.append(len(queries))
+    assert counts[0] == counts[1]
+
+def test_batch_shares_budget(client, headers, capture):
+    """批量接口的语句数不超过各子请求之和"""
+    body = {'requests': [{'id': index, 'method': 'GET', 'path': path, 'params': {'per_page': 50}}
+                         for index, path in enumerate(('/api/leave/requests', '/api/expense/reports',
+                                                       '/api/outing/reports'))]}
+    with capture() as queries:
+        response = client.post('/api/batch', json=body, headers=headers['admin'])
+    assert response.status_code == 200
+    assert all(item['status'] == 200 for item in response.get_json()['responses'])
+    assert len(queries) <= 3 * 3
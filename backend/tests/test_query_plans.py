@@ -0,0 +1,51 @@
+"""关键查询的执行计划必须使用索引，不能对大表做全表扫描"""
+from datetime import date, timedelta
+import pytest
+import re
+
+from utils.slow_queries import explain_statement
+from utils.today_cache import today_cache
+
+# 上个月（其他测试请求的是本月，避免命中接口缓存）
+MONTH = (date.today().replace(day=1) - timedelta(days=1)).strftime('%Y-%m')
+
+# (路径, 角色, 不允许全表扫描的表)
+KEY_QUERIES = [
+    # 按 (user_id, date) 查询考勤记录
+    ('/api/attendance/today', 'employee', 'attendance_record'),
+    ('/api/attendance/history', 'employee', 'attendance_record'),
+    # 按月统计
+    ('/api/attendance/statistics?month=%s' % MONTH, 'employee', 'attendance_record'),
+    ('/api/admin/attendance/statistics?month=%s' % MONTH, 'admin', 'attendance_record'),
+    ('/api/admin/attendance/records?start_date=%s-01' % MONTH, 'admin', 'attendance_record'),
+    ('/api/diary/statistics?month=%s' % MONTH, 'employee', 'work_diary'),
+    ('/api/expense/statistics?month=%s' % MONTH, 'employee', 'expense_report'),
+    ('/api/schedule/calendar?month=%s' % MONTH, 'admin', 'schedule'),
+    # 按状态查询待审批列表
+    ('/api/leave/requests?status=pending', 'admin', 'leave_request'),
+    ('/api/expense/reports?status=pending', 'admin', 'expense_report'),
+    ('/api/outing/reports?status=pending', 'admin', 'outing_report'),
+    # 员工查看自己的列表
+    ('/api/leave/requests', 'employee', 'leave_request'),
+    ('/api/expense/reports', 'employee', 'expense_report'),
+    ('/api/outing/reports', 'employee', 'outing_report'),
+]
+
+def full_scans(plan, table):
+    """SQLite 执行计划中对 table 的全表扫描（SCAN table，未使用索引）"""
+    pattern = re.compile(r'^SCAN %s\b(?!.*\bUSING\b)' % re.escape(table))
+    return [line for line in plan if pattern.search(line)]
+
+@pytest.mark.parametrize('path,role,table', KEY_QUERIES)
+def test_key_queries_use_indexes(client, headers, capture, engine, path, role, table):
+    today_cache.clear()
+    with capture() as queries:
+        response = client.get(path, headers=headers[role])
+    assert response.status_code == 200, response.get_data(as_text=True)
+
+    statements = [(statement, parameters) for statement, parameters in queries
+                  if re.search(r'\bFROM %s\b' % table, statement)]
+    assert statements, '没有查询 %s 表' % table
+    for statement, parameters in statements:
+        plan = explain_statement(engine, statement, parameters)
+        assert not full_scans(plan, table), '%s\n%s' % (statement, '\n'.join(plan))
@@ -0,0 +1,45 @@
+"""报销凭证上传：流式写入、按内容去重，请求体格式错误返回 400"""
+from models import Receipt
+
+BOUNDARY = 'receipt-boundary'
+
+def multipart_body(content, content_type='image/png', filename='receipt.png'):
+    return (
+        '--%s\r\nContent-Disposition: form-data; name="file"; filename="%s"\r\nContent-Type: %s\r\n\r\n'
+        % (BOUNDARY, filename, content_type)
+    ).encode('utf-8') + content + ('\r\n--%s--\r\n' % BOUNDARY).encode('utf-8')
+
+def upload(client, headers, body, extra_headers=None):
+    return client.post('/api/expense/receipts', data=body, content_type='multipart/form-data; boundary=%s' % BOUNDARY,
+                       headers=dict(headers, **(extra_headers or {})))
+
+def test_same_content_stored_once(app, client, headers):
+    content = b'receipt-dedup' * 100
+    first = upload(client, headers['employee'], multipart_body(content))
+    assert first.status_code == 201
+    second = upload(client, headers['admin'], multipart_body(content, filename='copy.png'))
+    assert second.status_code == 201
+    assert second.get_json()['receipt_hash'] == first.get_json()['receipt_hash']
+    assert first.get_json()['size'] == len(content)
+    with app.app_context():
+        assert Receipt.query.filter_by(sha256=first.get_json()['receipt_hash']).count() == 1
+
+    response = client.get(first.get_json()['url'], headers=headers['employee'])
+    assert response.status_code == 200
+    assert response.get_data() == content
+
+def test_malformed_body_rejected(client, headers):
+    body = multipart_body(b'truncated' * 100)
+    assert upload(client, headers['employee'], body[:-20]).status_code == 400
+    assert upload(client, headers['employee'], b'--%s\r\nnonsense\r\n\r\n' % BOUNDARY.encode()).status_code == 400
+    assert upload(client, headers['employee'], multipart_body(b'MZ', 'application/x-msdownload')).status_code == 400
+
+def test_upload_with_idempotency_key(client, headers):
+    # 幂等指纹不读取 multipart 请求体，上传仍按流式解析
+    body = multipart_body(b'receipt-idempotent' * 100)
+    first = upload(client, headers['employee'], body, {'Idempotency-Key': 'receipt-upload-1'})
+    assert first.status_code == 201
+    retry = upload(client, headers['employee'], body, {'Idempotency-Key': 'receipt-upload-1'})
+    assert retry.status_code == 201
+    assert retry.headers['Idempotent-Replayed'] == 'true'
+    assert retry.get_data() == first.get_data()
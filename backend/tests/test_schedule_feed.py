@@ -0,0 +1,27 @@
+"""排班日历订阅：订阅令牌可重置，旧令牌随之失效"""
+from models import User
+from routes.schedule import feed_serializer
+
+def feed_path(token):
+    return '/api/schedule/feed/%s.ics' % token
+
+def test_reset_revokes_previous_token(client, headers):
+    token = client.get('/api/schedule/feed-token', headers=headers['employee']).get_json()['token']
+    assert client.get(feed_path(token)).status_code == 200
+
+    reset = client.post('/api/schedule/feed-token/reset', headers=headers['employee'])
+    assert reset.status_code == 200
+    new_token = reset.get_json()['token']
+    assert new_token != token
+    assert client.get(feed_path(token)).status_code == 404
+    assert client.get(feed_path(new_token)).status_code == 200
+
+def test_tampered_token_rejected(client):
+    assert client.get(feed_path('not-a-token')).status_code == 404
+
+def test_legacy_token_valid_until_reset(app, client, headers):
+    with app.app_context():
+        legacy = feed_serializer().dumps(User.query.filter_by(role='admin').first().id)
+    assert client.get(feed_path(legacy)).status_code == 200
+    client.post('/api/schedule/feed-token/reset', headers=headers['admin'])
+    assert client.get(feed_path(legacy)).status_code == 404
@@ -0,0 +1,37 @@
+"""首页"今天"缓存：按用户数据版本号校验，其他进程的写入（不经过本进程的接口）也会使缓存失效"""
+from flask_jwt_extended import create_access_token
+from datetime import date, datetime, timedelta
+from models import OutingReport, User, WorkDiary, db
+
+def auth(app, username):
+    with app.app_context():
+        user_id = User.query.filter_by(username=username).first().id
+        return user_id, {'Authorization': 'Bearer %s' % create_access_token(identity=user_id)}
+
+def test_write_from_another_process_invalidates_cache(app, client):
+    user_id, headers = auth(app, 'user40')
+    assert client.get('/api/diary/today', headers=headers).get_json() == {'diary': None}
+    first = client.get('/api/diary/today', headers=headers)
+    assert first.get_json() == {'diary': None}
+
+    # 直接写数据库，模拟另一个进程中的写入
+    with app.app_context():
+        db.session.add(WorkDiary(user_id=user_id, date=date.today(), content='其他进程写入的日报'))
+        db.session.commit()
+
+    response = client.get('/api/diary/today', headers={**headers, 'If-None-Match': first.headers['ETag']})
+    assert response.status_code == 200
+    assert response.get_json()['diary']['content'] == '其他进程写入的日报'
+
+def test_current_outing_uses_local_time(app, client):
+    user_id, headers = auth(app, 'user41')
+    now = datetime.now()
+    with app.app_context():
+        db.session.add(OutingReport(
+            user_id=user_id, destination='客户现场', purpose='拜访', start_time=now - timedelta(minutes=1),
+            expected_return_time=now + timedelta(hours=2), status='approved'
+        ))
+        db.session.commit()
+
+    outing = client.get('/api/outing/current', headers=headers).get_json()['outing']
+    assert outing['destination'] == '客户现场'
@@ -0,0 +1 @@
+# 工具模块初始化文件
\ No newline at end of file
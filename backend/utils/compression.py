@@ -0,0 +1,185 @@
+from flask import request
+from collections import OrderedDict
+from threading import Lock
+import zlib
+
+try:
+    import brotli
+except ImportError:  # 未安装 Brotli 时只支持 gzip
+    brotli = None
+
+# 可压缩的响应类型（text/* 除事件流外均可压缩）
+COMPRESSIBLE_MIMETYPES = {
+    'application/json',
+    'application/javascript',
+    'application/xml',
+    'image/svg+xml'
+}
+UNCOMPRESSIBLE_MIMETYPES = {'text/event-stream'}
+
+DEFAULT_MIN_SIZE = 1024
+DEFAULT_GZIP_LEVEL = 6
+DEFAULT_BROTLI_QUALITY = 4
+DEFAULT_CACHE_BYTES = 16 * 1024 * 1024
+
+def available_encodings():
+    return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+def negotiate_encoding(accept_encodings):
+    """按 Accept-Encoding 选择压缩编码，质量相同时优先 br；不接受压缩时返回 None"""
+    best, best_quality = None, 0
+    for encoding in available_encodings():
+        quality = accept_encodings.quality(encoding)
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+def is_compressible(response):
+    mimetype = response.mimetype or ''
+    if mimetype in UNCOMPRESSIBLE_MIMETYPES:
+        return False
+    return mimetype.startswith('text/') or mimetype in COMPRESSIBLE_MIMETYPES
+
+class Compressor:
+    """增量压缩器，统一 gzip 和 brotli 的接口"""
+
+    def __init__(self, encoding, gzip_level, brotli_quality):
+        if encoding == 'br':
+            compressor = brotli.Compressor(quality=brotli_quality)
+            self.compress = compressor.process
+            self.finish = compressor.finish
+        else:
+            compressor = zlib.compressobj(gzip_level, zlib.DEFLATED, 31)
+            self.compress = compressor.compress
+            self.finish = compressor.flush
+
+def compress_bytes(data, encoding, gzip_level, brotli_quality):
+    compressor = Compressor(encoding, gzip_level, brotli_quality)
+    return compressor.compress(data) + compressor.finish()
+
+class CompressedCache:
+    """带 ETag 响应的压缩结果缓存，按 (路径, ETag, 编码) 保存，总大小超过上限时淘汰最久未用的"""
+
+    def __init__(self, max_bytes=DEFAULT_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = Lock()
+
+    def get(self, key):
+        with self._lock:
+            data = self._entries.get(key)
+            if data is not None:
+                self._entries.move_to_end(key)
+            return data
+
+    def set(self, key, data):
+        if len(data) > self.max_bytes // 8:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._size -= len(old)
+            self._entries[key] = data
+            self._size += len(data)
+            while self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+compressed_cache = CompressedCache()
+
+def _compress_stream(chunks, compressor, cache_key):
+    """流式压缩：按压缩器缓冲输出，不整体读入内存；完整输出后写入缓存"""
+    compressed = [] if cache_key else None
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode('utf-8')
+            data = compressor.compress(chunk)
+            if data:
+                if compressed is not None:
+                    compressed.append(data)
+                yield data
+        data = compressor.finish()
+        if compressed is not None:
+            compressed.append(data)
+            compressed_cache.set(cache_key, b''.join(compressed))
+        yield data
+    finally:
+        if hasattr(chunks, 'close'):
+            chunks.close()
+
+def weaken_etag(response):
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+
+def compress_response(response, config):
+    """按请求的 Accept-Encoding 压缩响应
+
+    只压缩成功的文本/JSON 响应，小于 COMPRESS_MIN_SIZE 的不压缩；流式响应边生成边压缩。
+    带 ETag 的响应按 ETag 缓存压缩结果，同一数据版本只压缩一次。压缩后的字节与原响应不同，
+    ETag 改为弱 ETag（W/），各接口按弱比较校验 If-None-Match。
+    """
+    if not is_compressible(response):
+        return response
+    response.vary.add('Accept-Encoding')
+
+    if response.status_code == 304:
+        # 与客户端缓存的压缩响应使用相同的弱 ETag
+        if negotiate_encoding(request.accept_encodings) is not None:
+            weaken_etag(response)
+        return response
+
+    if (response.status_code < 200 or response.status_code >= 300 or response.status_code == 204
+            or response.direct_passthrough or 'Content-Encoding' in response.headers):
+        return response
+
+    encoding = negotiate_encoding(request.accept_encodings)
+    if encoding is None:
+        return response
+
+    gzip_level = config.get('COMPRESS_GZIP_LEVEL', DEFAULT_GZIP_LEVEL)
+    brotli_quality = config.get('COMPRESS_BROTLI_QUALITY', DEFAULT_BROTLI_QUALITY)
+    etag, _ = response.get_etag()
+    cache_key = (request.full_path, etag, encoding) if etag else None
+    cached = compressed_cache.get(cache_key) if cache_key else None
+
+    if response.is_streamed:
+        if cached is not None:
+            if hasattr(response.response, 'close'):
+                response.response.close()
+            response.set_data(cached)
+        else:
+            compressor = Compressor(encoding, gzip_level, brotli_quality)
+            response.response = _compress_stream(response.response, compressor, cache_key)
+            response.headers.pop('Content-Length', None)
+    else:
+        if cached is None:
+            data = response.get_data()
+            if len(data) < config.get('COMPRESS_MIN_SIZE', DEFAULT_MIN_SIZE):
+                return response
+            cached = compress_bytes(data, encoding, gzip_level, brotli_quality)
+            if cache_key:
+                compressed_cache.set(cache_key, cached)
+        response.set_data(cached)
+
+    response.headers['Content-Encoding'] = encoding
+    weaken_etag(response)
+    return response
+
+def install_compression(app):
+    """注册响应压缩（COMPRESS_ENABLED 为 False 时不启用）"""
+    if not app.config.get('COMPRESS_ENABLED', True):
+        return
+
+    compressed_cache.max_bytes = app.config.get('COMPRESS_CACHE_BYTES', DEFAULT_CACHE_BYTES)
+
+    @app.after_request
+    def compress(response):
+        return compress_response(response, app.config)
@@ -0,0 +1,15 @@
+from datetime import date
+import time
+
+def month_range(year, month_num):
+    """返回月份的日期范围 [当月第一天, 下月第一天)"""
+    month_start = date(year, month_num, 1)
+    if month_num == 12:
+        month_end = date(year + 1, 1, 1)
+    else:
+        month_end = date(year, month_num + 1, 1)
+    return month_start, month_end
+
+def utc_offset_seconds():
+    """服务器本地时区当前与 UTC 的偏移（秒）；created_at 等时间戳按 UTC 保存"""
+    return time.localtime().tm_gmtoff
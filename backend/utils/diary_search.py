@@ -0,0 +1,276 @@
+from sqlalchemy import event, inspect, select, text
+from sqlalchemy.orm import Session
+from markupsafe import escape
+from models import WorkDiary, User, db
+import re
+
+SEARCH_FIELDS = ['content', 'achievements', 'issues', 'next_plan']
+
+MAX_TERMS = 8
+SNIPPET_RADIUS = 30
+
+# 片段高亮标记，转义后再替换为 <mark>
+_MARK_START = '\x02'
+_MARK_END = '\x03'
+
+# 二元组分词：文本按连续的字母、数字（含汉字）切分成段，每段取相邻两个字符组成的词，
+# 只有一个字符的段保留原字符。两个字以上的搜索词都能用全文索引匹配并按相关度排序，
+# 包含单个字符段的搜索词（如单个汉字）回退到 LIKE。
+# SQLite 的 FTS5 没有内置二元组分词器，由应用在 flush 时分词后写入索引，FTS5 再按空白拆分
+# （不用触发器调用 Python 注册的 SQL 函数，sqlite3 命令行、迁移等其他连接写入日报表时不会失败，
+# 但这些写入不会更新索引，需要执行 flask rebuild-diary-index 重建）；
+# MySQL 使用 ngram 解析器（ngram_token_size=2，默认值）。
+BIGRAM_FUNCTION = 'bigram_segment'  # 迁移 0011 创建的触发器使用，由迁移 0016 删除
+_WORD_RUN = re.compile(r'[^\W_]+')
+
+SQLITE_SEARCH_DDL = [
+    # 无内容（contentless）表：只保存分词后的索引，片段在 Python 中从原文截取
+    "CREATE VIRTUAL TABLE IF NOT EXISTS work_diary_fts USING fts5("
+    "content, achievements, issues, next_plan, content='', tokenize='unicode61')"
+]
+
+_FTS_INSERT = text(
+    "INSERT INTO work_diary_fts(rowid, content, achievements, issues, next_plan) "
+    "VALUES (:id, :content, :achievements, :issues, :next_plan)"
+)
+# 无内容表删除索引时需要提供写入时的分词结果
+_FTS_DELETE = text(
+    "INSERT INTO work_diary_fts(work_diary_fts, rowid, content, achievements, issues, next_plan) "
+    "VALUES ('delete', :id, :content, :achievements, :issues, :next_plan)"
+)
+
+MYSQL_SEARCH_DDL = [
+    "CREATE FULLTEXT INDEX ft_work_diary ON work_diary "
+    "(content, achievements, issues, next_plan) WITH PARSER ngram"
+]
+
+def bigram_tokens(value):
+    """文本的二元组分词结果（小写）"""
+    tokens = []
+    for run in _WORD_RUN.findall(value.lower()):
+        if len(run) == 1:
+            tokens.append(run)
+        else:
+            tokens.extend(run[index:index + 2] for index in range(len(run) - 1))
+    return tokens
+
+def bigram_segment(value):
+    """写入索引的分词结果，以空格连接"""
+    if value is None:
+        return None
+    return ' '.join(bigram_tokens(str(value)))
+
+def _segmented(diary_id, values):
+    segmented = {field: bigram_segment(values[field]) for field in SEARCH_FIELDS}
+    segmented['id'] = diary_id
+    return segmented
+
+def _search_fields_changed(obj):
+    state = inspect(obj)
+    return any(state.attrs[field].history.has_changes() for field in SEARCH_FIELDS)
+
+@event.listens_for(Session, 'before_flush')
+def _load_indexed_values(session, flush_context, instances):
+    """flush 前读取将被修改或删除的日报当前保存的内容，用于删除旧的索引"""
+    ids = [obj.id for obj in session.deleted if isinstance(obj, WorkDiary)]
+    ids += [obj.id for obj in session.dirty
+            if isinstance(obj, WorkDiary) and obj.id is not None and _search_fields_changed(obj)]
+    if not ids:
+        return
+    connection = session.connection(bind_arguments={'mapper': WorkDiary})
+    if connection.dialect.name != 'sqlite':
+        return
+    table = WorkDiary.__table__
+    rows = connection.execute(
+        select(table.c.id, *[table.c[field] for field in SEARCH_FIELDS]).where(table.c.id.in_(ids))
+    ).mappings()
+    session.info.setdefault('diary_search_old', {}).update((row['id'], dict(row)) for row in rows)
+
+@event.listens_for(Session, 'after_flush')
+def _update_search_index(session, flush_context):
+    """在同一事务内更新 SQLite 全文索引：删除旧内容的索引，写入新内容的索引"""
+    old = session.info.pop('diary_search_old', {})
+    changed = [obj for obj in session.new if isinstance(obj, WorkDiary)]
+    changed += [obj for obj in session.dirty if isinstance(obj, WorkDiary) and obj.id in old]
+    if not old and not changed:
+        return
+    connection = session.connection(bind_arguments={'mapper': WorkDiary})
+    if connection.dialect.name != 'sqlite':
+        return
+    if old:
+        connection.execute(_FTS_DELETE, [_segmented(diary_id, values) for diary_id, values in old.items()])
+    if changed:
+        connection.execute(_FTS_INSERT, [
+            _segmented(obj.id, {field: getattr(obj, field) for field in SEARCH_FIELDS}) for obj in changed
+        ])
+
+def rebuild_search_index(connection, batch_size=1000):
+    """按日报表全量重建 SQLite 全文索引（批量 insert 等不经过 ORM 的写入后需要调用）"""
+    if connection.dialect.name != 'sqlite':
+        return 0
+    table = WorkDiary.__table__
+    connection.execute(text("INSERT INTO work_diary_fts(work_diary_fts) VALUES ('delete-all')"))
+    result = connection.execution_options(yield_per=batch_size).execute(
+        select(table.c.id, *[table.c[field] for field in SEARCH_FIELDS])
+    ).mappings()
+    count = 0
+    for rows in result.partitions():
+        connection.execute(_FTS_INSERT, [_segmented(row['id'], row) for row in rows])
+        count += len(rows)
+    return count
+
+def is_indexable(term):
+    """搜索词能否用二元组索引匹配：每一段都至少有两个字符"""
+    runs = _WORD_RUN.findall(term)
+    return bool(runs) and all(len(run) >= 2 for run in runs)
+
+@event.listens_for(WorkDiary.__table__, 'after_create')
+def create_search_index(target, connection, **kw):
+    """db.create_all() 创建日报表后同步创建全文索引"""
+    dialect = connection.dialect.name
+    if dialect == 'sqlite':
+        statements = SQLITE_SEARCH_DDL
+    elif dialect == 'mysql':
+        statements = MYSQL_SEARCH_DDL
+    else:
+        return
+    for statement in statements:
+        connection.execute(text(statement))
+
+def include_schema_object(obj, name, type_, reflected, compare_to):
+    """迁移自动生成时忽略由 DDL 创建的全文索引（FTS5 虚拟表及其影子表、MySQL 全文索引）"""
+    if reflected and compare_to is None:
+        if type_ == 'table' and name.startswith('work_diary_fts'):
+            return False
+        if type_ == 'index' and name == 'ft_work_diary':
+            return False
+    return True
+
+def parse_terms(query_text):
+    """拆分搜索词（空白分隔，去重，最多 MAX_TERMS 个）"""
+    terms = []
+    for term in (query_text or '').split():
+        term = term.strip('"')
+        if term and term not in terms:
+            terms.append(term)
+    return terms[:MAX_TERMS]
+
+def _quote_fts(term):
+    return '"%s"' % term.replace('"', '""')
+
+def _bigram_phrase(term):
+    """搜索词对应的 FTS5 短语：分词结果必须依次相邻"""
+    return _quote_fts(' '.join(bigram_tokens(term)))
+
+def _highlight(value):
+    """转义文本并把高亮标记替换为 <mark>"""
+    return str(escape(value)).replace(_MARK_START, '<mark>').replace(_MARK_END, '</mark>')
+
+def build_snippet(value, terms):
+    """在 Python 中截取首个命中位置附近的片段并高亮全部搜索词"""
+    if not value:
+        return None
+    pattern = re.compile('|'.join(re.escape(term) for term in sorted(terms, key=len, reverse=True)), re.IGNORECASE)
+    match = pattern.search(value)
+    if not match:
+        return None
+
+    start = max(match.start() - SNIPPET_RADIUS, 0)
+    end = min(match.end() + SNIPPET_RADIUS, len(value))
+    fragment = pattern.sub(lambda m: _MARK_START + m.group(0) + _MARK_END, value[start:end])
+    prefix = '…' if start > 0 else ''
+    suffix = '…' if end < len(value) else ''
+    return prefix + _highlight(fragment) + suffix
+
+def search_work_diaries(query_text, user_id=None, start_date=None, end_date=None, page=1, per_page=20,
+                        with_user_names=False):
+    """搜索工作日报，按相关度排序分页，返回 (结果列表, 总数)
+
+    user_id 为空时搜索全部日报（管理员），否则只搜索该用户的日报。
+    """
+    terms = parse_terms(query_text)
+    if not terms:
+        return [], 0
+
+    dialect = db.session.get_bind().dialect.name
+    fts_terms = [term for term in terms if is_indexable(term)]
+    like_terms = [term for term in terms if not is_indexable(term)]
+
+    params = {}
+    conditions = []
+    if user_id is not None:
+        conditions.append('d.user_id = :user_id')
+        params['user_id'] = user_id
+    if start_date:
+        conditions.append('d.date >= :start_date')
+        params['start_date'] = start_date
+    if end_date:
+        conditions.append('d.date <= :end_date')
+        params['end_date'] = end_date
+
+    for index, term in enumerate(like_terms):
+        name = 'like_%d' % index
+        params[name] = '%' + term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+        conditions.append('(' + ' OR '.join(
+            "d.%s LIKE :%s ESCAPE '\\'" % (field, name) for field in SEARCH_FIELDS
+        ) + ')')
+
+    columns = ', '.join('d.%s' % field for field in SEARCH_FIELDS)
+    if fts_terms and dialect == 'sqlite':
+        params['match'] = ' AND '.join(_bigram_phrase(term) for term in fts_terms)
+        source = 'work_diary_fts JOIN work_diary d ON d.id = work_diary_fts.rowid'
+        conditions.insert(0, 'work_diary_fts MATCH :match')
+        rank = 'bm25(work_diary_fts)'
+        order = 'rank, d.date DESC'
+    elif fts_terms:
+        params['match'] = ' '.join('+' + _quote_fts(term) for term in fts_terms)
+        source = 'work_diary d'
+        conditions.insert(0, 'MATCH (d.content, d.achievements, d.issues, d.next_plan) AGAINST (:match IN BOOLEAN MODE)')
+        rank = '-MATCH (d.content, d.achievements, d.issues, d.next_plan) AGAINST (:match IN BOOLEAN MODE)'
+        order = 'rank, d.date DESC'
+    else:
+        source = 'work_diary d'
+        rank = '0'
+        order = 'd.date DESC, d.id DESC'
+
+    where = ' AND '.join(conditions) if conditions else '1 = 1'
+    total = db.session.execute(
+        text('SELECT COUNT(*) FROM %s WHERE %s' % (source, where)), params
+    ).scalar()
+
+    params['limit'] = per_page
+    params['offset'] = (page - 1) * per_page
+    rows = db.session.execute(text(
+        'SELECT d.id, d.user_id, d.date, %s AS rank, %s FROM %s WHERE %s '
+        'ORDER BY %s LIMIT :limit OFFSET :offset' % (rank, columns, source, where, order)
+    ), params).mappings().all()
+
+    usernames = {}
+    if with_user_names and rows:
+        usernames = {
+            row.id: (row.username, row.real_name)
+            for row in db.session.query(User.id, User.username, User.real_name).filter(
+                User.id.in_({row['user_id'] for row in rows})
+            )
+        }
+
+    results = []
+    for row in rows:
+        snippets = {}
+        for field in SEARCH_FIELDS:
+            snippet = build_snippet(row[field], terms)
+            if snippet:
+                snippets[field] = snippet
+
+        result = {
+            'id': row['id'],
+            'user_id': row['user_id'],
+            'date': str(row['date']),
+            'score': round(-(row['rank'] or 0), 6),
+            'snippets': snippets
+        }
+        username, real_name = usernames.get(row['user_id'], (None, None))
+        result.update({'username': username, 'real_name': real_name})
+        results.append(result)
+
+    return results, total
@@ -0,0 +1,287 @@
+from sqlalchemy import event, func, insert, select
+from sqlalchemy.orm import Session
+from collections import deque
+from datetime import datetime, timedelta
+from threading import Condition
+import json
+import time
+
+from models import EventLog, db
+from utils.scheduler import add_interval_job
+from utils.sqlite_profile import read_transaction
+
+DEFAULT_BUFFER_SIZE = 1000
+DEFAULT_POLL_INTERVAL = 1          # 秒
+DEFAULT_GAP_GRACE = 5              # 秒
+DEFAULT_RETENTION = 24 * 3600      # 秒
+PURGE_INTERVAL = 3600
+MANAGER_ROLES = ('admin', 'manager')
+
+# 会话中发布过事件的标记，事务提交后通知本进程的订阅者立即查询
+PUBLISHED_KEY = 'events_published'
+
+class Event:
+    __slots__ = ('id', 'event_type', 'data', 'user_id', 'managers', 'created_at')
+
+    def __init__(self, id, event_type, data, user_id, managers, created_at=None):
+        self.id = id
+        self.event_type = event_type
+        self.data = data
+        self.user_id = user_id
+        self.managers = managers
+        self.created_at = created_at
+
+    @classmethod
+    def from_row(cls, row):
+        return cls(row.id, row.event_type, json.loads(row.data), row.user_id, bool(row.managers), row.created_at)
+
+    def visible_to(self, user_id, role):
+        """事件只推送给相关员工本人，以及（管理范围事件）管理员和经理"""
+        return self.user_id == user_id or (self.managers and role in MANAGER_ROLES)
+
+def _event_query():
+    return select(EventLog.id, EventLog.event_type, EventLog.data, EventLog.user_id, EventLog.managers,
+                  EventLog.created_at)
+
+def read_events(connection, after_id, limit, gap_grace=DEFAULT_GAP_GRACE):
+    """按 ID 顺序读取 after_id 之后的事件，返回 (事件列表, 已读取到的 ID)
+
+    MySQL 等数据库的自增 ID 按插入顺序分配、事务却可能后提交，ID 出现空缺时先不越过，
+    空缺之后的事件写入超过 gap_grace 秒仍未补齐（事务已回滚）才跳过。
+    """
+    rows = connection.execute(
+        _event_query().where(EventLog.id > after_id).order_by(EventLog.id).limit(limit)
+    ).all()
+    now = datetime.utcnow()
+    events = []
+    for row in rows:
+        if row.id != after_id + 1 and row.created_at and (now - row.created_at).total_seconds() < gap_grace:
+            break
+        events.append(Event.from_row(row))
+        after_id = row.id
+    return events, after_id
+
+class EventBus:
+    """事件总线：事件写入共享的事件日志表，各进程轮询新事件后推送给本进程的订阅者
+
+    发布的事件与业务数据在同一事务中写入，提交后才对各进程可见，回滚时一并撤销。
+    事件 ID 即事件日志的自增主键，所有进程一致，客户端断线后连接到任意进程都可以续传。
+    进程内缓冲最近 buffer_size 个事件，同一时刻只有一个订阅者查询事件日志，其余等待通知。
+    """
+
+    def __init__(self, buffer_size=DEFAULT_BUFFER_SIZE, gap_grace=DEFAULT_GAP_GRACE):
+        self._condition = Condition()
+        self._events = deque(maxlen=buffer_size)
+        self.gap_grace = gap_grace
+        self._last_id = None        # 已读取的最大事件 ID，首次查询时取事件日志当前的最大 ID
+        self._floor = None          # 缓冲中是 ID 在 (floor, last_id] 范围内的全部事件
+        self._refreshing = False
+        self._refreshed_at = 0.0
+        self._wake = False
+
+    def publish(self, event_type, data, user_id=None, managers=False):
+        """在当前事务中发布事件（随事务一起提交）"""
+        self.publish_many([(event_type, data, user_id, managers)])
+
+    def publish_many(self, events):
+        """在当前事务中发布多个事件：[(事件类型, 数据, 相关员工, 是否推送给管理员)]，一条语句写入"""
+        now = datetime.utcnow()
+        rows = [{
+            'event_type': event_type,
+            'data': json.dumps(data, ensure_ascii=False, separators=(',', ':')),
+            'user_id': user_id,
+            'managers': managers,
+            'created_at': now
+        } for event_type, data, user_id, managers in events]
+        if rows:
+            db.session.execute(insert(EventLog), rows)
+            db.session.info[PUBLISHED_KEY] = True
+
+    def wake(self):
+        """本进程提交了新事件：等待中的订阅者立即查询，不等到下一个轮询周期"""
+        with self._condition:
+            self._wake = True
+            self._condition.notify_all()
+
+    def event_id(self, event):
+        return str(event.id)
+
+    def parse_event_id(self, value):
+        """解析 Last-Event-ID，格式错误时返回 None"""
+        value = (value or '').strip()
+        return int(value) if value.isdigit() else None
+
+    def current_id(self):
+        """本进程已读取的最大事件 ID（需要在应用上下文中调用）"""
+        while True:
+            with self._condition:
+                if self._last_id is not None:
+                    return self._last_id
+                if self._refreshing:
+                    self._condition.wait()
+                    continue
+                self._refreshing = True
+            self._refresh()
+
+    def floor(self):
+        with self._condition:
+            return self._floor
+
+    def _refresh(self):
+        """查询事件日志中的新事件并通知订阅者（调用方已设置 _refreshing，同一时刻只有一个查询）"""
+        start_id = last_id = self._last_id
+        try:
+            with read_transaction(), db.engine.connect() as connection:
+                if last_id is None:
+                    last_id = connection.execute(select(func.coalesce(func.max(EventLog.id), 0))).scalar()
+                    events = []
+                else:
+                    events, last_id = read_events(connection, last_id, self._events.maxlen, self.gap_grace)
+        except Exception:
+            with self._condition:
+                self._refreshing = False
+                self._refreshed_at = time.monotonic()
+                self._condition.notify_all()
+            raise
+
+        with self._condition:
+            if start_id is None:
+                self._floor = last_id
+            for item in events:
+                if len(self._events) == self._events.maxlen:
+                    self._floor = self._events[0].id
+                self._events.append(item)
+            self._last_id = last_id
+            self._refreshing = False
+            self._refreshed_at = time.monotonic()
+            self._condition.notify_all()
+
+    def wait_for_events(self, after_id, timeout, poll_interval=DEFAULT_POLL_INTERVAL):
+        """返回 (ID 大于 after_id 的事件, 是否有事件已不在缓冲中)，没有新事件时最多等待 timeout 秒
+
+        需要在应用上下文中调用。每隔 poll_interval 秒（本进程提交事件后立即）由其中一个订阅者查询事件日志。
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            with self._condition:
+                if self._last_id is not None:
+                    if after_id < self._floor:
+                        return [], True
+                    if self._last_id > after_id:
+                        return [event for event in self._events if event.id > after_id], False
+                now = time.monotonic()
+                if now >= deadline:
+                    return [], False
+                poll_at = self._refreshed_at + poll_interval
+                if self._refreshing:
+                    self._condition.wait(deadline - now)
+                    continue
+                if now < poll_at and not self._wake:
+                    self._condition.wait(min(deadline, poll_at) - now)
+                    continue
+                self._refreshing = True
+                self._wake = False
+            self._refresh()
+
+    def backlog(self, after_id, limit=DEFAULT_BUFFER_SIZE):
+        """从事件日志补发 ID 大于 after_id 的事件（断线较久、已不在进程缓冲中时），返回 (事件列表, 能否续传)
+
+        after_id 之后的事件已被清理、ID 无效或积压超过 limit 个时不能续传。
+        """
+        with read_transaction(), db.engine.connect() as connection:
+            min_id, max_id = connection.execute(select(func.min(EventLog.id), func.max(EventLog.id))).one()
+            if min_id is None:
+                return [], after_id == 0
+            if after_id > max_id or min_id > after_id + 1:
+                return [], False
+            rows = connection.execute(
+                _event_query().where(EventLog.id > after_id).order_by(EventLog.id).limit(limit + 1)
+            ).all()
+        if len(rows) > limit:
+            return [], False
+        return [Event.from_row(row) for row in rows], True
+
+event_bus = EventBus()
+
+def publish_user_changed(user):
+    """用户新增或资料修改事件（在岗看板据此更新姓名、部门和停用状态）"""
+    event_bus.publish('user.changed', {
+        'id': user.id,
+        'username': user.username,
+        'real_name': user.real_name,
+        'department': user.department,
+        'is_active': user.is_active is not False
+    }, user_id=user.id, managers=True)
+
+@event.listens_for(Session, 'after_commit')
+def _wake_subscribers(session):
+    if session.info.pop(PUBLISHED_KEY, False):
+        event_bus.wake()
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_published(session):
+    session.info.pop(PUBLISHED_KEY, None)
+
+def purge_event_log(retention=DEFAULT_RETENTION):
+    """清理超过保留时间的事件（断线超过保留时间的客户端重连时收到 reset）"""
+    cutoff = datetime.utcnow() - timedelta(seconds=retention)
+    EventLog.query.filter(EventLog.created_at < cutoff).delete(synchronize_session=False)
+    db.session.commit()
+
+def start_event_log_purge(app):
+    retention = app.config.get('EVENT_LOG_RETENTION', DEFAULT_RETENTION)
+    return add_interval_job(app, lambda: purge_event_log(retention), PURGE_INTERVAL, 'event_log_purge')
+
+def format_sse(data, event_type=None, event_id=None):
+    lines = []
+    if event_id:
+        lines.append('id: %s' % event_id)
+    if event_type:
+        lines.append('event: %s' % event_type)
+    lines.append('data: %s' % json.dumps(data, ensure_ascii=False, separators=(',', ':')))
+    return '\n'.join(lines) + '\n\n'
+
+def stream_events(app, user_id, role, last_event_id=None, heartbeat=15, max_duration=None, retry=3000,
+                  poll_interval=DEFAULT_POLL_INTERVAL, bus=None):
+    """生成某用户的 SSE 数据流
+
+    从 last_event_id 之后续传；空闲时每 heartbeat 秒发送注释行保持连接，max_duration 秒后结束，客户端自动重连续传。
+    每次等待都在新的应用上下文中进行，查询事件日志后立即归还数据库连接，连接期间不占用数据库连接。
+    """
+    bus = bus or event_bus
+    yield 'retry: %d\n\n' % retry
+
+    after_id = bus.parse_event_id(last_event_id) if last_event_id else None
+    with app.app_context():
+        current_id = bus.current_id()
+        backlog, resumable = [], after_id is not None
+        if after_id is not None and after_id < bus.floor():
+            backlog, resumable = bus.backlog(after_id)
+    if not resumable:
+        if last_event_id:
+            # 事件已被清理或 ID 无效，无法续传，客户端需要重新拉取数据
+            yield format_sse({'reason': 'expired'}, 'reset')
+        after_id = current_id
+        yield format_sse({}, 'ready', str(after_id))
+    for event in backlog:
+        after_id = event.id
+        if event.visible_to(user_id, role):
+            yield format_sse(event.data, event.event_type, bus.event_id(event))
+
+    deadline = time.monotonic() + max_duration if max_duration else None
+    last_write = time.monotonic()
+    while deadline is None or time.monotonic() < deadline:
+        with app.app_context():
+            events, missed = bus.wait_for_events(after_id, heartbeat, poll_interval)
+        if missed:
+            yield format_sse({'reason': 'missed'}, 'reset')
+            after_id = bus.current_id()
+            last_write = time.monotonic()
+        for event in events:
+            after_id = event.id
+            if event.visible_to(user_id, role):
+                yield format_sse(event.data, event.event_type, bus.event_id(event))
+                last_write = time.monotonic()
+        if time.monotonic() - last_write >= heartbeat:
+            yield ': heartbeat\n\n'
+            last_write = time.monotonic()
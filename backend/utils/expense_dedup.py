@@ -0,0 +1,223 @@
+from models import ExpenseReport, ExpenseFingerprint, db
+from sqlalchemy import func
+from sqlalchemy.orm import aliased
+from datetime import date
+import hashlib
+import random
+import re
+import unicodedata
+
+# MinHash 参数：16 个哈希函数分为 4 个带，每带 4 行
+MINHASH_PERMUTATIONS = 16
+MINHASH_BANDS = 4
+SHINGLE_SIZE = 3
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_rng = random.Random(20261019)
+_PERMUTATIONS = [
+    (_rng.randrange(1, _MERSENNE_PRIME), _rng.randrange(0, _MERSENNE_PRIME))
+    for _ in range(MINHASH_PERMUTATIONS)
+]
+
+# 指纹类型，对应的疑似重复原因
+KIND_RECEIPT = 'receipt'      # 同一凭证文件
+KIND_EXACT = 'exact'          # 金额、日期、类型完全相同
+KIND_DESCRIPTION = 'desc'     # 金额、日期、类型相同且描述相似
+
+def normalize_description(text):
+    """描述归一化：全半角统一、小写、去除空白和标点"""
+    text = unicodedata.normalize('NFKC', text or '').lower()
+    return re.sub(r'[\W_]+', '', text)
+
+def description_shingles(text):
+    normalized = normalize_description(text)
+    if len(normalized) <= SHINGLE_SIZE:
+        return {normalized} if normalized else set()
+    return {normalized[i:i + SHINGLE_SIZE] for i in range(len(normalized) - SHINGLE_SIZE + 1)}
+
+def _stable_hash(value):
+    return int.from_bytes(hashlib.blake2b(value.encode('utf-8'), digest_size=8).digest(), 'big')
+
+def description_bands(text):
+    """计算描述的 MinHash 签名并按带分组，相似描述大概率至少有一个带相同"""
+    shingles = description_shingles(text)
+    if not shingles:
+        return []
+
+    hashes = [_stable_hash(shingle) for shingle in shingles]
+    signature = [
+        min((a * h + b) % _MERSENNE_PRIME for h in hashes)
+        for a, b in _PERMUTATIONS
+    ]
+    rows = MINHASH_PERMUTATIONS // MINHASH_BANDS
+    return [
+        '%d:%s' % (band, '.'.join(str(value) for value in signature[band * rows:(band + 1) * rows]))
+        for band in range(MINHASH_BANDS)
+    ]
+
+def _digest(key):
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+def fingerprint_keys(report):
+    """生成报销单的全部指纹 [(类型, 指纹)]"""
+    keys = []
+    if report.receipt_hash:
+        keys.append((KIND_RECEIPT, _digest('receipt|' + report.receipt_hash)))
+    keys.append((KIND_EXACT, _digest('exact|%d|%s|%s' % (
+        report.amount_cents, report.date.isoformat(), report.expense_type))))
+    # 描述指纹同样包含日期和类型：每月停车费、每天同一路线的打车等周期性报销描述相同，不应视为重复
+    for band in description_bands(report.description):
+        keys.append((KIND_DESCRIPTION, _digest('desc|%d|%s|%s|%s' % (
+            report.amount_cents, report.date.isoformat(), report.expense_type, band))))
+    return keys
+
+def find_duplicate_candidates(report_id, keys):
+    """按指纹索引查找疑似重复的报销单，返回 {报销单ID: [原因]}"""
+    if not keys:
+        return {}
+
+    rows = db.session.query(
+        ExpenseFingerprint.report_id,
+        ExpenseFingerprint.kind
+    ).filter(
+        ExpenseFingerprint.fingerprint.in_([fingerprint for _, fingerprint in keys]),
+        ExpenseFingerprint.report_id != report_id
+    ).all()
+
+    candidates = {}
+    for candidate_id, kind in rows:
+        reasons = candidates.setdefault(candidate_id, [])
+        if kind not in reasons:
+            reasons.append(kind)
+    return candidates
+
+def stored_candidates(report_id):
+    """按已保存的指纹查找与报销单共享指纹的其他报销单ID"""
+    fingerprints = db.session.query(ExpenseFingerprint.fingerprint).filter_by(report_id=report_id)
+    rows = db.session.query(ExpenseFingerprint.report_id).filter(
+        ExpenseFingerprint.fingerprint.in_(fingerprints),
+        ExpenseFingerprint.report_id != report_id
+    ).distinct()
+    return {candidate_id for candidate_id, in rows}
+
+def refresh_duplicate_flags(report_ids):
+    """重新计算报销单的疑似重复标记：与之重复的报销单修改或删除后，不再与任何报销单共享指纹的清除标记"""
+    if not report_ids:
+        return
+    other = aliased(ExpenseFingerprint)
+    rows = db.session.query(ExpenseFingerprint.report_id).join(
+        other,
+        db.and_(other.fingerprint == ExpenseFingerprint.fingerprint, other.report_id != ExpenseFingerprint.report_id)
+    ).filter(ExpenseFingerprint.report_id.in_(list(report_ids))).distinct()
+    cleared = set(report_ids) - {report_id for report_id, in rows}
+    if cleared:
+        ExpenseReport.query.filter(
+            ExpenseReport.id.in_(list(cleared))
+        ).update({'suspected_duplicate': False}, synchronize_session=False)
+
+def index_expense_report(report):
+    """更新报销单指纹并标记疑似重复（需在报销单 flush 之后调用，由调用方提交事务）"""
+    keys = fingerprint_keys(report)
+    previous = stored_candidates(report.id)
+
+    ExpenseFingerprint.query.filter_by(report_id=report.id).delete(synchronize_session=False)
+    db.session.add_all([
+        ExpenseFingerprint(report_id=report.id, kind=kind, fingerprint=fingerprint)
+        for kind, fingerprint in keys
+    ])
+
+    candidates = find_duplicate_candidates(report.id, keys)
+    report.suspected_duplicate = bool(candidates)
+    if candidates:
+        ExpenseReport.query.filter(
+            ExpenseReport.id.in_(list(candidates))
+        ).update({'suspected_duplicate': True}, synchronize_session=False)
+    refresh_duplicate_flags(previous - set(candidates))
+    return candidates
+
+def remove_expense_fingerprints(report_id):
+    """删除报销单的指纹，并重新计算原先与之重复的报销单的标记"""
+    previous = stored_candidates(report_id)
+    ExpenseFingerprint.query.filter_by(report_id=report_id).delete(synchronize_session=False)
+    refresh_duplicate_flags(previous)
+
+def scan_duplicates(year, batch_size=1000):
+    """批量扫描某年的报销单：补建缺失的指纹，再按指纹分组找出疑似重复组
+
+    使用指纹索引的 GROUP BY 代替两两比较。
+    """
+    year_start = date(year, 1, 1)
+    year_end = date(year + 1, 1, 1)
+    in_year = db.and_(ExpenseReport.date >= year_start, ExpenseReport.date < year_end)
+
+    # 补建没有指纹的报销单（历史数据）
+    indexed = db.session.query(ExpenseFingerprint.report_id)
+    while True:
+        reports = ExpenseReport.query.filter(
+            in_year,
+            ExpenseReport.id.notin_(indexed)
+        ).order_by(ExpenseReport.id).limit(batch_size).all()
+        if not reports:
+            break
+        for report in reports:
+            db.session.add_all([
+                ExpenseFingerprint(report_id=report.id, kind=kind, fingerprint=fingerprint)
+                for kind, fingerprint in fingerprint_keys(report)
+            ])
+        db.session.commit()
+
+    # 找出被多个报销单共享的指纹
+    shared = db.session.query(
+        ExpenseFingerprint.fingerprint
+    ).join(
+        ExpenseReport, ExpenseReport.id == ExpenseFingerprint.report_id
+    ).filter(in_year).group_by(
+        ExpenseFingerprint.fingerprint
+    ).having(func.count(ExpenseFingerprint.report_id) > 1).subquery()
+
+    rows = db.session.query(
+        ExpenseFingerprint.fingerprint,
+        ExpenseFingerprint.kind,
+        ExpenseFingerprint.report_id
+    ).join(
+        ExpenseReport, ExpenseReport.id == ExpenseFingerprint.report_id
+    ).filter(
+        in_year,
+        ExpenseFingerprint.fingerprint.in_(db.session.query(shared.c.fingerprint))
+    ).order_by(ExpenseFingerprint.fingerprint).all()
+
+    # 并查集合并共享指纹的报销单
+    parent = {}
+
+    def find(report_id):
+        parent.setdefault(report_id, report_id)
+        while parent[report_id] != report_id:
+            parent[report_id] = parent[parent[report_id]]
+            report_id = parent[report_id]
+        return report_id
+
+    reasons = {}
+    previous = None
+    for fingerprint, kind, report_id in rows:
+        if previous and previous[0] == fingerprint:
+            parent[find(report_id)] = find(previous[1])
+        else:
+            find(report_id)
+        reasons.setdefault(report_id, set()).add(kind)
+        previous = (fingerprint, report_id)
+
+    groups = {}
+    for report_id in parent:
+        groups.setdefault(find(report_id), []).append(report_id)
+
+    duplicate_ids = list(parent)
+    for start in range(0, len(duplicate_ids), batch_size):
+        ExpenseReport.query.filter(
+            ExpenseReport.id.in_(duplicate_ids[start:start + batch_size])
+        ).update({'suspected_duplicate': True}, synchronize_session=False)
+    db.session.commit()
+
+    return [{
+        'report_ids': sorted(members),
+        'reasons': sorted(set().union(*(reasons[member] for member in members)))
+    } for members in sorted(groups.values(), key=min)]
@@ -0,0 +1,66 @@
+from flask import current_app, request, jsonify
+from collections import OrderedDict
+from threading import Lock
+import hashlib
+
+class ResponseCache:
+    """进程内 LRU 响应缓存，按 (视图, 参数, 可见范围) 缓存已渲染的 JSON"""
+
+    def __init__(self, max_entries=2048):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+response_cache = ResponseCache()
+
+def make_etag(*parts):
+    """根据缓存键和数据版本生成 ETag（压缩后的响应改为弱 ETag，校验时按弱比较）"""
+    return hashlib.sha1(repr(parts).encode('utf-8')).hexdigest()
+
+def _not_modified(etag):
+    response = current_app.response_class(status=304)
+    response.set_etag(etag)
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
+
+def conditional_json(cache_key, versions, build):
+    """带 ETag 校验和服务端缓存的 JSON 响应
+
+    versions 为该视图依赖的数据版本，版本未变时直接返回 304 或缓存内容，
+    只有缓存未命中时才调用 build() 重新生成数据。
+    """
+    etag = make_etag(cache_key, versions)
+    if request.if_none_match.contains_weak(etag):
+        return _not_modified(etag)
+
+    entry = response_cache.get(cache_key)
+    if entry and entry[0] == etag:
+        body = entry[1]
+    else:
+        body = jsonify(build()).get_data()
+        response_cache.set(cache_key, (etag, body))
+
+    response = current_app.response_class(body, status=200, mimetype='application/json')
+    response.set_etag(etag)
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
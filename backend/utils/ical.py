@@ -0,0 +1,75 @@
+from datetime import datetime, timedelta
+
+CRLF = '\r\n'
+
+def escape_text(value):
+    """按 RFC 5545 转义文本属性值"""
+    if not value:
+        return ''
+    return (value.replace('\\', '\\\\')
+                 .replace(';', '\\;')
+                 .replace(',', '\\,')
+                 .replace('\r\n', '\\n')
+                 .replace('\n', '\\n'))
+
+def fold_line(line):
+    """按 75 字节折行，不拆分多字节字符"""
+    if len(line.encode('utf-8')) <= 75:
+        return line
+
+    parts = []
+    current = ''
+    size = 0
+    for char in line:
+        char_size = len(char.encode('utf-8'))
+        if size + char_size > 75:
+            parts.append(current)
+            current = ' '
+            size = 1
+        current += char
+        size += char_size
+    parts.append(current)
+    return CRLF.join(parts)
+
+def format_datetime(value):
+    """本地时间（浮动时间）格式"""
+    return value.strftime('%Y%m%dT%H%M%S')
+
+def format_utc(value):
+    """UTC 时间格式"""
+    return value.strftime('%Y%m%dT%H%M%SZ')
+
+def calendar_header(name):
+    lines = [
+        'BEGIN:VCALENDAR',
+        'VERSION:2.0',
+        'PRODID:-//Retail Attendance//Schedule Feed//ZH',
+        'CALSCALE:GREGORIAN',
+        'METHOD:PUBLISH',
+        'X-WR-CALNAME:' + escape_text(name),
+        'X-PUBLISHED-TTL:PT1H'
+    ]
+    return ''.join(fold_line(line) + CRLF for line in lines)
+
+def calendar_footer():
+    return 'END:VCALENDAR' + CRLF
+
+def schedule_event(schedule_id, schedule_date, start_time, end_time, summary, notes, updated_at, domain):
+    """生成一条排班的 VEVENT（跨夜班次的结束时间顺延到次日）"""
+    start = datetime.combine(schedule_date, start_time)
+    end = datetime.combine(schedule_date, end_time)
+    if end <= start:
+        end += timedelta(days=1)
+
+    lines = [
+        'BEGIN:VEVENT',
+        'UID:schedule-%d@%s' % (schedule_id, domain),
+        'DTSTAMP:' + format_utc(updated_at),
+        'DTSTART:' + format_datetime(start),
+        'DTEND:' + format_datetime(end),
+        'SUMMARY:' + escape_text(summary)
+    ]
+    if notes:
+        lines.append('DESCRIPTION:' + escape_text(notes))
+    lines.append('END:VEVENT')
+    return ''.join(fold_line(line) + CRLF for line in lines)
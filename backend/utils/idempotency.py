@@ -0,0 +1,194 @@
+from flask import current_app, request, jsonify, has_request_context
+from flask_jwt_extended import verify_jwt_in_request, get_jwt_identity
+from sqlalchemy import delete, event, insert, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from datetime import datetime, timedelta
+import hashlib
+
+from models import IdempotencyKey, db
+from utils.scheduler import add_interval_job
+
+HEADER = 'Idempotency-Key'
+REPLAYED_HEADER = 'Idempotent-Replayed'
+MUTATING_METHODS = ('POST', 'PUT', 'PATCH', 'DELETE')
+MAX_KEY_LENGTH = 255
+ENVIRON_KEY = 'attendance.idempotency'
+DEFAULT_TTL = 24 * 3600          # 秒
+PURGE_INTERVAL = 3600
+
+# 幂等键记录在数据库中，所有进程共享，(用户, Idempotency-Key) 唯一：
+# 处理函数第一次提交事务时在同一事务中插入键（响应为空，表示正在处理），写入的数据与键同时生效或同时回滚；
+# 生成响应后再把状态码和响应体写入该记录。并发的相同请求提交时违反唯一约束，事务回滚后返回第一次的响应。
+
+class IdempotencyConflict(Exception):
+    """提交时幂等键已被并发的相同请求插入"""
+
+    def __init__(self, pending):
+        super().__init__(pending['key'])
+        self.pending = pending
+
+def request_fingerprint():
+    """请求指纹：方法、路径和请求体
+
+    multipart 上传和未声明长度的请求体由接口流式读取，不能在这里整体读入内存，
+    只取类型（不含每次请求都不同的 boundary）和 Content-Length。
+    """
+    digest = hashlib.sha256()
+    digest.update(request.method.encode('utf-8'))
+    digest.update(b'\0')
+    digest.update(request.full_path.encode('utf-8'))
+    digest.update(b'\0')
+    if request.mimetype.startswith('multipart/') or request.content_length is None:
+        digest.update(('%s|%s' % (request.mimetype, request.content_length)).encode('utf-8'))
+    else:
+        digest.update(request.get_data(cache=True))
+    return digest.hexdigest()
+
+def _key_filter(pending):
+    return (IdempotencyKey.user_id == pending['user_id'], IdempotencyKey.idempotency_key == pending['key'])
+
+def _find(pending):
+    return db.session.execute(
+        select(IdempotencyKey.fingerprint, IdempotencyKey.status_code, IdempotencyKey.body,
+               IdempotencyKey.content_type, IdempotencyKey.created_at).where(*_key_filter(pending))
+    ).first()
+
+def _existing_response(row, fingerprint):
+    """已有记录时的响应：用于其他请求返回 422，仍在处理中返回 409，否则返回第一次的响应"""
+    if row is not None and row.fingerprint != fingerprint:
+        return jsonify({'error': f'{HEADER} 已用于其他请求'}), 422
+    if row is None or row.status_code is None:
+        response = jsonify({'error': '相同的请求正在处理中，请稍后重试'})
+        response.status_code = 409
+        response.headers['Retry-After'] = '1'
+        return response
+    response = current_app.response_class(row.body, status=row.status_code, content_type=row.content_type)
+    response.headers[REPLAYED_HEADER] = 'true'
+    return response
+
+def check_idempotency_key():
+    """带 Idempotency-Key 的写请求：重试时直接返回第一次的响应，不再执行处理函数"""
+    idempotency_key = request.headers.get(HEADER)
+    if not idempotency_key or request.method not in MUTATING_METHODS:
+        return None
+    if len(idempotency_key) > MAX_KEY_LENGTH:
+        return jsonify({'error': f'{HEADER} 不能超过 {MAX_KEY_LENGTH} 个字符'}), 400
+
+    # 幂等键按用户隔离；未登录或令牌无效时不处理，由接口自身返回错误
+    try:
+        verify_jwt_in_request()
+        user_id = get_jwt_identity()
+    except Exception:
+        return None
+
+    pending = {'user_id': user_id, 'key': idempotency_key, 'fingerprint': request_fingerprint(), 'inserted': False}
+    row = _find(pending)
+    if row is not None:
+        ttl = current_app.config.get('IDEMPOTENCY_TTL', DEFAULT_TTL)
+        if row.created_at and row.created_at > datetime.utcnow() - timedelta(seconds=ttl):
+            return _existing_response(row, pending['fingerprint'])
+        # 已过期：在处理函数的事务中删除，提交时重新插入
+        db.session.execute(delete(IdempotencyKey).where(*_key_filter(pending)))
+    request.environ[ENVIRON_KEY] = pending
+    return None
+
+@event.listens_for(Session, 'before_commit')
+def _insert_pending_key(session):
+    """处理函数第一次提交事务时在同一事务中插入幂等键"""
+    if not has_request_context():
+        return
+    pending = request.environ.get(ENVIRON_KEY)
+    if pending is None or pending['inserted'] or session is not db.session():
+        return
+    pending['inserted'] = True
+    try:
+        session.execute(insert(IdempotencyKey).values(
+            user_id=pending['user_id'],
+            idempotency_key=pending['key'],
+            fingerprint=pending['fingerprint'],
+            created_at=datetime.utcnow()
+        ))
+    except IntegrityError:
+        request.environ.pop(ENVIRON_KEY, None)
+        raise IdempotencyConflict(pending)
+
+def replay_conflicting_request(error):
+    """并发的相同请求已先提交：回滚本次的写入，返回第一次的响应（仍在处理中时返回 409）"""
+    db.session.rollback()
+    return _existing_response(_find(error.pending), error.pending['fingerprint'])
+
+def store_idempotent_response(response):
+    pending = request.environ.pop(ENVIRON_KEY, None)
+    if pending is None:
+        return response
+    # 服务器错误和流式响应不记录，重试时重新执行
+    keep = response.status_code < 500 and not response.is_streamed
+    if not keep and not pending['inserted']:
+        return response
+
+    try:
+        # 结束处理函数未提交的事务，记录响应单独提交
+        db.session.rollback()
+        if not pending['inserted']:
+            # 处理函数没有提交事务（如参数校验失败），单独插入键和响应
+            db.session.execute(insert(IdempotencyKey).values(
+                user_id=pending['user_id'],
+                idempotency_key=pending['key'],
+                fingerprint=pending['fingerprint'],
+                status_code=response.status_code,
+                body=response.get_data(),
+                content_type=response.content_type,
+                created_at=datetime.utcnow()
+            ))
+        elif keep:
+            db.session.execute(update(IdempotencyKey).where(*_key_filter(pending)).values(
+                status_code=response.status_code,
+                body=response.get_data(),
+                content_type=response.content_type
+            ))
+        else:
+            db.session.execute(delete(IdempotencyKey).where(*_key_filter(pending)))
+        db.session.commit()
+    except IntegrityError:
+        # 并发的相同请求已插入同一个键
+        db.session.rollback()
+    except Exception:
+        # 记录失败不影响本次响应；键保持处理中状态，过期后才能重试
+        db.session.rollback()
+        current_app.logger.exception('保存幂等响应失败: %s', pending['key'])
+    return response
+
+def discard_unfinished(error=None):
+    # 处理函数抛出异常（未生成响应）时删除已插入的键，重试时重新执行
+    pending = request.environ.pop(ENVIRON_KEY, None)
+    if pending is None or not pending['inserted']:
+        return
+    try:
+        db.session.rollback()
+        db.session.execute(delete(IdempotencyKey).where(*_key_filter(pending)))
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        current_app.logger.exception('删除幂等键失败: %s', pending['key'])
+
+def purge_idempotency_keys(ttl=DEFAULT_TTL):
+    """清理过期的幂等键"""
+    cutoff = datetime.utcnow() - timedelta(seconds=ttl)
+    IdempotencyKey.query.filter(IdempotencyKey.created_at < cutoff).delete(synchronize_session=False)
+    db.session.commit()
+
+def start_idempotency_purge(app):
+    if not app.config.get('IDEMPOTENCY_ENABLED', True):
+        return None
+    ttl = app.config.get('IDEMPOTENCY_TTL', DEFAULT_TTL)
+    return add_interval_job(app, lambda: purge_idempotency_keys(ttl), PURGE_INTERVAL, 'idempotency_purge')
+
+def install_idempotency(app):
+    """支持 Idempotency-Key 请求头（IDEMPOTENCY_ENABLED 关闭时不处理）"""
+    if not app.config.get('IDEMPOTENCY_ENABLED', True):
+        return
+    app.before_request(check_idempotency_key)
+    app.after_request(store_idempotent_response)
+    app.teardown_request(discard_unfinished)
+    app.register_error_handler(IdempotencyConflict, replay_conflicting_request)
@@ -0,0 +1,40 @@
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # 未安装 orjson 时使用 Flask 默认的 JSON 编码
+    orjson = None
+
+class OrjsonProvider(DefaultJSONProvider):
+    """使用 orjson 编码的 JSON provider
+
+    输出与默认 provider 一致（键排序，日期时间等类型仍由 Flask 的 default 处理），
+    调用方传入额外参数时回退到标准库 json。
+    """
+
+    options = 0 if orjson is None else (
+        orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+    )
+
+    def dumps(self, obj, **kwargs):
+        if kwargs:
+            return super().dumps(obj, **kwargs)
+        return orjson.dumps(obj, default=self.default, option=self.options).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        if kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(
+            orjson.dumps(obj, default=self.default, option=self.options),
+            mimetype=self.mimetype
+        )
+
+def install_json_provider(app):
+    """已安装 orjson 时替换应用的 JSON provider"""
+    if orjson is not None and app.config.get('JSON_USE_ORJSON', True):
+        app.json = OrjsonProvider(app)
+    return app.json
@@ -0,0 +1,197 @@
+"""门店打卡终端的离线打卡批量同步
+
+终端断网时在本地排队保存打卡，每条带终端内严格递增的序号，恢复网络后整批上传。
+请求用终端密钥对请求体做 HMAC-SHA256 签名。序号不大于终端已处理的最大序号的打卡视为重传，直接跳过，
+终端收到响应后删除序号不大于 last_sequence 的打卡即可。
+"""
+from sqlalchemy import insert, update
+from datetime import datetime, timedelta
+import hashlib
+import hmac
+import ipaddress
+import secrets
+
+from models import AttendanceRecord, SystemSettings, User, db
+from utils.versioning import bump_user_versions
+
+KIOSK_HEADER = 'X-Kiosk-Id'
+SIGNATURE_HEADER = 'X-Kiosk-Signature'
+PUNCH_TYPES = ('clock_in', 'clock_out')
+
+# 打卡规则用到的系统设置及默认值（与单次打卡接口相同）
+SETTING_DEFAULTS = {
+    'work_start_time': '09:00',
+    'work_end_time': '18:00',
+    'break_duration': '1.0',
+    'allowed_ips': None
+}
+
+def new_secret():
+    return secrets.token_hex(32)
+
+def sign_body(secret, body):
+    return hmac.new(secret.encode('utf-8'), body, hashlib.sha256).hexdigest()
+
+def verify_signature(secret, body, signature):
+    if not signature:
+        return False
+    return hmac.compare_digest(sign_body(secret, body), signature.strip().lower())
+
+def ip_allowed(ip, allowed_ips):
+    """ip 是否在 allowed_ips（逗号分隔的地址或网段）范围内，未设置时不限制"""
+    if not allowed_ips:
+        return True
+    for allowed_ip in allowed_ips.split(','):
+        try:
+            if ipaddress.ip_address(ip) in ipaddress.ip_network(allowed_ip.strip(), strict=False):
+                return True
+        except ValueError:
+            continue
+    return False
+
+def load_settings():
+    """一次查询读取打卡规则相关的系统设置"""
+    settings = dict(SETTING_DEFAULTS)
+    for key, value in db.session.query(SystemSettings.key, SystemSettings.value).filter(
+        SystemSettings.key.in_(list(SETTING_DEFAULTS))
+    ):
+        settings[key] = value
+    return settings
+
+def parse_timestamp(value):
+    """终端本地时间（ISO 格式）；带时区时换算为服务器本地时间"""
+    timestamp = datetime.fromisoformat(str(value))
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone().replace(tzinfo=None)
+    return timestamp
+
+def parse_punches(items, max_punches):
+    """校验打卡列表，按序号排序返回 [{sequence, user_id, type, timestamp}]，格式错误时抛出 ValueError"""
+    if not isinstance(items, list) or not items:
+        raise ValueError('打卡记录不能为空')
+    if len(items) > max_punches:
+        raise ValueError(f'每批最多 {max_punches} 条打卡记录')
+
+    punches = []
+    for index, item in enumerate(items, 1):
+        try:
+            punch = {
+                'sequence': int(item['sequence']),
+                'user_id': int(item['user_id']),
+                'type': item['type'],
+                'timestamp': parse_timestamp(item['timestamp'])
+            }
+        except (KeyError, TypeError, ValueError):
+            raise ValueError(f'第 {index} 条打卡记录格式错误')
+        if punch['sequence'] <= 0 or punch['type'] not in PUNCH_TYPES:
+            raise ValueError(f'第 {index} 条打卡记录格式错误')
+        punches.append(punch)
+    punches.sort(key=lambda punch: punch['sequence'])
+    return punches
+
+# 批量同步读取和写入的考勤字段
+RECORD_FIELDS = ('clock_in_time', 'clock_out_time', 'clock_in_ip', 'clock_out_ip', 'work_hours', 'status')
+
+def apply_punches(kiosk, punches, settings, ip, now, max_offline_days, clock_skew):
+    """按序号依次应用一批打卡（不提交），返回 (每条的结果, 已应用的打卡)
+
+    用户和涉及的考勤记录各用一次查询预先加载，逐条校验和更新在内存中完成，最后新增和修改的记录
+    各用一条批量语句写入（不逐行插入和回读主键），由调用方在同一个事务中一次提交。
+    规则与单次打卡接口相同，另外要求员工属于终端所在门店。
+    已应用的打卡为 (类型, 打卡时间, 用户, 日期, 考勤状态, 工作时长)，应用时取值。
+    """
+    work_start = datetime.strptime(settings['work_start_time'], '%H:%M').time()
+    work_end = datetime.strptime(settings['work_end_time'], '%H:%M').time()
+    break_duration = float(settings['break_duration'])
+    earliest = now - timedelta(days=max_offline_days)
+    latest = now + timedelta(seconds=clock_skew)
+    updated_at = datetime.utcnow()
+
+    pending = [punch for punch in punches if punch['sequence'] > kiosk.last_sequence]
+    user_ids = {punch['user_id'] for punch in pending}
+    days = {punch['timestamp'].date() for punch in pending}
+    users = {}
+    records = {}
+    if pending:
+        users = {user.id: user for user in db.session.query(
+            User.id, User.department, User.is_active
+        ).filter(User.id.in_(user_ids))}
+        columns = [getattr(AttendanceRecord, field) for field in RECORD_FIELDS]
+        for row in db.session.query(
+            AttendanceRecord.id, AttendanceRecord.user_id, AttendanceRecord.date, *columns
+        ).filter(
+            AttendanceRecord.user_id.in_(user_ids),
+            AttendanceRecord.date.in_(days)
+        ).order_by(AttendanceRecord.id):
+            records.setdefault((row.user_id, row.date), dict(row._mapping))
+
+    applied = []
+    changed = {}
+
+    def apply(punch):
+        timestamp = punch['timestamp']
+        if timestamp > latest:
+            return '打卡时间晚于服务器时间'
+        if timestamp < earliest:
+            return f'离线打卡已超过 {max_offline_days} 天'
+        user = users.get(punch['user_id'])
+        if not user or not user.is_active:
+            return '用户不存在'
+        if kiosk.department and user.department != kiosk.department:
+            return '不是本门店的员工'
+
+        key = (user.id, timestamp.date())
+        record = records.get(key)
+        if punch['type'] == 'clock_in':
+            if record and record['clock_in_time']:
+                return '当天已经打过上班卡'
+            if not record:
+                record = dict(dict.fromkeys(RECORD_FIELDS), id=None, user_id=user.id, date=timestamp.date(),
+                              work_hours=0.0, created_at=updated_at)
+                records[key] = record
+            record['clock_in_time'] = timestamp
+            record['clock_in_ip'] = ip
+            record['status'] = 'late' if timestamp.time() > work_start else 'normal'
+        else:
+            if not record or not record['clock_in_time']:
+                return '请先进行上班打卡'
+            if record['clock_out_time']:
+                return '当天已经打过下班卡'
+            if timestamp < record['clock_in_time']:
+                return '下班时间早于上班时间'
+            if timestamp.time() < work_end:
+                record['status'] = 'early_leave'
+            record['clock_out_time'] = timestamp
+            record['clock_out_ip'] = ip
+            record['work_hours'] = round((timestamp - record['clock_in_time']).total_seconds() / 3600
+                                         - break_duration, 2)
+        record['updated_at'] = updated_at
+        changed[key] = record
+        applied.append((punch['type'], timestamp, user.id, record['date'], record['status'], record['work_hours']))
+        return None
+
+    results = []
+    for punch in punches:
+        if punch['sequence'] <= kiosk.last_sequence:
+            results.append({'sequence': punch['sequence'], 'status': 'duplicate'})
+            continue
+        # 无法通过校验的打卡重传也不会通过，同样计入已处理的序号
+        kiosk.last_sequence = punch['sequence']
+        error = apply(punch)
+        if error:
+            results.append({'sequence': punch['sequence'], 'status': 'rejected', 'error': error})
+        else:
+            results.append({'sequence': punch['sequence'], 'status': 'applied'})
+
+    new_rows = [{key: value for key, value in record.items() if key != 'id'}
+                for record in changed.values() if record['id'] is None]
+    updated_rows = [{key: record[key] for key in ('id', 'updated_at') + RECORD_FIELDS}
+                    for record in changed.values() if record['id'] is not None]
+    if new_rows:
+        db.session.execute(insert(AttendanceRecord), new_rows)
+    if updated_rows:
+        # 按主键批量更新（executemany）
+        db.session.execute(update(AttendanceRecord), updated_rows)
+    # 批量写入不经过 ORM flush，显式递增相关员工的版本号（首页"今天"缓存据此失效）
+    bump_user_versions(db.session, {(user_id, AttendanceRecord.__tablename__) for user_id, _ in changed})
+    return results, applied
@@ -0,0 +1,383 @@
+from flask import current_app, request, has_request_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from bisect import bisect_left
+from threading import Lock, local
+from time import perf_counter
+import hmac
+import ipaddress
+import json
+import os
+import secrets
+import weakref
+
+from utils.scheduler import add_interval_job
+
+# 直方图分桶（上界）
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SQL_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576)
+
+# 单次请求的计时和 SQL 统计，记录在请求的 WSGI environ 上（批量请求的子请求各自记录）
+ENVIRON_KEY = 'attendance.metrics'
+MAX_THREAD_STORES = 256
+
+# 多进程汇总：已退出 worker 的统计合并到该文件
+RETIRED_FILE = 'retired.json'
+HISTOGRAM_FIELDS = ('latency', 'sql_count', 'sql_seconds', 'size')
+DEFAULT_FLUSH_INTERVAL = 5  # 秒
+
+class Histogram:
+    __slots__ = ('bounds', 'counts', 'sum')
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+
+    def merge(self, other):
+        for index, count in enumerate(other.counts):
+            self.counts[index] += count
+        self.sum += other.sum
+
+class EndpointStats:
+    """某个接口（endpoint + 请求方法）的统计"""
+    __slots__ = ('statuses', 'latency', 'sql_count', 'sql_seconds', 'size')
+
+    def __init__(self):
+        self.statuses = {}
+        self.latency = Histogram(LATENCY_BUCKETS)
+        self.sql_count = Histogram(SQL_COUNT_BUCKETS)
+        self.sql_seconds = Histogram(LATENCY_BUCKETS)
+        self.size = Histogram(SIZE_BUCKETS)
+
+    def merge(self, other):
+        for status, count in list(other.statuses.items()):
+            self.statuses[status] = self.statuses.get(status, 0) + count
+        self.latency.merge(other.latency)
+        self.sql_count.merge(other.sql_count)
+        self.sql_seconds.merge(other.sql_seconds)
+        self.size.merge(other.size)
+
+class _Owner:
+    """线程（或协程）存活标记：线程结束后其 local 数据被释放，弱引用随之失效"""
+    __slots__ = ('__weakref__',)
+
+class MetricsRegistry:
+    """按线程分别累计，记录时不加锁；导出时合并所有线程的数据
+
+    已结束线程的数据在导出（或线程数过多）时并入 retired，避免协程 worker 下无限增长。
+    """
+
+    def __init__(self):
+        self._local = local()
+        self._stores = []
+        self._retired = {}
+        self._lock = Lock()
+
+    def _store(self):
+        stats = getattr(self._local, 'stats', None)
+        if stats is None:
+            owner = _Owner()
+            stats = {}
+            self._local.owner = owner
+            self._local.stats = stats
+            with self._lock:
+                self._stores.append((weakref.ref(owner), stats))
+                if len(self._stores) > MAX_THREAD_STORES:
+                    self._retire_dead()
+        return stats
+
+    def observe(self, endpoint, method, status, elapsed, sql_count, sql_seconds, size):
+        stats = self._store()
+        key = (endpoint, method)
+        endpoint_stats = stats.get(key)
+        if endpoint_stats is None:
+            endpoint_stats = stats[key] = EndpointStats()
+        endpoint_stats.statuses[status] = endpoint_stats.statuses.get(status, 0) + 1
+        endpoint_stats.latency.observe(elapsed)
+        endpoint_stats.sql_count.observe(sql_count)
+        endpoint_stats.sql_seconds.observe(sql_seconds)
+        if size is not None:
+            endpoint_stats.size.observe(size)
+
+    def _retire_dead(self):
+        alive = []
+        for owner, stats in self._stores:
+            if owner() is None:
+                _merge_stats(self._retired, stats)
+            else:
+                alive.append((owner, stats))
+        self._stores = alive
+
+    def collect(self):
+        """合并所有线程的统计，返回 {(endpoint, method): EndpointStats}"""
+        with self._lock:
+            self._retire_dead()
+            merged = {}
+            _merge_stats(merged, self._retired)
+            for _, stats in self._stores:
+                _merge_stats(merged, stats)
+        return merged
+
+    def clear(self):
+        with self._lock:
+            for _, stats in self._stores:
+                stats.clear()
+            self._retired.clear()
+
+def _merge_stats(target, source):
+    for key, endpoint_stats in list(source.items()):
+        merged = target.get(key)
+        if merged is None:
+            merged = target[key] = EndpointStats()
+        merged.merge(endpoint_stats)
+
+metrics_registry = MetricsRegistry()
+
+def dump_stats(stats):
+    """把 {(endpoint, method): EndpointStats} 转换为可写入 JSON 的列表"""
+    items = []
+    for (endpoint, method), endpoint_stats in stats.items():
+        item = {'endpoint': endpoint, 'method': method, 'statuses': sorted(endpoint_stats.statuses.items())}
+        for field in HISTOGRAM_FIELDS:
+            histogram = getattr(endpoint_stats, field)
+            item[field] = [histogram.counts, histogram.sum]
+        items.append(item)
+    return items
+
+def load_stats(target, items):
+    """把 dump_stats 的结果累加到 target"""
+    for item in items:
+        endpoint_stats = EndpointStats()
+        endpoint_stats.statuses = {status: count for status, count in item['statuses']}
+        for field in HISTOGRAM_FIELDS:
+            histogram = getattr(endpoint_stats, field)
+            histogram.counts, histogram.sum = item[field]
+        _merge_stats(target, {(item['endpoint'], item['method']): endpoint_stats})
+
+def _read_json(path):
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+def _write_json(path, data):
+    """先写临时文件再改名，读取方不会读到写了一半的文件"""
+    temp_path = '%s.%d.tmp' % (path, os.getpid())
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, separators=(',', ':'))
+    os.replace(temp_path, path)
+
+class MultiprocessMetrics:
+    """多进程汇总：每个 worker 进程把本进程的累计统计写入目录下的 <pid>-<随机串>.json，抓取时合并所有文件
+
+    抓取的进程先写入自己的最新统计再合并，导出的数据都已落盘，计数不会因 worker 重启而回退；
+    worker 退出后由主进程把它的文件并入 retired.json（见 gunicorn.conf.py），文件数不随重启增长。
+    """
+
+    def __init__(self, directory, registry=None):
+        self.directory = directory
+        self.registry = registry or metrics_registry
+        self._lock = Lock()
+        self._process = None
+
+    def _filename(self):
+        # fork 之后 pid 变化，重新生成文件名；随机串避免与已退出进程的 pid 重复
+        pid = os.getpid()
+        if self._process is None or self._process[0] != pid:
+            self._process = (pid, '%d-%s.json' % (pid, secrets.token_hex(4)))
+        return self._process[1]
+
+    def flush(self):
+        """写入本进程的累计统计（加锁，避免较旧的统计覆盖较新的）"""
+        with self._lock:
+            os.makedirs(self.directory, exist_ok=True)
+            _write_json(os.path.join(self.directory, self._filename()), dump_stats(self.registry.collect()))
+
+    def collect(self):
+        """写入本进程的统计后合并所有进程，返回 {(endpoint, method): EndpointStats}"""
+        self.flush()
+        while True:
+            retired = _read_json(os.path.join(self.directory, RETIRED_FILE)) or {'files': [], 'stats': []}
+            merged = {}
+            load_stats(merged, retired['stats'])
+            complete = True
+            for name in sorted(os.listdir(self.directory)):
+                if not name.endswith('.json') or name == RETIRED_FILE or name in retired['files']:
+                    continue
+                items = _read_json(os.path.join(self.directory, name))
+                if items is None:
+                    # 读取期间该 worker 的文件已并入 retired.json，重新读取
+                    complete = False
+                    break
+                load_stats(merged, items)
+            if complete:
+                return merged
+
+    def retire(self, pid):
+        """把已退出 worker 的文件并入 retired.json 后删除（在 gunicorn 主进程中调用）
+
+        先写入 retired.json（记录已并入的文件名，读取方据此跳过）再删除文件，任一时刻读取都不会重复或遗漏。
+        """
+        prefix = '%d-' % pid
+        for name in sorted(os.listdir(self.directory)):
+            if not (name.startswith(prefix) and name.endswith('.json')):
+                continue
+            path = os.path.join(self.directory, name)
+            items = _read_json(path)
+            retired = _read_json(os.path.join(self.directory, RETIRED_FILE)) or {'files': [], 'stats': []}
+            merged = {}
+            load_stats(merged, retired['stats'])
+            load_stats(merged, items or [])
+            _write_json(os.path.join(self.directory, RETIRED_FILE), {'files': [name], 'stats': dump_stats(merged)})
+            os.remove(path)
+
+    def reset(self):
+        """清空目录（主进程启动时调用，丢弃上次运行的统计）"""
+        os.makedirs(self.directory, exist_ok=True)
+        for name in os.listdir(self.directory):
+            if name.endswith('.json') or name.endswith('.tmp'):
+                os.remove(os.path.join(self.directory, name))
+
+_multiprocess = {}
+
+def multiprocess_metrics(directory):
+    """按目录返回进程内共享的 MultiprocessMetrics"""
+    instance = _multiprocess.get(directory)
+    if instance is None:
+        instance = _multiprocess.setdefault(directory, MultiprocessMetrics(directory))
+    return instance
+
+def start_metrics_flush(app):
+    """设置 METRICS_DIR 时定时写入本进程的统计"""
+    directory = app.config.get('METRICS_DIR')
+    if not app.config.get('METRICS_ENABLED', True) or not directory:
+        return None
+    interval = app.config.get('METRICS_FLUSH_INTERVAL', DEFAULT_FLUSH_INTERVAL)
+    return add_interval_job(app, multiprocess_metrics(directory).flush, interval, 'metrics_flush')
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._metrics_started = perf_counter()
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if not has_request_context():
+        return
+    current = request.environ.get(ENVIRON_KEY)
+    started = getattr(context, '_metrics_started', None)
+    if current is not None and started is not None:
+        current[1] += 1
+        current[2] += perf_counter() - started
+
+def start_request_metrics():
+    request.environ[ENVIRON_KEY] = [perf_counter(), 0, 0.0]
+
+def record_request_metrics(response):
+    current = request.environ.pop(ENVIRON_KEY, None)
+    if current is not None:
+        started, sql_count, sql_seconds = current
+        metrics_registry.observe(
+            request.endpoint or 'unmatched',
+            request.method,
+            response.status_code,
+            perf_counter() - started,
+            sql_count,
+            sql_seconds,
+            None if response.is_streamed else response.calculate_content_length()
+        )
+    return response
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+def _histogram_lines(name, labels, histogram):
+    lines = []
+    cumulative = 0
+    for bound, count in zip(histogram.bounds + ('+Inf',), histogram.counts):
+        cumulative += count
+        lines.append('%s_bucket{%s,le="%s"} %d' % (name, labels, bound, cumulative))
+    lines.append('%s_sum{%s} %s' % (name, labels, _format_number(histogram.sum)))
+    lines.append('%s_count{%s} %d' % (name, labels, cumulative))
+    return lines
+
+def render_prometheus(stats):
+    """按 Prometheus 文本格式输出"""
+    items = sorted(stats.items())
+    labels = {key: 'endpoint="%s",method="%s"' % (_label(key[0]), _label(key[1])) for key, _ in items}
+
+    lines = [
+        '# HELP http_requests_total Total HTTP requests by endpoint, method and status.',
+        '# TYPE http_requests_total counter'
+    ]
+    for key, endpoint_stats in items:
+        for status, count in sorted(endpoint_stats.statuses.items()):
+            lines.append('http_requests_total{%s,status="%d"} %d' % (labels[key], status, count))
+
+    histograms = [
+        ('http_request_duration_seconds', 'Request latency in seconds.', 'latency'),
+        ('http_request_sql_statements', 'SQL statements executed per request.', 'sql_count'),
+        ('http_request_sql_duration_seconds', 'Time spent in SQL per request in seconds.', 'sql_seconds'),
+        ('http_response_size_bytes', 'Response body size in bytes (streamed responses excluded).', 'size')
+    ]
+    for name, help_text, attribute in histograms:
+        lines.append('# HELP %s %s' % (name, help_text))
+        lines.append('# TYPE %s histogram' % name)
+        for key, endpoint_stats in items:
+            lines.extend(_histogram_lines(name, labels[key], getattr(endpoint_stats, attribute)))
+    return '\n'.join(lines) + '\n'
+
+def _is_loopback(address):
+    try:
+        return ipaddress.ip_address(address or '').is_loopback
+    except ValueError:
+        return False
+
+def metrics_view():
+    """Prometheus 指标
+
+    需携带 Authorization: Bearer <METRICS_TOKEN>；METRICS_LOCAL_ONLY 开启时只允许本机抓取，此时可不设置令牌。
+    两者都未设置时拒绝访问。设置 METRICS_DIR 时导出所有 worker 进程的合计。
+    """
+    token = current_app.config.get('METRICS_TOKEN')
+    local_only = current_app.config.get('METRICS_LOCAL_ONLY', False)
+    if local_only and not _is_loopback(request.remote_addr):
+        return current_app.response_class('forbidden\n', status=403, mimetype='text/plain')
+    if token:
+        supplied = request.headers.get('Authorization', '')
+        if not hmac.compare_digest(supplied.encode('utf-8'), ('Bearer ' + token).encode('utf-8')):
+            return current_app.response_class('unauthorized\n', status=401, mimetype='text/plain')
+    elif not local_only:
+        return current_app.response_class('METRICS_TOKEN is not set\n', status=403, mimetype='text/plain')
+
+    directory = current_app.config.get('METRICS_DIR')
+    stats = multiprocess_metrics(directory).collect() if directory else metrics_registry.collect()
+    return current_app.response_class(
+        render_prometheus(stats),
+        content_type='text/plain; version=0.0.4; charset=utf-8'
+    )
+
+def install_metrics(app):
+    """METRICS_ENABLED 开启时记录每个接口的延迟、SQL 次数/耗时和响应大小，并提供 /api/metrics
+
+    关闭时不注册任何钩子和 SQL 事件监听，没有额外开销。应在响应压缩之前调用，
+    使记录的响应大小为压缩后的大小。
+    """
+    if not app.config.get('METRICS_ENABLED', True):
+        return
+
+    if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+
+    app.before_request(start_request_metrics)
+    app.after_request(record_request_metrics)
+    app.add_url_rule('/api/metrics', 'metrics', metrics_view)
@@ -0,0 +1,17 @@
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+
+def amount_to_cents(value):
+    """将金额（元）转换为整数分，四舍五入到分；格式错误时抛出 ValueError"""
+    try:
+        amount = Decimal(str(value)).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+    except (InvalidOperation, TypeError):
+        raise ValueError('invalid amount: %r' % (value,))
+    if not amount.is_finite():
+        raise ValueError('invalid amount: %r' % (value,))
+    return int(amount * 100)
+
+def cents_to_amount(cents):
+    """将整数分转换为金额（元），用于 JSON 输出"""
+    if cents is None:
+        return None
+    return cents / 100
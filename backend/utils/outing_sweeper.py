@@ -0,0 +1,110 @@
+from models import OutingReport, User, db
+from datetime import datetime
+from flask import current_app
+from threading import Lock
+from utils.scheduler import add_interval_job
+
+DEFAULT_SWEEP_INTERVAL = 60
+
+class OutingBoard:
+    """最近一次扫描得到的外出人员看板（进程内共享）"""
+
+    def __init__(self):
+        self._lock = Lock()
+        self._snapshot = None
+
+    def get(self, max_age):
+        """返回未过期的看板；没有或已过期时返回 None"""
+        with self._lock:
+            snapshot = self._snapshot
+        if snapshot is None or (datetime.now() - snapshot['swept_at']).total_seconds() > max_age:
+            return None
+        return snapshot
+
+    def set(self, snapshot):
+        with self._lock:
+            self._snapshot = snapshot
+
+    def invalidate(self):
+        """外出报备状态变化后调用，下次读取时重新扫描"""
+        with self._lock:
+            self._snapshot = None
+
+outing_board = OutingBoard()
+
+def active_outing_filter():
+    """已审批且未返回的外出报备，可使用 (status, actual_return_time, expected_return_time) 索引"""
+    return db.and_(
+        OutingReport.status == 'approved',
+        OutingReport.actual_return_time.is_(None)
+    )
+
+def sweep_overdue_outings(now=None):
+    """标记超时未返回的外出报备并刷新看板
+
+    一次范围扫描把新超时的报备写入 overdue_at，再一次查询取出所有外出中的人员。
+    """
+    now = now or datetime.now()
+
+    newly_overdue = db.session.query(OutingReport.id).filter(
+        active_outing_filter(),
+        OutingReport.expected_return_time < now,
+        OutingReport.overdue_at.is_(None)
+    ).all()
+    if newly_overdue:
+        OutingReport.query.filter(
+            OutingReport.id.in_([report_id for report_id, in newly_overdue])
+        ).update({'overdue_at': now}, synchronize_session=False)
+        db.session.commit()
+
+    rows = db.session.query(
+        OutingReport.id,
+        OutingReport.user_id,
+        User.username,
+        User.real_name,
+        User.department,
+        OutingReport.destination,
+        OutingReport.contact_info,
+        OutingReport.start_time,
+        OutingReport.expected_return_time,
+        OutingReport.overdue_at
+    ).join(
+        User, User.id == OutingReport.user_id
+    ).filter(
+        active_outing_filter(),
+        OutingReport.start_time <= now
+    ).order_by(OutingReport.expected_return_time).all()
+
+    outings = [{
+        'id': row.id,
+        'user_id': row.user_id,
+        'username': row.username,
+        'real_name': row.real_name,
+        'department': row.department,
+        'destination': row.destination,
+        'contact_info': row.contact_info,
+        'start_time': row.start_time.strftime('%Y-%m-%d %H:%M:%S'),
+        'expected_return_time': row.expected_return_time.strftime('%Y-%m-%d %H:%M:%S'),
+        'overdue': row.expected_return_time < now,
+        'overdue_at': row.overdue_at.strftime('%Y-%m-%d %H:%M:%S') if row.overdue_at else None
+    } for row in rows]
+
+    snapshot = {
+        'swept_at': now,
+        'outings': outings,
+        'out_count': len(outings),
+        'overdue_count': sum(1 for outing in outings if outing['overdue'])
+    }
+    outing_board.set(snapshot)
+    return snapshot, [report_id for report_id, in newly_overdue]
+
+def run_sweep():
+    """定时任务入口"""
+    _, newly_overdue = sweep_overdue_outings()
+    if newly_overdue:
+        current_app.logger.warning('外出报备超时未返回: %s', newly_overdue)
+
+def start_outing_sweeper(app):
+    """注册后台定时扫描（未安装 APScheduler 时由看板接口按需扫描）"""
+    interval = app.config.get('OUTING_SWEEP_INTERVAL', DEFAULT_SWEEP_INTERVAL)
+    return add_interval_job(app, run_sweep, interval, 'outing_overdue_sweep')
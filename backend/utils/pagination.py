@@ -0,0 +1,18 @@
+from flask_sqlalchemy.pagination import QueryPagination
+
+class ProjectedPagination(QueryPagination):
+    """数据查询带投影列时使用单独的精简计数查询，避免在 COUNT 子查询中计算投影"""
+
+    def _query_count(self):
+        return self._query_args['count_query'].order_by(None).scalar()
+
+def paginate_projected(query, count_query, page, per_page):
+    """分页：query 查询当前页数据，count_query 返回总数"""
+    return ProjectedPagination(
+        query=query,
+        count_query=count_query,
+        page=page,
+        per_page=per_page,
+        max_per_page=None,
+        error_out=False
+    )
@@ -0,0 +1,309 @@
+from sqlalchemy import func
+from models import AttendanceRecord, EventLog, OutingReport, Schedule, User, db
+from utils.events import DEFAULT_GAP_GRACE, read_events
+from utils.scheduler import add_interval_job, run_job
+from utils.sqlite_profile import read_transaction
+from datetime import datetime, date, timedelta
+from threading import Lock
+
+DEFAULT_RECONCILE_INTERVAL = 300
+CATCH_UP_BATCH = 1000
+
+# 在岗状态
+STATUS_OUTING = 'outing'            # 外出中
+STATUS_ON_BREAK = 'on_break'        # 排班休息时间
+STATUS_CLOCKED_IN = 'clocked_in'    # 已上班打卡
+STATUS_CLOCKED_OUT = 'clocked_out'  # 已下班打卡
+STATUS_MISSING = 'missing'          # 已到排班时间但未打卡
+STATUS_SCHEDULED = 'scheduled'      # 今天有排班，尚未开始
+STATUS_OFF = 'off'                  # 今天无排班
+
+STATUSES = [STATUS_OUTING, STATUS_ON_BREAK, STATUS_CLOCKED_IN, STATUS_CLOCKED_OUT,
+            STATUS_MISSING, STATUS_SCHEDULED, STATUS_OFF]
+
+class PresenceEntry:
+    __slots__ = ('user_id', 'username', 'real_name', 'department', 'clock_in_time', 'clock_out_time',
+                 'shift', 'outing')
+
+    def __init__(self, user_id, username, real_name, department):
+        self.user_id = user_id
+        self.username = username
+        self.real_name = real_name
+        self.department = department
+        self.clock_in_time = None
+        self.clock_out_time = None
+        self.shift = None     # (开始, 结束, 休息开始, 休息结束)，均为 datetime
+        self.outing = None    # (外出报备ID, 目的地, 外出时间, 预计返回时间)
+
+    def status(self, now):
+        if self.outing and self.outing[2] <= now:
+            return STATUS_OUTING
+        if self.clock_in_time and not self.clock_out_time:
+            if self.shift and self.shift[2] and self.shift[3] and self.shift[2] <= now < self.shift[3]:
+                return STATUS_ON_BREAK
+            return STATUS_CLOCKED_IN
+        if self.clock_out_time:
+            return STATUS_CLOCKED_OUT
+        if self.shift:
+            return STATUS_MISSING if self.shift[0] <= now else STATUS_SCHEDULED
+        return STATUS_OFF
+
+    def to_dict(self, now):
+        return {
+            'user_id': self.user_id,
+            'username': self.username,
+            'real_name': self.real_name,
+            'department': self.department,
+            'status': self.status(now),
+            'clock_in_time': self.clock_in_time.strftime('%Y-%m-%d %H:%M:%S') if self.clock_in_time else None,
+            'clock_out_time': self.clock_out_time.strftime('%Y-%m-%d %H:%M:%S') if self.clock_out_time else None,
+            'shift_start': self.shift[0].strftime('%Y-%m-%d %H:%M:%S') if self.shift else None,
+            'shift_end': self.shift[1].strftime('%Y-%m-%d %H:%M:%S') if self.shift else None,
+            'outing': {
+                'id': self.outing[0],
+                'destination': self.outing[1],
+                'expected_return_time': self.outing[3].strftime('%Y-%m-%d %H:%M:%S'),
+                'overdue': self.outing[3] < now
+            } if self.outing else None
+        }
+
+def shift_window(schedule_date, start_time, end_time, break_start=None, break_end=None):
+    """把排班时间转换为 datetime，跨零点的班次结束于次日"""
+    start = datetime.combine(schedule_date, start_time)
+    end = datetime.combine(schedule_date, end_time)
+    if end <= start:
+        end += timedelta(days=1)
+    rest_start = datetime.combine(schedule_date, break_start) if break_start else None
+    rest_end = datetime.combine(schedule_date, break_end) if break_end else None
+    if rest_start and rest_start < start:
+        rest_start += timedelta(days=1)
+    if rest_end and rest_start and rest_end <= rest_start:
+        rest_end += timedelta(days=1)
+    return start, end, rest_start, rest_end
+
+def _parse_datetime(value):
+    return datetime.strptime(value, '%Y-%m-%d %H:%M:%S') if value else None
+
+def _parse_time(value):
+    return datetime.strptime(value, '%H:%M:%S').time() if value else None
+
+class PresenceIndex:
+    """今日在岗状态的内存索引（按部门/门店分组）
+
+    由 reconcile() 从当天的考勤、排班和外出记录整体重建，之后按顺序应用事件日志中的
+    打卡、外出、排班和用户事件增量更新。事件日志由所有进程共享，每次读取看板前先应用新事件，
+    看板内容与请求落在哪个 worker 进程无关。
+    """
+
+    def __init__(self, gap_grace=DEFAULT_GAP_GRACE):
+        self._lock = Lock()             # 保护索引内容
+        self._refresh_lock = Lock()     # 同一时刻只有一个线程重建索引或应用事件
+        self._entries = {}
+        self._departments = {}
+        self.gap_grace = gap_grace
+        self.day = None
+        self.reconciled_at = None
+        self.position = None            # 已应用到的事件 ID
+        self._handlers = {
+            'attendance.clock_in': self._clock_in,
+            'attendance.clock_out': self._clock_out,
+            'outing.approved': self._outing_started,
+            'outing.completed': self._outing_ended,
+            'schedule.changed': self._schedule_changed,
+            'schedule.deleted': self._schedule_changed,
+            'user.changed': self._user_changed,
+            'user.deleted': self._user_deleted
+        }
+
+    def is_current(self, today=None):
+        return self.day == (today or date.today())
+
+    def refresh(self, now=None):
+        """读取看板前调用：当天尚未加载（或已跨天）时重建，否则应用新的事件"""
+        now = now or datetime.now()
+        with self._refresh_lock:
+            if self.is_current(now.date()):
+                self._catch_up()
+            else:
+                self._reconcile(now)
+
+    def reconcile(self, now=None):
+        """从数据库重建今天的索引（定时对账）"""
+        with self._refresh_lock:
+            self._reconcile(now or datetime.now())
+
+    def _reconcile(self, now):
+        """读取当天的数据（5 次查询），整体替换后重放读取期间提交的事件
+
+        先记下事件位置再读取：位置取 gap_grace 秒之前的最后一个事件，位置之后的事件在替换后全部重放，
+        事件只设置状态，已反映在读取结果中的事件重放后结果不变。
+        """
+        today = now.date()
+        position = db.session.query(func.coalesce(func.max(EventLog.id), 0)).filter(
+            EventLog.created_at < datetime.utcnow() - timedelta(seconds=self.gap_grace)
+        ).scalar()
+
+        entries = {}
+        for user in db.session.query(User.id, User.username, User.real_name, User.department).filter(
+            User.is_active.is_(True)
+        ):
+            entries[user.id] = PresenceEntry(user.id, user.username, user.real_name, user.department)
+
+        for user_id, clock_in_time, clock_out_time in db.session.query(
+            AttendanceRecord.user_id,
+            AttendanceRecord.clock_in_time,
+            AttendanceRecord.clock_out_time
+        ).filter(AttendanceRecord.date == today):
+            entry = entries.get(user_id)
+            if entry:
+                entry.clock_in_time = clock_in_time
+                entry.clock_out_time = clock_out_time
+
+        for schedule in db.session.query(
+            Schedule.user_id, Schedule.date, Schedule.start_time, Schedule.end_time,
+            Schedule.break_start, Schedule.break_end
+        ).filter(Schedule.date == today):
+            entry = entries.get(schedule.user_id)
+            if entry:
+                entry.shift = shift_window(schedule.date, schedule.start_time, schedule.end_time,
+                                           schedule.break_start, schedule.break_end)
+
+        for outing in db.session.query(
+            OutingReport.id, OutingReport.user_id, OutingReport.destination,
+            OutingReport.start_time, OutingReport.expected_return_time
+        ).filter(
+            OutingReport.status == 'approved',
+            OutingReport.actual_return_time.is_(None),
+            OutingReport.start_time < datetime.combine(today + timedelta(days=1), datetime.min.time())
+        ).order_by(OutingReport.start_time):
+            entry = entries.get(outing.user_id)
+            if entry:
+                entry.outing = (outing.id, outing.destination, outing.start_time, outing.expected_return_time)
+
+        departments = {}
+        for entry in entries.values():
+            departments.setdefault(entry.department, set()).add(entry.user_id)
+
+        with self._lock:
+            self._entries = entries
+            self._departments = departments
+            self.day = today
+            self.reconciled_at = now
+            self.position = position
+        self._catch_up()
+
+    def _catch_up(self):
+        """按顺序应用上次位置之后的事件"""
+        while True:
+            events, position = read_events(db.session.connection(), self.position, CATCH_UP_BATCH, self.gap_grace)
+            with self._lock:
+                for event in events:
+                    handler = self._handlers.get(event.event_type)
+                    if handler is not None:
+                        handler(event)
+                self.position = position
+            if len(events) < CATCH_UP_BATCH:
+                return
+
+    # 以下事件处理在持有 _lock 时调用
+
+    def _today_entry(self, event):
+        """事件日期（data['date']）是索引当天时返回相关员工的条目"""
+        if datetime.strptime(event.data['date'], '%Y-%m-%d').date() != self.day:
+            return None
+        return self._entries.get(event.user_id)
+
+    def _clock_in(self, event):
+        entry = self._today_entry(event)
+        if entry is not None:
+            entry.clock_in_time = _parse_datetime(event.data['clock_in_time'])
+
+    def _clock_out(self, event):
+        entry = self._today_entry(event)
+        if entry is not None:
+            entry.clock_out_time = _parse_datetime(event.data['clock_out_time'])
+
+    def _outing_started(self, event):
+        """外出报备审批通过（外出时间不晚于今天）"""
+        start_time = _parse_datetime(event.data['start_time'])
+        entry = self._entries.get(event.user_id)
+        if entry is not None and start_time.date() <= self.day:
+            entry.outing = (event.data['id'], event.data['destination'], start_time,
+                            _parse_datetime(event.data['expected_return_time']))
+
+    def _outing_ended(self, event):
+        """外出报备完成（已返回）"""
+        entry = self._entries.get(event.user_id)
+        if entry is not None and entry.outing and entry.outing[0] == event.data['id']:
+            entry.outing = None
+
+    def _schedule_changed(self, event):
+        """今天的排班新增、修改或删除"""
+        entry = self._today_entry(event)
+        if entry is None:
+            return
+        if event.event_type == 'schedule.deleted':
+            entry.shift = None
+        else:
+            entry.shift = shift_window(self.day, _parse_time(event.data['start_time']),
+                                       _parse_time(event.data['end_time']), _parse_time(event.data['break_start']),
+                                       _parse_time(event.data['break_end']))
+
+    def _user_changed(self, event):
+        """用户新增或修改（停用的用户从索引中移除）"""
+        user_id = event.data['id']
+        old = self._entries.get(user_id)
+        if old is not None:
+            self._departments.get(old.department, set()).discard(user_id)
+        if not event.data['is_active']:
+            self._entries.pop(user_id, None)
+            return
+        entry = PresenceEntry(user_id, event.data['username'], event.data['real_name'], event.data['department'])
+        if old is not None:
+            entry.clock_in_time = old.clock_in_time
+            entry.clock_out_time = old.clock_out_time
+            entry.shift = old.shift
+            entry.outing = old.outing
+        self._entries[user_id] = entry
+        self._departments.setdefault(entry.department, set()).add(user_id)
+
+    def _user_deleted(self, event):
+        entry = self._entries.pop(event.data['id'], None)
+        if entry is not None:
+            self._departments.get(entry.department, set()).discard(entry.user_id)
+
+    def departments(self):
+        with self._lock:
+            return sorted(department for department, members in self._departments.items()
+                          if department and members)
+
+    def snapshot(self, department=None, now=None):
+        """返回 (人员状态列表, 各状态人数)；department 为空时返回全部"""
+        now = now or datetime.now()
+        with self._lock:
+            if department:
+                entries = [self._entries[user_id] for user_id in self._departments.get(department, ())]
+            else:
+                entries = list(self._entries.values())
+            people = [entry.to_dict(now) for entry in entries]
+
+        people.sort(key=lambda person: (STATUSES.index(person['status']), person['user_id']))
+        counts = dict.fromkeys(STATUSES, 0)
+        for person in people:
+            counts[person['status']] += 1
+        return people, counts
+
+presence_index = PresenceIndex()
+
+def reconcile_presence():
+    # 后台任务中按读事务读取，不占用写入网关
+    with read_transaction():
+        presence_index.reconcile()
+
+def start_presence_reconciler(app):
+    """进程启动时加载索引，并注册定时对账任务（间隔为 0 时只在启动和跨天时加载）"""
+    run_job(app, reconcile_presence, 'presence_seed')
+    interval = app.config.get('PRESENCE_RECONCILE_INTERVAL', DEFAULT_RECONCILE_INTERVAL)
+    if not interval:
+        return None
+    return add_interval_job(app, reconcile_presence, interval, 'presence_reconcile')
@@ -0,0 +1,213 @@
+from flask import current_app
+from werkzeug.exceptions import BadRequest, RequestEntityTooLarge
+from werkzeug.http import parse_options_header
+from werkzeug.sansio.multipart import MultipartDecoder, File, Data, Epilogue, NeedData
+from queue import Queue
+from threading import Thread, Lock
+import hashlib
+import os
+import tempfile
+import zipfile
+
+try:
+    from PIL import Image
+except ImportError:  # 未安装 Pillow 时不生成缩略图
+    Image = None
+
+CHUNK_SIZE = 64 * 1024
+
+ALLOWED_CONTENT_TYPES = {
+    'image/jpeg': '.jpg',
+    'image/png': '.png',
+    'image/gif': '.gif',
+    'image/webp': '.webp',
+    'application/pdf': '.pdf'
+}
+
+THUMBNAIL_SIZE = (320, 320)
+
+def storage_dir():
+    return current_app.config['RECEIPT_STORAGE_DIR']
+
+def receipt_path(sha256, root=None):
+    """凭证文件路径：<根目录>/ab/cd/<sha256>"""
+    return os.path.join(root or storage_dir(), sha256[:2], sha256[2:4], sha256)
+
+def thumbnail_path(sha256, root=None):
+    return os.path.join(root or storage_dir(), 'thumbs', sha256[:2], sha256 + '.jpg')
+
+def save_multipart_upload(stream, content_type_header, field_name='file', max_size=None):
+    """流式解析 multipart 请求体，将文件分块写入磁盘并计算 SHA-256
+
+    返回 (sha256, 文件大小, 内容类型)。同内容文件已存在时直接复用。
+    """
+    mimetype, options = parse_options_header(content_type_header)
+    boundary = options.get('boundary')
+    if mimetype != 'multipart/form-data' or not boundary:
+        raise BadRequest('expected multipart/form-data')
+
+    root = storage_dir()
+    os.makedirs(root, exist_ok=True)
+
+    decoder = MultipartDecoder(boundary.encode('latin-1'))
+    hasher = hashlib.sha256()
+    temp_file = None
+    temp_name = None
+    in_file = False
+    finished = False
+    size = 0
+    file_content_type = None
+
+    try:
+        while not finished:
+            chunk = stream.read(CHUNK_SIZE)
+            decoder.receive_data(chunk or None)
+            event = decoder.next_event()
+            while not isinstance(event, NeedData):
+                if isinstance(event, File) and event.name == field_name and temp_file is None:
+                    file_content_type = (event.headers.get('Content-Type') or '').split(';')[0].strip().lower()
+                    if file_content_type not in ALLOWED_CONTENT_TYPES:
+                        raise BadRequest('unsupported content type')
+                    fd, temp_name = tempfile.mkstemp(dir=root, prefix='.upload-')
+                    temp_file = os.fdopen(fd, 'wb')
+                    in_file = True
+                elif isinstance(event, Data):
+                    if in_file:
+                        size += len(event.data)
+                        if max_size is not None and size > max_size:
+                            raise RequestEntityTooLarge()
+                        hasher.update(event.data)
+                        temp_file.write(event.data)
+                        if not event.more_data:
+                            in_file = False
+                elif isinstance(event, Epilogue):
+                    finished = True
+                    break
+                else:
+                    in_file = False
+                event = decoder.next_event()
+            if not chunk:
+                finished = True
+
+        if temp_file is None or size == 0:
+            raise BadRequest('missing file')
+
+        temp_file.close()
+        sha256 = hasher.hexdigest()
+        target = receipt_path(sha256, root)
+        if os.path.exists(target):
+            # 相同内容已存储，丢弃本次上传
+            os.remove(temp_name)
+        else:
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            os.replace(temp_name, target)
+        temp_name = None
+        return sha256, size, file_content_type
+    except ValueError as error:
+        # 请求体格式错误或不完整（解析器无法继续解析）
+        raise BadRequest('invalid multipart body') from error
+    finally:
+        if temp_file is not None and not temp_file.closed:
+            temp_file.close()
+        if temp_name and os.path.exists(temp_name):
+            os.remove(temp_name)
+
+class ThumbnailWorker:
+    """后台缩略图生成线程"""
+
+    def __init__(self):
+        self._queue = Queue()
+        self._thread = None
+        self._lock = Lock()
+
+    def submit(self, app, sha256, content_type):
+        if Image is None or not content_type.startswith('image/'):
+            return
+        self._ensure_started()
+        self._queue.put((app, sha256))
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = Thread(target=self._run, name='receipt-thumbnails', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            app, sha256 = self._queue.get()
+            try:
+                with app.app_context():
+                    generate_thumbnail(sha256)
+            except Exception:
+                app.logger.exception('生成凭证缩略图失败: %s', sha256)
+            finally:
+                self._queue.task_done()
+
+    def join(self):
+        """等待队列中的任务完成"""
+        self._queue.join()
+
+thumbnail_worker = ThumbnailWorker()
+
+def generate_thumbnail(sha256):
+    """生成缩略图并标记凭证记录"""
+    from models import Receipt, db
+
+    target = thumbnail_path(sha256)
+    if not os.path.exists(target):
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        with Image.open(receipt_path(sha256)) as image:
+            image.thumbnail(THUMBNAIL_SIZE)
+            fd, temp_name = tempfile.mkstemp(dir=os.path.dirname(target), prefix='.thumb-')
+            with os.fdopen(fd, 'wb') as temp_file:
+                image.convert('RGB').save(temp_file, 'JPEG', quality=80)
+            os.replace(temp_name, target)
+
+    Receipt.query.filter_by(sha256=sha256).update({'has_thumbnail': True})
+    db.session.commit()
+
+class _ZipStream:
+    """只写缓冲区，zipfile 写入后由生成器取走数据"""
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        chunks = self._chunks
+        self._chunks = []
+        return b''.join(chunks)
+
+def stream_zip(entries):
+    """流式生成 ZIP：entries 为 (归档内文件名, 磁盘路径) 的可迭代对象"""
+    buffer = _ZipStream()
+    with zipfile.ZipFile(buffer, mode='w', compression=zipfile.ZIP_STORED) as archive:
+        for arcname, path in entries:
+            if not os.path.exists(path):
+                continue
+            with open(path, 'rb') as source, archive.open(arcname, mode='w', force_zip64=True) as target:
+                while True:
+                    chunk = source.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    target.write(chunk)
+                    data = buffer.drain()
+                    if data:
+                        yield data
+            data = buffer.drain()
+            if data:
+                yield data
+    data = buffer.drain()
+    if data:
+        yield data
@@ -0,0 +1,201 @@
+from flask import current_app, has_request_context, has_app_context, request
+from flask_sqlalchemy.session import Session
+from flask_jwt_extended import get_jwt_identity
+from sqlalchemy import event, text
+from functools import wraps
+from threading import Lock
+import time
+
+REPLICA_BIND_PREFIX = 'replica_'
+READ_REPLICA_ENVIRON_KEY = 'attendance.read_replica'
+DEFAULT_READ_YOUR_WRITES_WINDOW = 5      # 秒
+DEFAULT_RETRY_INTERVAL = 30              # 秒
+DEFAULT_HEALTH_CHECK_INTERVAL = 10       # 秒
+
+class ReplicaSet:
+    """只读副本：轮询选择健康的副本，连接失败的副本在 retry_interval 秒内不再使用"""
+
+    def __init__(self, bind_keys, retry_interval=DEFAULT_RETRY_INTERVAL):
+        self.bind_keys = list(bind_keys)
+        self.retry_interval = retry_interval
+        self._down_until = {}
+        self._next = 0
+        self._lock = Lock()
+
+    def choose(self):
+        """轮询返回下一个可用副本的 bind key，全部不可用时返回 None"""
+        now = time.monotonic()
+        with self._lock:
+            for _ in range(len(self.bind_keys)):
+                bind_key = self.bind_keys[self._next % len(self.bind_keys)]
+                self._next += 1
+                if self._down_until.get(bind_key, 0) <= now:
+                    return bind_key
+        return None
+
+    def mark_down(self, bind_key):
+        with self._lock:
+            self._down_until[bind_key] = time.monotonic() + self.retry_interval
+
+    def mark_up(self, bind_key):
+        with self._lock:
+            self._down_until.pop(bind_key, None)
+
+    def status(self):
+        now = time.monotonic()
+        with self._lock:
+            return {bind_key: self._down_until.get(bind_key, 0) <= now for bind_key in self.bind_keys}
+
+class RecentWriters:
+    """读己之写窗口：用户写入后 window 秒内的请求仍读主库（进程内记录）"""
+
+    def __init__(self, max_users=10000):
+        self.max_users = max_users
+        self._writes = {}
+        self._lock = Lock()
+
+    def record(self, user_id):
+        with self._lock:
+            if len(self._writes) >= self.max_users:
+                self._writes.clear()
+            self._writes[user_id] = time.monotonic()
+
+    def within(self, user_id, window):
+        with self._lock:
+            written_at = self._writes.get(user_id)
+        return written_at is not None and time.monotonic() - written_at < window
+
+recent_writers = RecentWriters()
+
+def current_identity():
+    try:
+        return get_jwt_identity()
+    except RuntimeError:
+        return None
+
+def read_only(func):
+    """声明只读接口：GET 请求读取只读副本（用户刚写入过时仍读主库）
+
+    放在 @jwt_required() 之后，以便按当前用户判断读己之写窗口。
+    """
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        replicas = current_app.extensions.get('db_replicas')
+        if replicas and request.method in ('GET', 'HEAD'):
+            window = current_app.config.get('DB_REPLICA_READ_YOUR_WRITES', DEFAULT_READ_YOUR_WRITES_WINDOW)
+            user_id = current_identity()
+            # 标记记录在本次请求上（批量请求的子请求共用 g，不能放在 g 上）
+            request.environ[READ_REPLICA_ENVIRON_KEY] = user_id is None or not recent_writers.within(user_id, window)
+        return func(*args, **kwargs)
+    return wrapper
+
+class RoutingSession(Session):
+    """按请求路由的会话：只读接口的查询发往副本，写入（flush）及其后的查询发往主库
+
+    同一会话固定使用一个副本，保证一次请求内读到的数据一致。
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and not self.info.get('wrote') and self._use_replica():
+            bind_key = self.info.get('replica')
+            if bind_key is None:
+                bind_key = self.info['replica'] = current_app.extensions['db_replicas'].choose()
+            if bind_key is not None:
+                return self._db.engines[bind_key]
+        return super().get_bind(mapper, clause, bind, **kwargs)
+
+    def _use_replica(self):
+        return has_request_context() and request.environ.get(READ_REPLICA_ENVIRON_KEY, False)
+
+@event.listens_for(RoutingSession, 'after_flush')
+def _mark_written(session, flush_context):
+    # 写入后本会话的查询都发往主库
+    session.info['wrote'] = True
+
+@event.listens_for(RoutingSession, 'after_commit')
+def _record_write(session):
+    if session.info.get('wrote') and has_request_context():
+        user_id = current_identity()
+        if user_id is not None:
+            recent_writers.record(user_id)
+
+def replica_bind_keys(app):
+    return sorted(key for key in (app.config.get('SQLALCHEMY_BINDS') or {}) if key.startswith(REPLICA_BIND_PREFIX))
+
+def configure_replicas(app):
+    """把 DATABASE_REPLICA_URLS 中的副本注册为 bind（在 db.init_app 之前调用）"""
+    urls = app.config.get('DATABASE_REPLICA_URLS') or []
+    if not urls:
+        return
+    # 副本与主库使用相同的 SQLALCHEMY_ENGINE_OPTIONS（连接池大小等）
+    binds = dict(app.config.get('SQLALCHEMY_BINDS') or {})
+    for index, url in enumerate(urls):
+        binds['%s%d' % (REPLICA_BIND_PREFIX, index)] = url
+    app.config['SQLALCHEMY_BINDS'] = binds
+
+def install_replicas(app, db):
+    """启用副本路由（在 db.init_app 之后调用）：连接出错的副本暂停使用"""
+    bind_keys = replica_bind_keys(app)
+    if not bind_keys:
+        return None
+    replicas = ReplicaSet(bind_keys, app.config.get('DB_REPLICA_RETRY_INTERVAL', DEFAULT_RETRY_INTERVAL))
+    app.extensions['db_replicas'] = replicas
+
+    with app.app_context():
+        for bind_key in bind_keys:
+            def handle_error(context, bind_key=bind_key):
+                if context.is_disconnect or context.connection is None:
+                    replicas.mark_down(bind_key)
+            event.listen(db.engines[bind_key], 'handle_error', handle_error)
+    return replicas
+
+def check_replicas():
+    """健康检查：对每个副本执行 SELECT 1，更新可用状态"""
+    from models import db
+
+    replicas = current_app.extensions.get('db_replicas') if has_app_context() else None
+    if replicas is None:
+        return
+    for bind_key in replicas.bind_keys:
+        try:
+            with db.engines[bind_key].connect() as connection:
+                connection.execute(text('SELECT 1'))
+        except Exception:
+            replicas.mark_down(bind_key)
+            current_app.logger.warning('只读副本不可用: %s', bind_key)
+        else:
+            replicas.mark_up(bind_key)
+
+def sync_sqlite_replicas(app):
+    """本地测试用：把 SQLite 主库整体复制到各个 SQLite 副本文件（模拟一次复制）"""
+    from models import db
+    import sqlite3
+
+    with app.app_context():
+        primary = db.engines[None].url
+        replicas = [db.engines[bind_key].url for bind_key in replica_bind_keys(app)]
+    if primary.get_backend_name() != 'sqlite' or not primary.database:
+        raise RuntimeError('只支持 SQLite 文件数据库')
+
+    source = sqlite3.connect(primary.database)
+    try:
+        for url in replicas:
+            if url.get_backend_name() != 'sqlite' or not url.database:
+                continue
+            target = sqlite3.connect(url.database)
+            try:
+                source.backup(target)
+            finally:
+                target.close()
+    finally:
+        source.close()
+    return len(replicas)
+
+def start_replica_health_checks(app):
+    """注册副本定时健康检查（未配置副本时不注册）"""
+    from utils.scheduler import add_interval_job
+
+    interval = app.config.get('DB_REPLICA_HEALTH_CHECK_INTERVAL', DEFAULT_HEALTH_CHECK_INTERVAL)
+    if not interval or 'db_replicas' not in app.extensions:
+        return None
+    return add_interval_job(app, check_replicas, interval, 'replica_health_check')
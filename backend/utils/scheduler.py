@@ -0,0 +1,48 @@
+from threading import Lock
+
+try:
+    from apscheduler.schedulers.background import BackgroundScheduler
+except ImportError:  # 未安装 APScheduler 时不运行后台定时任务
+    BackgroundScheduler = None
+
+_scheduler = None
+_lock = Lock()
+
+def get_scheduler():
+    """进程共享的后台调度器（首次使用时启动），未安装 APScheduler 时返回 None"""
+    global _scheduler
+    if BackgroundScheduler is None:
+        return None
+    with _lock:
+        if _scheduler is None:
+            _scheduler = BackgroundScheduler(daemon=True)
+            _scheduler.start()
+    return _scheduler
+
+def add_interval_job(app, func, seconds, job_id):
+    """注册定时任务：在应用上下文中调用 func()，异常记录日志，结束后释放数据库会话"""
+    scheduler = get_scheduler()
+    if scheduler is None:
+        return None
+    return scheduler.add_job(
+        run_job,
+        'interval',
+        seconds=seconds,
+        args=[app, func, job_id],
+        id=job_id,
+        replace_existing=True,
+        max_instances=1,
+        coalesce=True
+    )
+
+def run_job(app, func, job_id):
+    from models import db
+
+    with app.app_context():
+        try:
+            func()
+        except Exception:
+            db.session.rollback()
+            app.logger.exception('定时任务执行失败: %s', job_id)
+        finally:
+            db.session.remove()
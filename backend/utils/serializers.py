@@ -0,0 +1,228 @@
+from sqlalchemy import func, null
+from functools import lru_cache
+from operator import methodcaller
+from datetime import date
+from models import AttendanceRecord, LeaveRequest, ExpenseReport, WorkDiary, OutingReport, Schedule, User, db
+from utils.money import cents_to_amount
+from utils.diary_search import SEARCH_FIELDS
+from utils.sql import char_length
+
+# 格式化函数（值为 None 时不调用，直接输出 None）
+format_datetime = methodcaller('isoformat', ' ', 'seconds')   # 与 strftime('%Y-%m-%d %H:%M:%S') 相同
+format_date = date.isoformat                                  # 与 strftime('%Y-%m-%d') 相同
+format_time = methodcaller('isoformat', 'seconds')            # 与 strftime('%H:%M:%S') 相同
+format_isoformat = methodcaller('isoformat')
+
+def compile_row_serializer(keys, formatters):
+    """生成把行元组转换为字典的函数
+
+    按字段生成一个字典字面量表达式，按下标取值，避免逐字段循环和属性访问。
+    """
+    namespace = {}
+    items = []
+    for index, (key, formatter) in enumerate(zip(keys, formatters)):
+        if formatter is None:
+            items.append('%r: row[%d]' % (key, index))
+        else:
+            namespace['f%d' % index] = formatter
+            items.append('%r: None if row[%d] is None else f%d(row[%d])' % (key, index, index, index))
+    source = 'def serialize(row):\n    return {%s}\n' % ', '.join(items)
+    exec(source, namespace)
+    return namespace['serialize']
+
+class RowSerializer:
+    """基于查询列的序列化器
+
+    fields 为 (输出键, 列或列表达式[, 格式化函数]) 列表。先用 query() 只查询这些列，
+    再用 serialize_rows() 把结果行转换为字典。
+    """
+
+    max_projections = 64
+
+    def __init__(self, fields):
+        self.fields = tuple((field + (None,))[:3] for field in fields)
+        self.keys = [key for key, _, _ in self.fields]
+        self.columns = [column for _, column, _ in self.fields]
+        self._serialize = compile_row_serializer(self.keys, [formatter for _, _, formatter in self.fields])
+        self._projections = {}
+
+    def extend(self, *fields):
+        """追加字段（如关联用户名），返回新的序列化器"""
+        return RowSerializer(self.fields + tuple(fields))
+
+    def without(self, *keys):
+        """去掉部分字段，返回新的序列化器"""
+        return RowSerializer([field for field in self.fields if field[0] not in keys])
+
+    def only(self, keys):
+        """只保留指定字段（总是包含 id，按原字段顺序），返回新的序列化器
+
+        存在未知字段时抛出 ValueError。生成的序列化器按字段集合缓存。
+        """
+        keys = frozenset(keys) | {'id'}
+        projection = self._projections.get(keys)
+        if projection is not None:
+            return projection
+        unknown = keys.difference(self.keys)
+        if unknown:
+            raise ValueError(', '.join(sorted(unknown)))
+        projection = RowSerializer([field for field in self.fields if field[0] in keys])
+        if len(self._projections) < self.max_projections:
+            self._projections[keys] = projection
+        return projection
+
+    def query(self):
+        return db.session.query(*self.columns)
+
+    def serialize(self, row):
+        return self._serialize(row)
+
+    def serialize_rows(self, rows):
+        serialize = self._serialize
+        return [serialize(row) for row in rows]
+
+def parse_fields(value):
+    """解析 fields 查询参数（逗号分隔的字段名），未指定时返回 None"""
+    if not value:
+        return None
+    fields = [field.strip() for field in value.split(',') if field.strip()]
+    return fields or None
+
+def select_fields(serializer, value):
+    """按 fields 查询参数裁剪序列化器，未指定时原样返回；存在未知字段时抛出 ValueError"""
+    fields = parse_fields(value)
+    if fields is None:
+        return serializer
+    return serializer.only(fields)
+
+# 列表中关联的用户姓名：管理员连接用户表查询，普通用户输出 None（不连接）
+USER_NAME_FIELDS = (
+    ('username', User.username),
+    ('real_name', User.real_name)
+)
+NO_USER_NAME_FIELDS = (
+    ('username', null().label('username')),
+    ('real_name', null().label('real_name'))
+)
+
+@lru_cache(maxsize=None)
+def with_user_names(serializer, include):
+    """追加用户姓名字段（按序列化器缓存，字段裁剪的缓存随之复用）"""
+    return serializer.extend(*(USER_NAME_FIELDS if include else NO_USER_NAME_FIELDS))
+
+USER = RowSerializer([
+    ('id', User.id),
+    ('username', User.username),
+    ('email', User.email),
+    ('real_name', User.real_name),
+    ('employee_id', User.employee_id),
+    ('department', User.department),
+    ('position', User.position),
+    ('phone', User.phone),
+    ('role', User.role),
+    ('is_active', User.is_active),
+    ('created_at', User.created_at, format_isoformat)
+])
+
+ATTENDANCE_RECORD = RowSerializer([
+    ('id', AttendanceRecord.id),
+    ('user_id', AttendanceRecord.user_id),
+    ('date', AttendanceRecord.date, format_date),
+    ('clock_in_time', AttendanceRecord.clock_in_time, format_datetime),
+    ('clock_out_time', AttendanceRecord.clock_out_time, format_datetime),
+    ('work_hours', AttendanceRecord.work_hours),
+    ('status', AttendanceRecord.status),
+    ('notes', AttendanceRecord.notes)
+])
+
+# 个人考勤历史不返回 user_id
+ATTENDANCE_HISTORY = ATTENDANCE_RECORD.without('user_id')
+
+LEAVE_REQUEST = RowSerializer([
+    ('id', LeaveRequest.id),
+    ('user_id', LeaveRequest.user_id),
+    ('leave_type', LeaveRequest.leave_type),
+    ('start_date', LeaveRequest.start_date, format_date),
+    ('end_date', LeaveRequest.end_date, format_date),
+    ('days', LeaveRequest.days),
+    ('reason', LeaveRequest.reason),
+    ('status', LeaveRequest.status),
+    ('approver_id', LeaveRequest.approver_id),
+    ('approved_at', LeaveRequest.approved_at, format_datetime),
+    ('approval_notes', LeaveRequest.approval_notes),
+    ('created_at', LeaveRequest.created_at, format_datetime)
+])
+
+EXPENSE_REPORT = RowSerializer([
+    ('id', ExpenseReport.id),
+    ('user_id', ExpenseReport.user_id),
+    ('expense_type', ExpenseReport.expense_type),
+    ('amount', ExpenseReport.amount_cents, cents_to_amount),
+    ('date', ExpenseReport.date, format_date),
+    ('description', ExpenseReport.description),
+    ('receipt_url', ExpenseReport.receipt_url),
+    ('receipt_hash', ExpenseReport.receipt_hash),
+    ('suspected_duplicate', ExpenseReport.suspected_duplicate, bool),
+    ('status', ExpenseReport.status),
+    ('approver_id', ExpenseReport.approver_id),
+    ('approved_at', ExpenseReport.approved_at, format_datetime),
+    ('approval_notes', ExpenseReport.approval_notes),
+    ('created_at', ExpenseReport.created_at, format_datetime)
+])
+
+WORK_DIARY = RowSerializer([
+    ('id', WorkDiary.id),
+    ('user_id', WorkDiary.user_id),
+    ('date', WorkDiary.date, format_date),
+    ('content', WorkDiary.content),
+    ('achievements', WorkDiary.achievements),
+    ('issues', WorkDiary.issues),
+    ('next_plan', WorkDiary.next_plan),
+    ('created_at', WorkDiary.created_at, format_datetime)
+])
+
+@lru_cache(maxsize=16)
+def work_diary_list(preview_length, include_user_names):
+    """日报列表序列化器
+
+    preview_length 为 None 时返回完整正文，否则正文只在数据库中截取前 preview_length 个字符，
+    并附带 <字段>_length 原文长度。
+    """
+    serializer = WORK_DIARY
+    if preview_length is not None:
+        text_columns = [getattr(WorkDiary, field) for field in SEARCH_FIELDS]
+        serializer = serializer.without(*SEARCH_FIELDS).extend(
+            *[(field, func.substr(column, 1, preview_length)) for field, column in zip(SEARCH_FIELDS, text_columns)],
+            *[(field + '_length', func.coalesce(char_length(column), 0)) for field, column in zip(SEARCH_FIELDS, text_columns)]
+        )
+    return with_user_names(serializer, include_user_names)
+
+OUTING_REPORT = RowSerializer([
+    ('id', OutingReport.id),
+    ('user_id', OutingReport.user_id),
+    ('destination', OutingReport.destination),
+    ('purpose', OutingReport.purpose),
+    ('start_time', OutingReport.start_time, format_datetime),
+    ('expected_return_time', OutingReport.expected_return_time, format_datetime),
+    ('actual_return_time', OutingReport.actual_return_time, format_datetime),
+    ('contact_info', OutingReport.contact_info),
+    ('status', OutingReport.status),
+    ('approver_id', OutingReport.approver_id),
+    ('approved_at', OutingReport.approved_at, format_datetime),
+    ('approval_notes', OutingReport.approval_notes),
+    ('overdue_at', OutingReport.overdue_at, format_datetime),
+    ('created_at', OutingReport.created_at, format_datetime)
+])
+
+SCHEDULE = RowSerializer([
+    ('id', Schedule.id),
+    ('user_id', Schedule.user_id),
+    ('date', Schedule.date, format_date),
+    ('shift_type', Schedule.shift_type),
+    ('start_time', Schedule.start_time, format_time),
+    ('end_time', Schedule.end_time, format_time),
+    ('break_start', Schedule.break_start, format_time),
+    ('break_end', Schedule.break_end, format_time),
+    ('notes', Schedule.notes),
+    ('created_at', Schedule.created_at, format_datetime)
+])
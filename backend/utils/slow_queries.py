@@ -0,0 +1,184 @@
+from flask import current_app, has_request_context, request
+from sqlalchemy import event
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, time as time_of_day
+from decimal import Decimal
+from threading import Lock
+from time import perf_counter
+import os
+import random
+import re
+
+DEFAULT_THRESHOLD_MS = 200
+DEFAULT_LOG_SIZE = 200
+DEFAULT_EXPLAIN_SAMPLE = 0.2
+MAX_STATEMENT_LENGTH = 4000
+MAX_PARAMETERS = 20
+MAX_PENDING_EXPLAINS = 16
+MAX_CACHED_PLANS = 256
+
+# 只对查询语句做 EXPLAIN
+EXPLAINABLE = re.compile(r'^\s*(SELECT|WITH)\b', re.IGNORECASE)
+# 执行计划中的全表扫描：SQLite 的 "SCAN 表名"（不带 USING INDEX），PostgreSQL 的 Seq Scan，MySQL 的 type=ALL
+FULL_SCAN = re.compile(r'^SCAN (?!CONSTANT ROW)(?!.*\bUSING\b)|Seq Scan|\bALL\b')
+
+def redact_value(value):
+    """数字、日期、布尔和 NULL 原样保留，其余（字符串、二进制等）只保留类型和长度"""
+    if value is None or isinstance(value, (bool, int, float, Decimal, date, datetime, time_of_day)):
+        return value if not isinstance(value, Decimal) else float(value)
+    if isinstance(value, (str, bytes)):
+        return '<%s:%d>' % (type(value).__name__, len(value))
+    return '<%s>' % type(value).__name__
+
+def redact_parameters(parameters):
+    if isinstance(parameters, dict):
+        return {key: redact_value(value) for key, value in list(parameters.items())[:MAX_PARAMETERS]}
+    if isinstance(parameters, (list, tuple)):
+        return [redact_value(value) for value in parameters[:MAX_PARAMETERS]]
+    return redact_value(parameters)
+
+def explain_statement(engine, statement, parameters):
+    """用独立的 DBAPI 连接获取执行计划（不经过 ORM 会话和事务事件）"""
+    prefix = 'EXPLAIN QUERY PLAN ' if engine.dialect.name == 'sqlite' else 'EXPLAIN '
+    connection = engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        try:
+            cursor.execute(prefix + statement, parameters)
+            rows = cursor.fetchall()
+        finally:
+            cursor.close()
+    finally:
+        connection.close()
+
+    if engine.dialect.name == 'sqlite':
+        # (id, parent, notused, detail)
+        return [row[-1] for row in rows]
+    return [' | '.join('' if value is None else str(value) for value in row) for row in rows]
+
+def has_full_scan(plan):
+    return any(FULL_SCAN.search(line) for line in plan)
+
+class SlowQueryLog:
+    """慢查询记录：超过阈值的语句放入有界环形缓冲区
+
+    对查询语句按 explain_sample 比例抽样，在后台线程获取执行计划，不占用请求时间；
+    同一语句的执行计划缓存复用。
+    """
+
+    def __init__(self, threshold_ms=DEFAULT_THRESHOLD_MS, size=DEFAULT_LOG_SIZE, explain_sample=DEFAULT_EXPLAIN_SAMPLE):
+        self.threshold = threshold_ms / 1000.0
+        self.explain_sample = explain_sample
+        self.entries = deque(maxlen=size)
+        self._plans = OrderedDict()
+        self._pending = 0
+        self._lock = Lock()
+        self._executor = None
+        self._executor_pid = None
+
+    def record(self, engine, statement, parameters, duration, executemany, logger=None):
+        entry = {
+            'time': datetime.now().isoformat(timespec='seconds'),
+            'duration_ms': round(duration * 1000, 2),
+            'statement': statement[:MAX_STATEMENT_LENGTH],
+            'parameters': None if executemany else redact_parameters(parameters),
+            'endpoint': None,
+            'method': None,
+            'path': None,
+            'database': engine.url.get_backend_name(),
+            'plan': None,
+            'full_scan': None
+        }
+        if has_request_context():
+            entry['endpoint'] = request.endpoint
+            entry['method'] = request.method
+            entry['path'] = request.path
+        self.entries.append(entry)
+        if logger is not None:
+            logger.warning('慢查询 %.1fms [%s] %s', entry['duration_ms'], entry['endpoint'] or '-', entry['statement'][:200])
+
+        if executemany or not EXPLAINABLE.match(statement):
+            return entry
+        with self._lock:
+            plan = self._plans.get(statement)
+            if plan is not None:
+                self._plans.move_to_end(statement)
+        if plan is not None:
+            self._set_plan(entry, plan)
+        elif self.explain_sample and random.random() < self.explain_sample:
+            self._submit_explain(engine, statement, parameters, entry)
+        return entry
+
+    def _set_plan(self, entry, plan):
+        entry['plan'] = plan
+        entry['full_scan'] = has_full_scan(plan)
+
+    def _submit_explain(self, engine, statement, parameters, entry):
+        with self._lock:
+            if self._pending >= MAX_PENDING_EXPLAINS:
+                return
+            self._pending += 1
+            # fork 之后父进程的后台线程不存在，在子进程中重新创建
+            if self._executor is None or self._executor_pid != os.getpid():
+                self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='slow-query-explain')
+                self._executor_pid = os.getpid()
+            executor = self._executor
+        executor.submit(self._explain, engine, statement, parameters, entry)
+
+    def _explain(self, engine, statement, parameters, entry):
+        try:
+            plan = explain_statement(engine, statement, parameters)
+        except Exception as e:
+            entry['plan'] = ['EXPLAIN 失败: %s' % e]
+            return
+        finally:
+            with self._lock:
+                self._pending -= 1
+        with self._lock:
+            self._plans[statement] = plan
+            if len(self._plans) > MAX_CACHED_PLANS:
+                self._plans.popitem(last=False)
+        self._set_plan(entry, plan)
+
+    def recent(self, limit=None):
+        """按时间倒序返回记录"""
+        entries = list(self.entries)
+        entries.reverse()
+        return entries[:limit] if limit else entries
+
+    def clear(self):
+        self.entries.clear()
+
+def watch_engine(engine, slow_log, logger=None):
+    @event.listens_for(engine, 'before_cursor_execute')
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if context is not None:
+            context._slow_query_started = perf_counter()
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        started = getattr(context, '_slow_query_started', None)
+        if started is None:
+            return
+        duration = perf_counter() - started
+        if duration >= slow_log.threshold:
+            slow_log.record(engine, statement, parameters, duration, executemany, logger)
+
+def install_slow_query_log(app, db):
+    """SLOW_QUERY_ENABLED 开启时记录超过 SLOW_QUERY_THRESHOLD_MS 的语句（在 db.init_app 之后调用）"""
+    if not app.config.get('SLOW_QUERY_ENABLED', True):
+        return None
+    slow_log = SlowQueryLog(
+        app.config.get('SLOW_QUERY_THRESHOLD_MS', DEFAULT_THRESHOLD_MS),
+        app.config.get('SLOW_QUERY_LOG_SIZE', DEFAULT_LOG_SIZE),
+        app.config.get('SLOW_QUERY_EXPLAIN_SAMPLE', DEFAULT_EXPLAIN_SAMPLE)
+    )
+    app.extensions['slow_queries'] = slow_log
+    with app.app_context():
+        for engine in db.engines.values():
+            watch_engine(engine, slow_log, app.logger)
+    return slow_log
+
+def slow_query_log():
+    return current_app.extensions.get('slow_queries')
@@ -0,0 +1,30 @@
+from sqlalchemy import Date
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.functions import FunctionElement, char_length
+
+@compiles(char_length, 'sqlite')
+def _sqlite_char_length(element, compiler, **kw):
+    """SQLite 没有 CHAR_LENGTH，LENGTH 对文本返回字符数"""
+    return 'length(%s)' % compiler.process(element.clauses, **kw)
+
+class local_date(FunctionElement):
+    """把 UTC 时间列换算为本地日期：local_date(列, 与 UTC 的偏移秒数)"""
+    type = Date()
+    name = 'local_date'
+    inherit_cache = True
+
+@compiles(local_date)
+def _local_date(element, compiler, **kw):
+    value, offset = element.clauses
+    return 'CAST(%s + %s * INTERVAL \'1 second\' AS DATE)' % (
+        compiler.process(value, **kw), compiler.process(offset, **kw))
+
+@compiles(local_date, 'sqlite')
+def _sqlite_local_date(element, compiler, **kw):
+    value, offset = element.clauses
+    return "date(%s, %s || ' seconds')" % (compiler.process(value, **kw), compiler.process(offset, **kw))
+
+@compiles(local_date, 'mysql')
+def _mysql_local_date(element, compiler, **kw):
+    value, offset = element.clauses
+    return 'DATE(DATE_ADD(%s, INTERVAL %s SECOND))' % (compiler.process(value, **kw), compiler.process(offset, **kw))
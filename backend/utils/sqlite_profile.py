@@ -0,0 +1,117 @@
+from flask import has_request_context, request
+from sqlalchemy import event
+from contextlib import contextmanager
+from contextvars import ContextVar
+from threading import Lock
+from models import db
+from utils.replicas import REPLICA_BIND_PREFIX
+
+DEFAULT_BUSY_TIMEOUT = 5000                 # 毫秒
+DEFAULT_MMAP_SIZE = 256 * 1024 * 1024
+
+# 只读请求方法，其余请求的事务按写事务处理
+READ_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+_write_intent = ContextVar('sqlite_write_intent', default=None)
+
+class WriteGateway:
+    """进程内单写入者网关
+
+    写事务开始前排队获取写锁，同一进程内同时只有一个写事务，以 BEGIN IMMEDIATE 开始；
+    事务提交或回滚后释放。读事务不排队，WAL 模式下读取不会被写入阻塞。
+    多个进程之间由 SQLite 的写锁和 busy_timeout 排队。
+    """
+
+    def __init__(self, timeout):
+        self._lock = Lock()
+        self.timeout = timeout
+
+    def acquire(self):
+        # 等待超时后不再排队，交给 SQLite 的 busy_timeout 处理
+        return self._lock.acquire(timeout=self.timeout)
+
+    def release(self):
+        self._lock.release()
+
+def wants_write():
+    """当前事务是否为写事务：请求中按请求方法判断，后台任务默认按写事务处理"""
+    intent = _write_intent.get()
+    if intent is not None:
+        return intent
+    if has_request_context():
+        return request.method not in READ_METHODS
+    return True
+
+@contextmanager
+def write_transaction():
+    """在只读请求中执行写操作：先结束当前的读事务，之后开始的事务按写事务排队"""
+    if db.session().in_transaction():
+        db.session.commit()
+    token = _write_intent.set(True)
+    try:
+        yield
+    finally:
+        _write_intent.reset(token)
+
+@contextmanager
+def read_transaction():
+    """在请求之外只读访问数据库（如事件推送轮询）：之后开始的事务按读事务处理，不经过写入网关"""
+    token = _write_intent.set(False)
+    try:
+        yield
+    finally:
+        _write_intent.reset(token)
+
+def is_file_sqlite(engine):
+    return engine.dialect.name == 'sqlite' and engine.url.database not in (None, '', ':memory:')
+
+def configure_sqlite_engine(engine, config, read_only=False):
+    """为 SQLite 文件数据库设置 WAL、synchronous=NORMAL、busy_timeout 和 mmap，并接管事务的开始
+
+    read_only 为 True 时（只读副本）事务总是以普通 BEGIN 开始，不经过写入网关。
+    """
+    busy_timeout = config.get('SQLITE_BUSY_TIMEOUT', DEFAULT_BUSY_TIMEOUT)
+    mmap_size = config.get('SQLITE_MMAP_SIZE', DEFAULT_MMAP_SIZE)
+    write_gateway = WriteGateway(busy_timeout / 1000.0)
+
+    @event.listens_for(engine, 'connect')
+    def set_pragmas(dbapi_connection, connection_record):
+        # 由下面的 begin 事件发出 BEGIN，不使用 sqlite3 模块隐式开始的事务
+        dbapi_connection.isolation_level = None
+        cursor = dbapi_connection.cursor()
+        cursor.execute('PRAGMA journal_mode=WAL')
+        cursor.execute('PRAGMA synchronous=NORMAL')
+        cursor.execute('PRAGMA busy_timeout=%d' % busy_timeout)
+        cursor.execute('PRAGMA mmap_size=%d' % mmap_size)
+        cursor.close()
+
+    @event.listens_for(engine, 'begin')
+    def begin(connection):
+        # 写事务一开始就取得写锁，避免读后写升级锁时失败（database is locked）
+        if not read_only and wants_write():
+            locked = write_gateway.acquire()
+            try:
+                connection.exec_driver_sql('BEGIN IMMEDIATE')
+            except Exception:
+                if locked:
+                    write_gateway.release()
+                raise
+            connection.info['write_gateway_locked'] = locked
+        else:
+            connection.exec_driver_sql('BEGIN')
+
+    @event.listens_for(engine, 'commit')
+    @event.listens_for(engine, 'rollback')
+    def end(connection):
+        if connection.info.pop('write_gateway_locked', False):
+            write_gateway.release()
+
+def install_sqlite_profile(app):
+    """SQLITE_PROFILE 开启（默认）时为 SQLite 文件数据库启用并发配置"""
+    if not app.config.get('SQLITE_PROFILE', True):
+        return
+    with app.app_context():
+        for bind_key, engine in db.engines.items():
+            if is_file_sqlite(engine):
+                read_only = bind_key is not None and bind_key.startswith(REPLICA_BIND_PREFIX)
+                configure_sqlite_engine(engine, app.config, read_only)
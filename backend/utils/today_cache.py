@@ -0,0 +1,85 @@
+from flask import current_app, request, jsonify
+from collections import OrderedDict
+from datetime import date, datetime
+from threading import Lock
+from utils.http_cache import make_etag
+from utils.versioning import get_user_version, track_user_tables
+
+# 缓存的首页"今天"状态
+SECTION_ATTENDANCE = 'attendance'
+SECTION_SCHEDULE = 'schedule'
+SECTION_DIARY = 'diary'
+SECTION_OUTING = 'outing'
+
+# 各状态依赖的数据表，按用户维护版本号，任一进程写入后所有进程的缓存都随之失效
+SECTION_TABLES = {
+    SECTION_ATTENDANCE: 'attendance_record',
+    SECTION_SCHEDULE: 'schedule',
+    SECTION_DIARY: 'work_diary',
+    SECTION_OUTING: 'outing_report'
+}
+track_user_tables(*SECTION_TABLES.values())
+
+class TodayCache:
+    """按 (用户ID, 日期) 缓存首页"今天"状态的渲染结果
+
+    每条缓存记录生成时该用户数据的版本号，读取时与数据库中的版本号比对，不一致即重新生成；
+    跨天后日期不同自然不再命中。
+    """
+
+    def __init__(self, max_users=4096):
+        self.max_users = max_users
+        self._entries = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key, section, version):
+        with self._lock:
+            sections = self._entries.get(key)
+            if sections is None:
+                return None
+            self._entries.move_to_end(key)
+            entry = sections.get(section)
+        if entry is None or entry[0] != version:
+            return None
+        if entry[3] is not None and datetime.now() >= entry[3]:
+            return None
+        return entry
+
+    def set(self, key, section, entry):
+        with self._lock:
+            self._entries.setdefault(key, {})[section] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_users:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+today_cache = TodayCache()
+
+def today_json(user_id, section, build, expires=None):
+    """从缓存返回某用户今天的状态，未命中时调用 build() 生成
+
+    每次读取先查询该用户的数据版本号（一条主键查询）；expires 可返回缓存失效时间（本地时间），
+    用于随时间变化的状态。
+    """
+    key = (user_id, date.today().isoformat())
+    # 先读版本号再生成：生成期间有新的写入时缓存记录的是旧版本号，下次读取即重新生成
+    version = get_user_version(user_id, SECTION_TABLES[section])
+    entry = today_cache.get(key, section, version)
+    if entry is None:
+        body = jsonify(build()).get_data()
+        expires_at = expires() if expires else None
+        entry = (version, make_etag(key, section, version, body), body, expires_at)
+        today_cache.set(key, section, entry)
+
+    _, etag, body, _ = entry
+    if request.if_none_match.contains_weak(etag):
+        response = current_app.response_class(status=304)
+    else:
+        response = current_app.response_class(body, status=200, mimetype='application/json')
+    response.set_etag(etag)
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
@@ -0,0 +1,125 @@
+from sqlalchemy import bindparam, event, inspect, select
+from sqlalchemy.orm import Session
+from models import TableVersion, UserTableVersion, db
+from datetime import datetime
+
+# 需要维护版本号的表（只登记读多写少、被缓存依赖的表，避免热点行锁）
+TRACKED_TABLES = set()
+
+# 需要按用户维护版本号的表（版本行按用户区分，写入只锁定该用户自己的版本行）
+USER_TRACKED_TABLES = set()
+
+def track_tables(*table_names):
+    """登记需要维护版本号的表"""
+    TRACKED_TABLES.update(table_names)
+
+def track_user_tables(*table_names):
+    """登记需要按用户维护版本号的表（表中需要有 user_id 列）"""
+    USER_TRACKED_TABLES.update(table_names)
+
+def _touched_tables(session):
+    """收集本次 flush 中被修改的已登记表"""
+    tables = set()
+    for obj in list(session.new) + list(session.deleted):
+        table = getattr(obj, '__table__', None)
+        if table is not None and table.name in TRACKED_TABLES:
+            tables.add(table.name)
+    for obj in session.dirty:
+        table = getattr(obj, '__table__', None)
+        if table is not None and table.name in TRACKED_TABLES and session.is_modified(obj):
+            tables.add(table.name)
+    return tables
+
+def _touched_user_tables(session):
+    """收集本次 flush 中被修改的 (用户ID, 表名)，修改了所属用户时新旧用户都计入"""
+    pairs = set()
+    objects = list(session.new) + list(session.deleted) + [obj for obj in session.dirty if session.is_modified(obj)]
+    for obj in objects:
+        table = getattr(obj, '__table__', None)
+        if table is None or table.name not in USER_TRACKED_TABLES:
+            continue
+        user_ids = {obj.user_id}
+        user_ids.update(inspect(obj).attrs.user_id.history.deleted)
+        pairs.update((user_id, table.name) for user_id in user_ids if user_id is not None)
+    return pairs
+
+def bump_user_versions(session, pairs):
+    """在同一事务内递增 (用户ID, 表名) 的版本号，语句数与数量无关
+
+    ORM 修改在 flush 时自动递增；批量 insert/update 等不经过 ORM 的写入需要显式调用。
+    """
+    if not pairs:
+        return
+    version_table = UserTableVersion.__table__
+    connection = session.connection()
+    now = datetime.utcnow()
+    existing = set(connection.execute(
+        select(version_table.c.user_id, version_table.c.table_name).where(
+            version_table.c.user_id.in_({user_id for user_id, _ in pairs}),
+            version_table.c.table_name.in_({table_name for _, table_name in pairs})
+        )
+    ).all())
+    updated = [{'key_user_id': user_id, 'key_table_name': table_name}
+               for user_id, table_name in sorted(pairs) if (user_id, table_name) in existing]
+    created = [{'user_id': user_id, 'table_name': table_name, 'version': 1, 'updated_at': now}
+               for user_id, table_name in sorted(pairs) if (user_id, table_name) not in existing]
+    if updated:
+        connection.execute(
+            version_table.update()
+            .where(version_table.c.user_id == bindparam('key_user_id'),
+                   version_table.c.table_name == bindparam('key_table_name'))
+            .values(version=version_table.c.version + 1, updated_at=now),
+            updated
+        )
+    if created:
+        connection.execute(version_table.insert(), created)
+
+def _bump_versions(session, flush_context):
+    """在同一事务内递增被修改表的版本号"""
+    pairs = _touched_user_tables(session)
+    if pairs:
+        bump_user_versions(session, pairs)
+
+    tables = _touched_tables(session)
+    if not tables:
+        return
+
+    version_table = TableVersion.__table__
+    connection = session.connection()
+    now = datetime.utcnow()
+    for table_name in sorted(tables):
+        result = connection.execute(
+            version_table.update()
+            .where(version_table.c.table_name == table_name)
+            .values(version=version_table.c.version + 1, updated_at=now)
+        )
+        if result.rowcount == 0:
+            connection.execute(
+                version_table.insert().values(table_name=table_name, version=1, updated_at=now)
+            )
+
+def install_version_listeners():
+    """注册 flush 事件监听"""
+    if not event.contains(Session, 'after_flush', _bump_versions):
+        event.listen(Session, 'after_flush', _bump_versions)
+
+def get_table_versions(*table_names):
+    """一次查询获取多张表的版本号，返回 {表名: (版本号, 最后修改时间)}"""
+    rows = db.session.query(
+        TableVersion.table_name,
+        TableVersion.version,
+        TableVersion.updated_at
+    ).filter(TableVersion.table_name.in_(table_names)).all()
+
+    versions = {name: (0, None) for name in table_names}
+    for table_name, version, updated_at in rows:
+        versions[table_name] = (version, updated_at)
+    return versions
+
+def get_user_version(user_id, table_name):
+    """获取某用户在某张表上的版本号（没有修改过时为 0）"""
+    version = db.session.query(UserTableVersion.version).filter_by(
+        user_id=user_id,
+        table_name=table_name
+    ).scalar()
+    return version or 0
@@ -1,20 +1,83 @@
 import { axios } from '../store'
 
+// 同一轮事件循环中发起的 GET 请求合并为一次批量请求（只有一个时直接请求）
+const batchQueue = []
+let batchTimer = null
+
+const flushBatch = () => {
+  const queue = batchQueue.splice(0)
+  batchTimer = null
+  
+  if (queue.length === 1) {
+    const { url, params, resolve, reject } = queue[0]
+    axios.get(url, { params }).then(resolve, reject)
+    return
+  }
+  
+  axios.post('/batch', {
+    parallel: true,
+    requests: queue.map(({ url, params }, index) => ({ id: index, path: `/api${url}`, params }))
+  }).then(response => {
+    response.data.responses.forEach(result => {
+      const { resolve, reject } = queue[result.id]
+      const subResponse = { data: result.body, status: result.status, headers: { etag: result.etag } }
+      if (result.status >= 200 && result.status < 300) {
+        resolve(subResponse)
+      } else {
+        reject({ response: subResponse })
+      }
+    })
+  }, error => {
+    queue.forEach(({ reject }) => reject(error))
+  })
+}
+
+export const batchedGet = (url, params) => {
+  return new Promise((resolve, reject) => {
+    batchQueue.push({ url, params, resolve, reject })
+    if (!batchTimer) {
+      batchTimer = setTimeout(flushBatch, 0)
+    }
+  })
+}
+
+// 写请求带 Idempotency-Key，网络中断（没有收到响应）时用同一个键重试，服务端返回第一次的结果而不会重复执行
+const IDEMPOTENT_RETRIES = 3
+
+const newIdempotencyKey = () => {
+  if (window.crypto && window.crypto.randomUUID) {
+    return window.crypto.randomUUID()
+  }
+  return `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}${Math.random().toString(36).slice(2)}`
+}
+
+export const idempotentPost = (url, data) => {
+  const headers = { 'Idempotency-Key': newIdempotencyKey() }
+  const attempt = retries => axios.post(url, data, { headers }).catch(error => {
+    if (error.response || retries <= 0) {
+      throw error
+    }
+    const delay = (IDEMPOTENT_RETRIES - retries + 1) * 1000
+    return new Promise(resolve => setTimeout(resolve, delay)).then(() => attempt(retries - 1))
+  })
+  return attempt(IDEMPOTENT_RETRIES)
+}
+
 // 考勤相关API
 export const attendanceAPI = {
   // 上班打卡
   clockIn() {
-    return axios.post('/attendance/clock-in')
+    return idempotentPost('/attendance/clock-in')
   },
   
   // 下班打卡
   clockOut() {
-    return axios.post('/attendance/clock-out')
+    return idempotentPost('/attendance/clock-out')
   },
   
   // 获取今天的考勤记录
   getTodayAttendance() {
-    return axios.get('/attendance/today')
+    return batchedGet('/attendance/today')
   },
   
   // 获取考勤历史
@@ -25,6 +88,11 @@ export const attendanceAPI = {
   // 获取考勤统计
   getAttendanceStatistics(params) {
     return axios.get('/attendance/statistics', { params })
+  },
+  
+  // 获取门店在岗看板
+  getPresence(params) {
+    return axios.get('/attendance/presence', { params })
   }
 }
 
@@ -32,12 +100,12 @@ export const attendanceAPI = {
 export const leaveAPI = {
   // 获取请假申请列表
   getLeaveRequests(params) {
-    return axios.get('/leave/requests', { params })
+    return batchedGet('/leave/requests', params)
   },
   
   // 创建请假申请
   createLeaveRequest(data) {
-    return axios.post('/leave/requests', data)
+    return idempotentPost('/leave/requests', data)
   },
   
   // 获取请假申请详情
@@ -52,7 +120,7 @@ export const leaveAPI = {
   
   // 审批请假申请
   approveLeaveRequest(id, data) {
-    return axios.post(`/leave/requests/${id}/approve`, data)
+    return idempotentPost(`/leave/requests/${id}/approve`, data)
   },
   
   // 删除请假申请
@@ -70,12 +138,12 @@ export const leaveAPI = {
 export const expenseAPI = {
   // 获取费用报销列表
   getExpenseReports(params) {
-    return axios.get('/expense/reports', { params })
+    return batchedGet('/expense/reports', params)
   },
   
   // 创建费用报销
   createExpenseReport(data) {
-    return axios.post('/expense/reports', data)
+    return idempotentPost('/expense/reports', data)
   },
   
   // 获取费用报销详情
@@ -90,7 +158,7 @@ export const expenseAPI = {
   
   // 审批费用报销
   approveExpenseReport(id, data) {
-    return axios.post(`/expense/reports/${id}/approve`, data)
+    return idempotentPost(`/expense/reports/${id}/approve`, data)
   },
   
   // 删除费用报销
@@ -98,6 +166,18 @@ export const expenseAPI = {
     return axios.delete(`/expense/reports/${id}`)
   },
   
+  // 上传报销凭证
+  uploadReceipt(file) {
+    const formData = new FormData()
+    formData.append('file', file)
+    return axios.post('/expense/receipts', formData)
+  },
+  
+  // 获取报销凭证缩略图
+  getReceiptThumbnail(hash) {
+    return axios.get(`/expense/receipts/${hash}/thumbnail`, { responseType: 'blob' })
+  },
+  
   // 获取费用类型
   getExpenseTypes() {
     return axios.get('/expense/types')
@@ -138,12 +218,22 @@ export const diaryAPI = {
   
   // 获取今天的工作日报
   getTodayDiary() {
-    return axios.get('/diary/today')
+    return batchedGet('/diary/today')
   },
   
   // 获取日报统计
   getDiaryStatistics(params) {
     return axios.get('/diary/statistics', { params })
+  },
+  
+  // 全文搜索工作日报
+  searchDiaries(params) {
+    return axios.get('/diary/search', { params })
+  },
+  
+  // 获取日报提交合规报告
+  getDiaryCompliance(params) {
+    return axios.get('/diary/compliance', { params })
   }
 }
 
@@ -156,7 +246,7 @@ export const outingAPI = {
   
   // 创建外出报备
   createOutingReport(data) {
-    return axios.post('/outing/reports', data)
+    return idempotentPost('/outing/reports', data)
   },
   
   // 获取外出报备详情
@@ -171,7 +261,7 @@ export const outingAPI = {
   
   // 审批外出报备
   approveOutingReport(id, data) {
-    return axios.post(`/outing/reports/${id}/approve`, data)
+    return idempotentPost(`/outing/reports/${id}/approve`, data)
   },
   
   // 完成外出报备
@@ -187,6 +277,11 @@ export const outingAPI = {
   // 获取当前外出报备
   getCurrentOuting() {
     return axios.get('/outing/current')
+  },
+  
+  // 获取外出人员看板（当前外出 / 超时未返回）
+  getOutingBoard(params) {
+    return axios.get('/outing/board', { params })
   }
 }
 
@@ -224,7 +319,7 @@ export const scheduleAPI = {
   
   // 获取今天的排班
   getTodaySchedule() {
-    return axios.get('/schedule/today')
+    return batchedGet('/schedule/today')
   },
   
   // 获取班次类型
@@ -235,6 +330,16 @@ export const scheduleAPI = {
   // 获取排班日历
   getScheduleCalendar(params) {
     return axios.get('/schedule/calendar', { params })
+  },
+  
+  // 获取排班日历订阅地址
+  getFeedToken() {
+    return axios.get('/schedule/feed-token')
+  },
+  
+  // 重置排班日历订阅地址（旧地址失效）
+  resetFeedToken() {
+    return axios.post('/schedule/feed-token/reset')
   }
 }
 
@@ -273,6 +378,24 @@ export const adminAPI = {
   
   getAttendanceStatistics(params) {
     return axios.get('/admin/attendance/statistics', { params })
+  },
+  
+  // 打包下载当月报销凭证
+  exportReceipts(params) {
+    return axios.get('/admin/expense/receipts/export', { params, responseType: 'blob' })
+  }
+}
+
+// 服务器推送事件API
+export const eventsAPI = {
+  // 获取推送连接令牌
+  getStreamToken() {
+    return axios.post('/events/token')
+  },
+  
+  // 建立推送连接（断线后浏览器自动重连并携带 Last-Event-ID）
+  openStream(token) {
+    return new EventSource(`${axios.defaults.baseURL}/events/stream?token=${encodeURIComponent(token)}`)
   }
 }
 